@@ -8,7 +8,9 @@ from routes.scene_routes import scene_bp
 from routes.library_routes import library_bp
 from routes.payment_routes import payment_bp
 from routes.tutorial_routes import tutorial_bp
+from routes.storage_routes import storage_bp
 import redis
+from utils import db, activity_log, jobs
 
 def create_app(config_class):
     app = Flask(__name__, static_folder="static", template_folder="templates")
@@ -21,17 +23,22 @@ def create_app(config_class):
     )
 
     origins = ["https://artx3d.vercel.app"] if os.getenv('VERCEL_ENV') == 'production' else ["http://localhost:5173"]
-    CORS(app, resources={r"/*": {"origins": origins}}, supports_credentials=True)
+    CORS(app, resources={r"/*": {"origins": origins}}, supports_credentials=True, expose_headers=['X-Scene-Version'])
 
     redis_url = os.environ.get('REDIS_URL')
     app.redis = redis.Redis.from_url(redis_url) if redis_url else None
 
+    db.init_app(app)
+    activity_log.init_app(app)
+    jobs.init_app(app)
+
     app.register_blueprint(auth_bp)
     app.register_blueprint(user_bp)
     app.register_blueprint(scene_bp)
     app.register_blueprint(library_bp)
     app.register_blueprint(payment_bp)
     app.register_blueprint(tutorial_bp)
+    app.register_blueprint(storage_bp)
 
     @app.route('/')
     def index():
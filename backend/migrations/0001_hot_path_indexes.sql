@@ -0,0 +1,27 @@
+-- Indexes behind the hot queries in models.py and routes/*.py.
+
+-- /scenes listing, newest first, keyset-paginated on (updated_at, scene_id)
+CREATE INDEX IF NOT EXISTS idx_scenes_user_updated
+    ON scenes (user_id, updated_at DESC, scene_id DESC);
+
+-- User lookups join the latest subscription; /payment/get-subscription filters by user
+CREATE INDEX IF NOT EXISTS idx_subscriptions_user_start
+    ON subscriptions (user_id, start_date DESC);
+
+-- One thumbnail per scene. Older rows may have been duplicated by concurrent saves,
+-- keep the newest one before enforcing uniqueness.
+DELETE FROM scene_thumbnails st
+USING scene_thumbnails newer
+WHERE st.scene_id = newer.scene_id
+  AND st.id < newer.id;
+
+CREATE UNIQUE INDEX IF NOT EXISTS uq_scene_thumbnails_scene
+    ON scene_thumbnails (scene_id);
+
+-- /library/models?category=...
+CREATE INDEX IF NOT EXISTS idx_library_models_category
+    ON library_models (model_category);
+
+-- /user/logs, newest first, keyset-paginated on (timestamp, log_id)
+CREATE INDEX IF NOT EXISTS idx_user_logs_user_timestamp
+    ON user_logs (user_id, timestamp DESC, log_id DESC);
@@ -0,0 +1,19 @@
+-- Content-addressed textures pulled out of scene documents at save time.
+
+CREATE TABLE IF NOT EXISTS textures (
+    hash TEXT PRIMARY KEY,              -- sha256 of the decoded image bytes
+    s3_key TEXT NOT NULL,
+    byte_size INTEGER NOT NULL,
+    ref_count INTEGER NOT NULL DEFAULT 0,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+-- Which textures each scene references; textures.ref_count is the number of rows here.
+CREATE TABLE IF NOT EXISTS scene_textures (
+    scene_id INTEGER NOT NULL,
+    texture_hash TEXT NOT NULL REFERENCES textures (hash),
+    PRIMARY KEY (scene_id, texture_hash)
+);
+
+CREATE INDEX IF NOT EXISTS idx_scene_textures_hash
+    ON scene_textures (texture_hash);
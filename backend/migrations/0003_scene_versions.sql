@@ -0,0 +1,3 @@
+-- Optimistic concurrency for incremental (patch) saves: every write bumps the version.
+
+ALTER TABLE scenes ADD COLUMN IF NOT EXISTS version INTEGER NOT NULL DEFAULT 1;
@@ -0,0 +1,16 @@
+-- Storage objects whose delete failed after their rows were removed; retried by utils/storage_cleanup.py.
+
+CREATE TABLE IF NOT EXISTS pending_storage_deletes (
+    id BIGSERIAL PRIMARY KEY,
+    store TEXT NOT NULL,                -- utils/storage.py name: 'scenes', 'media' or 'community'
+    bucket TEXT NOT NULL,
+    object_key TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT,
+    next_attempt_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    UNIQUE (store, bucket, object_key)
+);
+
+CREATE INDEX IF NOT EXISTS idx_pending_storage_deletes_due
+    ON pending_storage_deletes (next_attempt_at);
@@ -0,0 +1,4 @@
+-- Resized WebP renditions of scene thumbnails, written by utils/thumbnails.py.
+-- {"version": <scene version they were rendered for>, "<size>": "<r2 key>", ...}
+
+ALTER TABLE scene_thumbnails ADD COLUMN IF NOT EXISTS variants JSONB;
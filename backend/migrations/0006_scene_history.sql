@@ -0,0 +1,26 @@
+-- Version history for scenes, stored as content-defined chunks shared between versions (see utils/scene_history.py).
+
+-- One row per distinct chunk; ref_count is the number of scene_versions whose chunk list contains it.
+CREATE TABLE IF NOT EXISTS scene_chunks (
+    hash TEXT PRIMARY KEY,              -- sha256 of the uncompressed chunk
+    s3_key TEXT NOT NULL,
+    byte_size INTEGER NOT NULL,         -- Uncompressed
+    stored_size INTEGER NOT NULL,       -- Gzipped, as kept in storage
+    ref_count INTEGER NOT NULL DEFAULT 0,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+-- chunk_hashes is NULL until the background job has chunked the version. texture_hashes
+-- are counted in textures.ref_count, so a texture lives as long as any version uses it.
+CREATE TABLE IF NOT EXISTS scene_versions (
+    scene_id INTEGER NOT NULL,
+    version INTEGER NOT NULL,
+    scene_name TEXT,
+    chunk_hashes TEXT[],
+    texture_hashes TEXT[] NOT NULL DEFAULT '{}',
+    byte_size BIGINT,                   -- Uncompressed document size
+    new_bytes BIGINT,                   -- Stored bytes of the chunks this version introduced
+    restored_from INTEGER,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (scene_id, version)
+);
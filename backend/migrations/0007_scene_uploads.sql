@@ -0,0 +1,9 @@
+-- Direct uploads (/save/init, /save/commit) that have been committed. An uploadId names the
+-- storage keys its scene now owns, so it may be committed only once (see SceneUpload).
+CREATE TABLE IF NOT EXISTS scene_uploads (
+    upload_id TEXT PRIMARY KEY,
+    user_id INTEGER NOT NULL,
+    scene_id INTEGER NOT NULL,
+    version INTEGER NOT NULL,
+    committed_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
@@ -0,0 +1,11 @@
+-- A Razorpay payment is applied to at most one subscription (see payments.provision_subscription).
+-- Rows duplicated by retried provisioning keep the payment on the newest one only.
+UPDATE subscriptions s
+SET payment_id = NULL
+FROM subscriptions newer
+WHERE s.payment_id = newer.payment_id
+  AND s.id < newer.id;
+
+CREATE UNIQUE INDEX IF NOT EXISTS uq_subscriptions_payment
+    ON subscriptions (payment_id)
+    WHERE payment_id IS NOT NULL;
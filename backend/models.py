@@ -1,7 +1,13 @@
 import psycopg2
+from psycopg2.extras import execute_values
 from werkzeug.security import generate_password_hash, check_password_hash
 from utils.db import get_db_connection
+from utils import activity_log, queries
+from utils.textures import texture_key
+from utils.scene_history import chunk_key
 import os
+import json
+import uuid
 from dotenv import load_dotenv
 
 load_dotenv()  
@@ -53,14 +59,7 @@ class User:
 
         try:
             with conn.cursor() as cursor:
-                cursor.execute("""
-                    SELECT u.*, s.subscription_level
-                    FROM users u
-                    LEFT JOIN subscriptions s ON u.id = s.user_id
-                    WHERE u.username = %s
-                    ORDER BY s.start_date DESC
-                    LIMIT 1
-                """, (username,))
+                cursor.execute(queries.USER_BY_USERNAME, (username,))
                 user_data = cursor.fetchone()
                 if user_data:
                     return User(user_data[0], user_data[1], user_data[2], user_data[3], user_data[4])
@@ -73,21 +72,15 @@ class User:
                 conn.close()
 
     @staticmethod
-    def get_user_by_id(user_id):
-        conn = get_db_connection()
+    def get_user_by_id(user_id, readonly=True):
+        """readonly=False reads on the primary, for callers that must not see replica lag."""
+        conn = get_db_connection(readonly=readonly)
         if conn is None:
             return None
 
         try:
             with conn.cursor() as cursor:
-                cursor.execute("""
-                    SELECT u.*, s.subscription_level
-                    FROM users u
-                    LEFT JOIN subscriptions s ON u.id = s.user_id
-                    WHERE u.id = %s
-                    ORDER BY s.start_date DESC
-                    LIMIT 1
-                """, (user_id,))
+                cursor.execute(queries.USER_BY_ID, (user_id,))
                 user_data = cursor.fetchone()
                 if user_data:
                     return User(user_data[0], user_data[1], user_data[2], user_data[3], user_data[4])
@@ -109,7 +102,7 @@ class UserLog:
 
     @staticmethod
     def get_logs_by_user_id(user_id):
-        conn = get_db_connection()
+        conn = get_db_connection(readonly=True)
         if conn is None:
             return []
 
@@ -126,19 +119,66 @@ class UserLog:
             if conn:
                 conn.close()
 
+    @staticmethod
+    def iter_logs_by_user_id(user_id, since=None, until=None, before=None, limit=None, batch_size=500):
+        """Returns a generator of a user's logs newest first, from a server-side cursor.
+
+        Rows are pulled from Postgres `batch_size` at a time, so memory stays flat no matter
+        how long the history is. `before` is a (timestamp, log_id) keyset bound. The query
+        is sent before this returns, so a connection or query failure raises psycopg2.Error
+        here; one while streaming is raised from the generator.
+        """
+        conn = get_db_connection(readonly=True)
+        if conn is None:
+            raise psycopg2.OperationalError("Database connection failed")
+
+        query, params = queries.user_logs(user_id, since, until, before, limit)
+
+        try:
+            cursor = conn.cursor(name=f"user_logs_{user_id}_{uuid.uuid4().hex}")
+            cursor.itersize = batch_size
+            cursor.execute(query, params)
+        except psycopg2.Error:
+            conn.close()
+            raise
+        return UserLog._stream_logs(conn, cursor)
+
+    @staticmethod
+    def _stream_logs(conn, cursor):
+        try:
+            with cursor:
+                for log in cursor:
+                    yield UserLog(log[0], log[1], log[2], log[3])
+        except psycopg2.Error as e:
+            print(f"Error streaming user logs: {e}")
+            raise
+        finally:
+            conn.close()
+
     @staticmethod
     def create_log(user_id, activity):
+        """Queues an activity entry; the activity logger writes it in bulk shortly after."""
+        return activity_log.log(user_id, activity)
+
+    @staticmethod
+    def create_logs(entries):
+        """Inserts many (user_id, activity, timestamp) entries with a single multi-row INSERT."""
         conn = get_db_connection()
         if conn is None:
             return False
 
         try:
             with conn.cursor() as cursor:
-                cursor.execute("INSERT INTO user_logs (user_id, activity) VALUES (%s, %s)", (user_id, activity))
+                execute_values(
+                    cursor,
+                    "INSERT INTO user_logs (user_id, activity, timestamp) VALUES %s",
+                    entries,
+                    page_size=len(entries)
+                )
                 conn.commit()
                 return True
         except psycopg2.Error as e:
-            print(f"Error creating user log: {e}")
+            print(f"Error creating user logs: {e}")
             conn.rollback()
             return False
         finally:
@@ -154,6 +194,425 @@ class Scene: #create a scene model
         self.created_at = created_at
         self.updated_at = updated_at
 
+    @staticmethod
+    def save(cursor, user_id, scene_id, scene_name, s3_bucket_name, s3_key, with_thumbnail=False, thumbnail_key=None):
+        """Upserts a scene row and, optionally, its thumbnail row in one round trip.
+
+        Updates the scene when `scene_id` is given (and owned by `user_id`), inserts it
+        otherwise. The thumbnail key defaults to Thumbnails/<user_id>/<scene_id>.png.
+        Runs on the caller's cursor so the caller decides when to commit.
+        Returns (scene_id, version, thumbnail_key), or None when the scene is missing or not owned.
+        """
+        cursor.execute("""
+            WITH updated AS (
+                UPDATE Scenes
+                SET s3_bucket_name = %(bucket)s, scene_name = %(scene_name)s, s3_key = %(s3_key)s,
+                    updated_at = NOW(), version = version + 1
+                WHERE scene_id = %(scene_id)s AND user_id = %(user_id)s
+                RETURNING scene_id, version
+            ), inserted AS (
+                INSERT INTO Scenes (user_id, s3_bucket_name, scene_name, s3_key)
+                SELECT %(user_id)s, %(bucket)s, %(scene_name)s, %(s3_key)s
+                WHERE %(scene_id)s IS NULL
+                RETURNING scene_id, version
+            ), saved AS (
+                SELECT scene_id, version FROM updated
+                UNION ALL
+                SELECT scene_id, version FROM inserted
+            ), thumbnail AS (
+                INSERT INTO scene_thumbnails (scene_id, image_url)
+                SELECT scene_id, COALESCE(%(thumbnail_key)s, 'Thumbnails/' || %(user_id)s || '/' || scene_id || '.png')
+                FROM saved
+                WHERE %(with_thumbnail)s
+                ON CONFLICT (scene_id) DO UPDATE SET image_url = EXCLUDED.image_url
+                RETURNING image_url
+            )
+            SELECT saved.scene_id, saved.version, (SELECT image_url FROM thumbnail)
+            FROM saved
+        """, {
+            'user_id': user_id,
+            'scene_id': scene_id,
+            'scene_name': scene_name,
+            'bucket': s3_bucket_name,
+            's3_key': s3_key,
+            'with_thumbnail': with_thumbnail,
+            'thumbnail_key': thumbnail_key,
+        })
+        return cursor.fetchone()
+
+    @staticmethod
+    def bump_version(cursor, scene_id, user_id, base_version):
+        """Claims the next version of a scene if it is still at `base_version`.
+
+        The row stays locked until the caller commits, so concurrent writers queue up.
+        Returns (new version, s3_key, scene_name), or None when the scene is missing, not owned or stale.
+        """
+        cursor.execute("""
+            UPDATE Scenes
+            SET version = version + 1, updated_at = NOW()
+            WHERE scene_id = %s AND user_id = %s AND version = %s
+            RETURNING version, s3_key, scene_name
+        """, (scene_id, user_id, base_version))
+        return cursor.fetchone()
+
+    @staticmethod
+    def list_rows(cursor, user_id, scene_ids=None):
+        """Listing rows (scene_id, scene_name, updated_at, image_url, variants) for all of a
+        user's scenes, or only `scene_ids` of them, newest first."""
+        if scene_ids is None:
+            cursor.execute(queries.USER_SCENES, (user_id,))
+        else:
+            cursor.execute(queries.USER_SCENES_BY_ID, (user_id, list(scene_ids)))
+        return cursor.fetchall()
+
+class Texture:
+    """Refcounted, content-addressed texture blobs shared between scenes (see utils/textures.py)."""
+
+    @staticmethod
+    def sync_scene(cursor, scene_id, blobs, refs=()):
+        """Points a scene at exactly the textures in `blobs` ({hash: bytes}) plus the already
+        stored textures in `refs`, and fixes refcounts.
+
+        Runs on the caller's cursor/transaction. Returns (hashes that are new and must be
+        uploaded before committing, (hash, s3 key) of textures nothing references any more).
+        """
+        hashes = set(blobs)
+        refs = set(refs) - hashes
+        if refs:
+            # References copied from a stored document (patches, restores); skip any that are gone
+            cursor.execute(queries.STORED_TEXTURES, (list(refs),))
+            hashes.update(row[0] for row in cursor.fetchall())
+        created = set()
+        if blobs:
+            rows = execute_values(
+                cursor,
+                "INSERT INTO textures (hash, s3_key, byte_size) VALUES %s ON CONFLICT (hash) DO NOTHING RETURNING hash",
+                [(texture_hash, texture_key(texture_hash), len(data)) for texture_hash, data in blobs.items()],
+                fetch=True
+            )
+            created = {row[0] for row in rows}
+            ContentBlob.lock(cursor, created)  # Held until commit, across the upload
+
+        cursor.execute(queries.SCENE_TEXTURE_HASHES, (scene_id,))
+        current = {row[0] for row in cursor.fetchall()}
+
+        added = hashes - current
+        if added:
+            execute_values(cursor, "INSERT INTO scene_textures (scene_id, texture_hash) VALUES %s",
+                           [(scene_id, texture_hash) for texture_hash in added])
+            cursor.execute("UPDATE textures SET ref_count = ref_count + 1 WHERE hash = ANY(%s)", (list(added),))
+
+        return created, Texture._release(cursor, scene_id, current - hashes)
+
+    @staticmethod
+    def release_scene(cursor, scene_id):
+        """Drops all of a scene's texture references. Returns (hash, s3 key) of textures that became unreferenced."""
+        return Texture.release_scenes(cursor, [scene_id])
+
+    @staticmethod
+    def release_scenes(cursor, scene_ids):
+        """Drops every texture reference held by `scene_ids` in two statements.
+
+        Returns (hash, s3 key) of textures that became unreferenced.
+        """
+        if not scene_ids:
+            return []
+        cursor.execute(queries.RELEASE_SCENE_TEXTURES, (list(scene_ids),))
+        orphaned = [texture_hash for texture_hash, ref_count in cursor.fetchall() if ref_count <= 0]
+        if not orphaned:
+            return []
+        cursor.execute("DELETE FROM textures WHERE hash = ANY(%s) AND ref_count <= 0 RETURNING hash, s3_key",
+                       (orphaned,))
+        return cursor.fetchall()
+
+    @staticmethod
+    def _release(cursor, scene_id, hashes):
+        # A concurrent save that wants a deleted texture waits for the row lock, then re-inserts
+        # and re-uploads it; the objects are deleted after commit under ContentBlob.lock.
+        if not hashes:
+            return []
+        hashes = list(hashes)
+        cursor.execute("DELETE FROM scene_textures WHERE scene_id = %s AND texture_hash = ANY(%s)", (scene_id, hashes))
+        cursor.execute("UPDATE textures SET ref_count = ref_count - 1 WHERE hash = ANY(%s)", (hashes,))
+        cursor.execute("DELETE FROM textures WHERE hash = ANY(%s) AND ref_count <= 0 RETURNING hash, s3_key", (hashes,))
+        return cursor.fetchall()
+
+class ContentBlob:
+    """Locks shared by uploads and deletes of content-addressed objects (textures, scene chunks).
+
+    A hash's row can be deleted and later re-created by another save, which uploads the
+    object again under the same key. Both sides hold the hash's advisory lock until they
+    commit, so a delete running after its commit either finishes before the re-upload or
+    sees the re-created row and keeps the object.
+    """
+    TABLES = {'texture': 'textures', 'chunk': 'scene_chunks'}
+
+    @staticmethod
+    def lock(cursor, hashes):
+        """Takes each hash's transaction-scoped lock, in sorted order so two callers never deadlock."""
+        if hashes:
+            cursor.execute("""
+                SELECT pg_advisory_xact_lock(hashtextextended(h, 0))
+                FROM (SELECT DISTINCT h FROM unnest(%s::TEXT[]) AS h ORDER BY h) ordered
+            """, (list(hashes),))
+
+    @staticmethod
+    def existing(cursor, kind, hashes):
+        """The subset of `hashes` that has a row of `kind` ('texture' or 'chunk')."""
+        cursor.execute(f"SELECT hash FROM {ContentBlob.TABLES[kind]} WHERE hash = ANY(%s)", (list(hashes),))
+        return {row[0] for row in cursor.fetchall()}
+
+
+class SceneThumbnail:
+    """Resized thumbnail variants (see utils/thumbnails.py)."""
+
+    @staticmethod
+    def record_variants(cursor, scene_id, image_url, variants):
+        """Stores `variants` unless the thumbnail was replaced or newer variants are recorded.
+
+        Returns (recorded, previous variants or None).
+        """
+        cursor.execute("""
+            SELECT variants FROM scene_thumbnails
+            WHERE scene_id = %s AND image_url = %s
+            FOR UPDATE
+        """, (scene_id, image_url))
+        row = cursor.fetchone()
+        if not row:
+            return False, None
+        previous = row[0]
+        if previous and previous.get('version', 0) > variants['version']:
+            return False, None
+        cursor.execute("UPDATE scene_thumbnails SET variants = %s WHERE scene_id = %s",
+                       (json.dumps(variants), scene_id))
+        return True, previous
+
+
+class SceneVersion:
+    """Saved versions of a scene, stored as shared content-defined chunks (see utils/scene_history.py)."""
+
+    @staticmethod
+    def begin(cursor, scene_id, version, scene_name, texture_hashes, restored_from=None):
+        """Records a version on the save's transaction and takes references on its textures.
+
+        The chunks are filled in later by record_chunks(). Idempotent: returns False if the
+        version already exists.
+        """
+        texture_hashes = sorted(set(texture_hashes))
+        cursor.execute("""
+            INSERT INTO scene_versions (scene_id, version, scene_name, texture_hashes, restored_from)
+            VALUES (%s, %s, %s, %s, %s)
+            ON CONFLICT (scene_id, version) DO NOTHING
+            RETURNING version
+        """, (scene_id, version, scene_name, texture_hashes, restored_from))
+        if not cursor.fetchone():
+            return False
+        if texture_hashes:
+            cursor.execute("UPDATE textures SET ref_count = ref_count + 1 WHERE hash = ANY(%s)", (texture_hashes,))
+        return True
+
+    @staticmethod
+    def record_chunks(cursor, scene_id, version, chunks, byte_size):
+        """Stores the chunk list of a pending version and takes references on its chunks.
+
+        `chunks` is [(hash, byte_size, stored_size)] in document order. Returns the hashes
+        storage has never seen (the caller uploads them before committing, under their
+        ContentBlob locks), or None when the version is gone or already recorded.
+        """
+        cursor.execute("""
+            SELECT 1 FROM scene_versions
+            WHERE scene_id = %s AND version = %s AND chunk_hashes IS NULL
+            FOR UPDATE
+        """, (scene_id, version))
+        if not cursor.fetchone():
+            return None
+
+        distinct = {chunk_hash: (size, stored_size) for chunk_hash, size, stored_size in chunks}
+        created = set()
+        if distinct:
+            rows = execute_values(
+                cursor,
+                "INSERT INTO scene_chunks (hash, s3_key, byte_size, stored_size) VALUES %s ON CONFLICT (hash) DO NOTHING RETURNING hash",
+                [(chunk_hash, chunk_key(chunk_hash), size, stored_size) for chunk_hash, (size, stored_size) in distinct.items()],
+                fetch=True
+            )
+            created = {row[0] for row in rows}
+            ContentBlob.lock(cursor, created)  # Held until commit, across the upload
+            cursor.execute("UPDATE scene_chunks SET ref_count = ref_count + 1 WHERE hash = ANY(%s)", (list(distinct),))
+
+        cursor.execute("""
+            UPDATE scene_versions SET chunk_hashes = %s, byte_size = %s, new_bytes = %s
+            WHERE scene_id = %s AND version = %s
+        """, ([chunk_hash for chunk_hash, _, _ in chunks], byte_size,
+              sum(distinct[chunk_hash][1] for chunk_hash in created), scene_id, version))
+        return created
+
+    @staticmethod
+    def get(cursor, scene_id, version):
+        """Returns (chunk_hashes, texture_hashes, scene_name); chunk_hashes is None while pending."""
+        cursor.execute(queries.SCENE_VERSION, (scene_id, version))
+        return cursor.fetchone()
+
+    @staticmethod
+    def prune(cursor, scene_id, keep):
+        """Drops all but the newest `keep` versions. Returns ((hash, key) of chunks, of textures) left unreferenced."""
+        return SceneVersion._release(cursor, """
+            v.scene_id = %(scene_id)s AND v.version <= (
+                SELECT version FROM scene_versions WHERE scene_id = %(scene_id)s
+                ORDER BY version DESC OFFSET %(keep)s LIMIT 1
+            )
+        """, {'scene_id': scene_id, 'keep': keep})
+
+    @staticmethod
+    def discard(cursor, scene_id, version):
+        """Drops a version that is still pending (its document can no longer be chunked).
+        Returns ((hash, key) of chunks, of textures) left unreferenced."""
+        return SceneVersion._release(cursor, """
+            v.scene_id = %(scene_id)s AND v.version = %(version)s AND v.chunk_hashes IS NULL
+        """, {'scene_id': scene_id, 'version': version})
+
+    @staticmethod
+    def release_scenes(cursor, scene_ids):
+        """Drops every version of `scene_ids`. Returns ((hash, key) of chunks, of textures) left unreferenced."""
+        if not scene_ids:
+            return [], []
+        return SceneVersion._release(cursor, "v.scene_id = ANY(%(scene_ids)s)", {'scene_ids': list(scene_ids)})
+
+    @staticmethod
+    def _release(cursor, condition, params):
+        # Callers delete the returned objects after committing (see ContentBlob).
+        cursor.execute(f"""
+            WITH removed AS (
+                DELETE FROM scene_versions v WHERE {condition}
+                RETURNING v.scene_id, v.version, v.chunk_hashes, v.texture_hashes
+            ), chunk_refs AS (
+                SELECT hash, COUNT(*) AS n
+                FROM (SELECT DISTINCT r.scene_id, r.version, h.hash FROM removed r, unnest(r.chunk_hashes) AS h (hash)) d
+                GROUP BY hash
+            ), texture_refs AS (
+                SELECT hash, COUNT(*) AS n
+                FROM (SELECT DISTINCT r.scene_id, r.version, h.hash FROM removed r, unnest(r.texture_hashes) AS h (hash)) d
+                GROUP BY hash
+            ), chunks AS (
+                UPDATE scene_chunks c SET ref_count = c.ref_count - r.n
+                FROM chunk_refs r WHERE c.hash = r.hash
+                RETURNING c.hash, c.ref_count
+            ), textures AS (
+                UPDATE textures t SET ref_count = t.ref_count - r.n
+                FROM texture_refs r WHERE t.hash = r.hash
+                RETURNING t.hash, t.ref_count
+            )
+            SELECT 'chunk', hash, ref_count FROM chunks
+            UNION ALL
+            SELECT 'texture', hash, ref_count FROM textures
+        """, params)
+        orphaned = {'chunk': [], 'texture': []}
+        for kind, orphan_hash, ref_count in cursor.fetchall():
+            if ref_count <= 0:
+                orphaned[kind].append(orphan_hash)
+
+        chunk_keys = texture_keys = []
+        if orphaned['chunk']:
+            cursor.execute("DELETE FROM scene_chunks WHERE hash = ANY(%s) AND ref_count <= 0 RETURNING hash, s3_key",
+                           (orphaned['chunk'],))
+            chunk_keys = cursor.fetchall()
+        if orphaned['texture']:
+            cursor.execute("DELETE FROM textures WHERE hash = ANY(%s) AND ref_count <= 0 RETURNING hash, s3_key",
+                           (orphaned['texture'],))
+            texture_keys = cursor.fetchall()
+        return chunk_keys, texture_keys
+
+
+class SceneUpload:
+    """Direct uploads that have been committed; each uploadId may back one scene version only."""
+
+    @staticmethod
+    def claim(cursor, upload_id, user_id, scene_id, version):
+        """Records `upload_id` as committed to `scene_id` v`version` on the caller's transaction.
+
+        Returns None if it was not committed before, otherwise the (scene_id, version) it
+        was committed to. A concurrent claim of the same id waits for this transaction.
+        """
+        cursor.execute("""
+            INSERT INTO scene_uploads (upload_id, user_id, scene_id, version) VALUES (%s, %s, %s, %s)
+            ON CONFLICT (upload_id) DO NOTHING
+            RETURNING upload_id
+        """, (upload_id, user_id, scene_id, version))
+        if cursor.fetchone():
+            return None
+        cursor.execute("SELECT scene_id, version FROM scene_uploads WHERE upload_id = %s", (upload_id,))
+        return cursor.fetchone()
+
+
+class PendingStorageDelete:
+    """Storage objects queued for another delete attempt (see utils/storage_cleanup.py)."""
+
+    # SQL that is true when a scene or thumbnail row points at {key} again (keys can be reused)
+    LIVE_KEY = """
+        EXISTS (SELECT 1 FROM Scenes s WHERE s.s3_key = {key})
+        OR EXISTS (SELECT 1 FROM scene_thumbnails st WHERE st.image_url = {key})
+    """
+
+    @staticmethod
+    def live_keys(cursor, keys):
+        """The subset of `keys` that a scene or thumbnail row points at, so must not be deleted."""
+        if not keys:
+            return set()
+        cursor.execute(f"""
+            SELECT k.key FROM unnest(%s::TEXT[]) AS k (key)
+            WHERE {PendingStorageDelete.LIVE_KEY.format(key='k.key')}
+        """, (list(keys),))
+        return {row[0] for row in cursor.fetchall()}
+
+    @staticmethod
+    def queue(cursor, failures):
+        """Queues [(store, bucket, key, error)] on the caller's transaction; re-queued keys keep their row."""
+        if not failures:
+            return
+        execute_values(cursor, """
+            INSERT INTO pending_storage_deletes (store, bucket, object_key, last_error) VALUES %s
+            ON CONFLICT (store, bucket, object_key) DO UPDATE SET last_error = EXCLUDED.last_error
+        """, [(store, bucket, key, str(error)[:1000]) for store, bucket, key, error in failures])
+
+    @staticmethod
+    def claim_due(cursor, limit, max_attempts):
+        """Locks up to `limit` due rows (skipping rows another worker holds).
+
+        Returns [(id, store, bucket, key, live)]; `live` is true when a scene or thumbnail row
+        points at the key again (keys can be reused), in which case it must not be deleted.
+        """
+        cursor.execute(f"""
+            SELECT p.id, p.store, p.bucket, p.object_key,
+                   {PendingStorageDelete.LIVE_KEY.format(key='p.object_key')}
+            FROM pending_storage_deletes p
+            WHERE p.next_attempt_at <= NOW() AND p.attempts < %s
+            ORDER BY p.next_attempt_at
+            LIMIT %s
+            FOR UPDATE OF p SKIP LOCKED
+        """, (max_attempts, limit))
+        return cursor.fetchall()
+
+    @staticmethod
+    def resolve(cursor, ids):
+        if ids:
+            cursor.execute("DELETE FROM pending_storage_deletes WHERE id = ANY(%s)", (list(ids),))
+
+    @staticmethod
+    def reschedule(cursor, errors, backoff_seconds, max_backoff_seconds):
+        """Records another failed attempt for {id: error}, backing off exponentially."""
+        if not errors:
+            return
+        ids = list(errors)
+        cursor.execute("""
+            UPDATE pending_storage_deletes p
+            SET attempts = p.attempts + 1,
+                last_error = f.error,
+                next_attempt_at = NOW() + LEAST(%s * POWER(2, p.attempts), %s) * INTERVAL '1 second'
+            FROM unnest(%s::BIGINT[], %s::TEXT[]) AS f (id, error)
+            WHERE p.id = f.id
+        """, (backoff_seconds, max_backoff_seconds, ids, [str(errors[row_id])[:1000] for row_id in ids]))
+
+
 class Subscription:
     def __init__(self, id, user_id, subscription_level, start_date, end_date, payment_id, auto_renew):
         self.id = id
@@ -215,19 +674,13 @@ class Subscription:
                 conn.close()
     @staticmethod
     def get_subscription_by_user_id(user_id):
-        conn = get_db_connection()
+        conn = get_db_connection(readonly=True)
         if conn is None:
             return None
 
         try:
             with conn.cursor() as cursor:
-                cursor.execute("""
-                    SELECT *
-                    FROM subscriptions
-                    WHERE user_id = %s
-                    ORDER BY start_date DESC
-                    LIMIT 1
-                """, (user_id,))
+                cursor.execute(queries.LATEST_SUBSCRIPTION, (user_id,))
                 subscription_data = cursor.fetchone()
                 if subscription_data:
                     return Subscription(subscription_data[0], subscription_data[1], subscription_data[2], subscription_data[3], subscription_data[4], subscription_data[5], subscription_data[6])
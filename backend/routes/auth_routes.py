@@ -3,6 +3,7 @@ from flask import Blueprint, make_response, request, jsonify, session, current_a
 from werkzeug.security import check_password_hash
 from models import User  # Assuming you have a User model
 from utils.decorators import login_required  # Assuming you have a login_required decorator
+from utils.identity import cache_identity, get_current_user
 import logging
 
 auth_bp = Blueprint('auth', __name__, url_prefix='/auth')
@@ -42,7 +43,9 @@ def signin():
     user = User.get_user_by_username(username)
     if user and user.check_password(password):
         session['username'] = user.username
+        session['user_id'] = user.id
         session.permanent = True
+        cache_identity(user)
 
         if current_app.redis:
             try:
@@ -63,6 +66,7 @@ def signin():
 def logout():
     username = session.get('username')
     session.pop('username', None) # Remove user from session
+    session.pop('user_id', None)
 
     # --- Redis cleanup (Keep this) ---
     if current_app.redis and username: # Check if username exists
@@ -111,7 +115,7 @@ def logout():
 def check_auth():
     if 'username' in session:
         username = session['username']
-        user = User.get_user_by_username(username)
+        user = get_current_user()
         if user:
             if current_app.redis:
                 try:
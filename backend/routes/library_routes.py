@@ -1,104 +1,94 @@
 from flask import Blueprint, jsonify, request, current_app
-import boto3
-from botocore.exceptions import ClientError
 import psycopg2  
 import os
 from utils.decorators import login_required
 from datetime import datetime, timedelta
 from utils.db import get_db_connection
+from utils.storage import get_storage, StorageError
+from utils.pagination import encode_cursor, parse_limit
+from utils import library_catalog
 import logging
 import json  
 
 library_bp = Blueprint('library', __name__, url_prefix='/library')
 
-# --- Cloudflare R2 Client Setup (Keep this!) ---
-
-CLOUDFLARE_ACCESS_KEY = os.environ.get('CLOUDFLARE_ACCESS_KEY')
-CLOUDFLARE_SECRET_KEY = os.environ.get('CLOUDFLARE_SECRET_KEY')
-CLOUDFLARE_TOKEN = os.environ.get('CLOUDFLARE_TOKEN')
-CLOUDFLARE_ENDPOINT = os.environ.get('CLOUDFLARE_ENDPOINT')
-CLOUDFLARE_R2_REGION = "auto"
-CLOUDFLARE_BUCKET_NAME = os.environ.get('CLOUDFLARE_BUCKET_NAME')
-
-def get_r2_client():
-     return boto3.client(
-        's3',
-        region_name=CLOUDFLARE_R2_REGION,
-        endpoint_url=CLOUDFLARE_ENDPOINT,
-        aws_access_key_id=CLOUDFLARE_ACCESS_KEY,
-        aws_secret_access_key=CLOUDFLARE_SECRET_KEY
-    )
+# Models and their thumbnails live in the 'media' storage (utils/storage.py)
 
 # --- Logging Configuration ---
 logging.basicConfig(level=logging.INFO)
 
+
+def _with_image_urls(models):
+    """Copies of `models` with model_image replaced by a presigned URL (None if it cannot be signed)."""
+    # Sign every thumbnail in one batch; URLs are stable within a signing window, so browsers cache the images
+    image_keys = [model['model_image'] for model in models if model.get('model_image')]
+    image_urls = {}
+    try:
+        image_urls = get_storage('media').presign_many(image_keys, expires_in=3600)  # Valid for at least 1 hour
+    except Exception as e:
+        print(f"Error generating thumbnail URLs: {e}")
+    model_list = []
+    for model in models:
+        model_dict = dict(model)
+        if model_dict.get('model_image'):
+            model_dict['model_image'] = image_urls.get(model_dict['model_image'])
+        model_list.append(model_dict)
+    return model_list
+
+
 @library_bp.route('/models', methods=['GET'])
 def get_library_models():
+    """Lists library models from the worker's in-memory catalog (utils/library_catalog.py).
+
+    Without paging parameters, returns every model (of `category`, if given) as a list.
+    Passing `q`, `sort`, `limit` or `cursor` returns one page instead:
+    {"models", "total", "facets": [{"category", "count"}], "next_cursor"}. `q` matches
+    the words of model names by prefix, `sort` is "name" (default) or "newest", and the
+    facets count the matches in each category regardless of `category`.
+    """
     category = request.args.get('category')
-    cache_key = f"library_models:{category}" if category and category != "All" else "library_models:all"  # More specific key
-
-    if current_app.redis:
+    if category == "All":
+        category = None
+
+    paged = any(name in request.args for name in ('q', 'sort', 'limit', 'cursor'))
+    sort = request.args.get('sort') or library_catalog.DEFAULT_SORT
+    limit = after = None
+    if paged:
+        if sort not in library_catalog.SORTS:
+            return jsonify({'message': f"sort must be one of {', '.join(library_catalog.SORTS)}"}), 400
+        cursor_param = request.args.get('cursor')
         try:
-            cached_models_json = current_app.redis.get(cache_key)
-            if cached_models_json:
-                logging.info(f"Returning library models from cache (key: {cache_key})")
-                return jsonify(json.loads(cached_models_json.decode('utf-8'))), 200
-        except Exception as e:
-            logging.error(f"Error retrieving models from cache: {e}")
+            limit = parse_limit(request.args.get('limit'))
+            after = library_catalog.parse_cursor(sort, cursor_param) if cursor_param else None
+        except ValueError as e:
+            return jsonify({'message': str(e)}), 400
 
-    conn = None
     try:
-        conn = get_db_connection()
-        if conn is None:
-            return jsonify({'message': 'Database connection failed'}), 500
-
-        with conn.cursor() as cursor:
-            if category and category != "All":
-                cursor.execute("SELECT * FROM library_models WHERE model_category = %s", (category,))
-            else:
-                cursor.execute("SELECT * FROM library_models")
-
-            models = cursor.fetchall()
-
-            column_names = [desc[0] for desc in cursor.description]
-            model_list = []
-            for model_row in models:
-                model_dict = dict(zip(column_names, model_row))
-
-                if 'model_image' in model_dict and model_dict['model_image']:
-                    try:
-                        r2 = get_r2_client()
-                        presigned_thumbnail_url = r2.generate_presigned_url(
-                            'get_object',
-                            Params={'Bucket': CLOUDFLARE_BUCKET_NAME, 'Key': model_dict['model_image']},
-                            ExpiresIn=3600  # 1 hour
-                        )
-                        model_dict['model_image'] = presigned_thumbnail_url
-                    except Exception as e:
-                        print(f"Error generating thumbnail URL: {e}")
-                        model_dict['model_image'] = None
-
-                model_list.append(model_dict)
-
-            # --- Cache the model list ---
-            if current_app.redis:
-                try:
-                    current_app.redis.setex(cache_key, 3600, json.dumps(model_list))  # Cache for 1 hour
-                    logging.info(f"Cached library models (key: {cache_key})")
-                except Exception as e:
-                    logging.error(f"Error caching models: {e}")
-
-            return jsonify(model_list), 200
-
+        catalog = library_catalog.get_catalog()
     except psycopg2.Error as e:
         print(f"Database error: {e}")
         return jsonify({'message': 'Database error'}), 500
     except Exception as e:
         print(f"Error fetching models: {e}")
         return jsonify({'message': 'Failed to fetch library models'}), 500
-    finally:
-        if conn:
-            conn.close()
+
+    if not paged:
+        models, _, _ = catalog.search(category=category)
+        return jsonify(_with_image_urls(models)), 200
+
+    models, total, facets = catalog.search(category, request.args.get('q'), sort, after, limit + 1)
+    next_cursor = None
+    if len(models) > limit:  # One extra model tells us there is another page
+        models = models[:limit]
+        next_cursor = encode_cursor(*catalog.cursor_key(sort, models[-1]))
+
+    return jsonify({
+        'models': _with_image_urls(models),
+        'total': total,
+        'facets': [{'category': name, 'count': count}
+                   for name, count in sorted(facets.items(), key=lambda facet: str(facet[0]))],
+        'next_cursor': next_cursor,
+    }), 200
 
 
 @library_bp.route('/models/<int:model_id>/signed_url', methods=['GET'])
@@ -116,7 +106,7 @@ def get_signed_url(model_id):
 
     conn = None
     try:
-        conn = get_db_connection()
+        conn = get_db_connection(readonly=True)
         if conn is None:
             return jsonify({'message': 'Database connection failed'}), 500
 
@@ -129,12 +119,7 @@ def get_signed_url(model_id):
 
             model_url = result[0]
 
-            r2 = get_r2_client()
-            presigned_url = r2.generate_presigned_url(
-                'get_object',
-                Params={'Bucket': CLOUDFLARE_BUCKET_NAME, 'Key': model_url},
-                ExpiresIn=3600
-            )
+            presigned_url = get_storage('media').presign(model_url, expires_in=3600)
 
             # --- Cache the signed URL ---
             if current_app.redis:
@@ -149,8 +134,8 @@ def get_signed_url(model_id):
     except psycopg2.Error as e:
         print(f"Database error: {e}")
         return jsonify({'message': 'Database error'}), 500
-    except ClientError as e:
-        print(f"Boto3 error: {e}")
+    except StorageError as e:
+        print(f"Storage error: {e}")
         return jsonify({'message': 'Failed to generate signed URL'}), 500
     except Exception as e:
         print(f"Error getting signed URL: {e}")
@@ -186,15 +171,12 @@ def add_library_model():
             column_names = [desc[0] for desc in cursor.description]
             model_dict = dict(zip(column_names, inserted_model))
 
-        # --- Invalidate the cache when a model is added ---
-        if current_app.redis:
-            try:
-                current_app.redis.delete("library_models:all")  # Invalidate the 'all' cache
-                if model_category:
-                    current_app.redis.delete(f"library_models:{model_category}")  # Invalidate category-specific cache
-                logging.info("Invalidated library model cache after adding new model")
-            except Exception as e:
-                logging.error(f"Error invalidating cache: {e}")
+        # --- Make every worker reload its catalog ---
+        try:
+            library_catalog.invalidate()
+            logging.info("Invalidated library catalog after adding new model")
+        except Exception as e:
+            logging.error(f"Error invalidating library catalog: {e}")
 
         return jsonify({'message': 'Model added successfully', 'model': model_dict}), 201
 
@@ -1,8 +1,10 @@
 import os
-from flask import Blueprint, request, jsonify, session
+from flask import Blueprint, request, jsonify, g
 from models import User, Subscription
 from utils.decorators import login_required
 from utils.db import get_db_connection
+from utils.identity import invalidate_identity
+from utils import jobs, queries
 from dotenv import load_dotenv
 import logging
 import razorpay
@@ -62,10 +64,7 @@ def create_razorpay_order():
         amount = int(plan['amount']) * 100  # Amount in USD cents
         currency = "USD"  # Force currency to USD
 
-        username = session['username']
-        user = User.get_user_by_username(username)
-        if not user:
-            return jsonify({'error': 'User not found'}), 404
+        user = g.user
 
         # Create a Razorpay Order
         try:
@@ -86,55 +85,32 @@ def create_razorpay_order():
         return jsonify({'error': str(e)}), 500
 
 
-# --------------------------------------------------------------------------------#
-#                                  VERIFY PAYMENT                                  #
-# --------------------------------------------------------------------------------#
-@payment_bp.route('/verify-payment', methods=['POST'])
-@login_required
-def verify_razorpay_payment():
-    try:
-        data = request.get_json()
-
-        # Get parameters sent by Razorpay callback
-        razorpay_payment_id = data.get('razorpay_payment_id')
-        razorpay_order_id = data.get('razorpay_order_id')
-        razorpay_signature = data.get('razorpay_signature')
-        plan_id = data.get('plan_id')
+@jobs.job('payments.provision_subscription')
+def provision_subscription(user_id, plan_id, razorpay_payment_id):
+    """Activates the plan paid for by a verified payment. Safe to retry: a payment is applied
+    once (checked under the user's row lock, backed by a unique index on payment_id)."""
+    plan = PRICING[plan_id]
 
-        # Verify signature
-        params_dict = {
-            'razorpay_payment_id': razorpay_payment_id,
-            'razorpay_order_id': razorpay_order_id,
-            'razorpay_signature': razorpay_signature
-        }
-
-        # Verify the payment signature
-        try:
-            razorpay_client.utility.verify_payment_signature(params_dict)
-        except Exception as e:
-            logging.error(f"Signature verification failed: {e}")
-            return jsonify({'error': 'Payment signature verification failed'}), 400
-
-        # Get plan details
-        if plan_id not in PRICING:
-            logging.error(f"Invalid plan ID: {plan_id}")
-            return jsonify({'error': 'Invalid plan ID'}), 400
-
-        plan = PRICING[plan_id]
-
-        # Get the user information
-        username = session['username']
-        user = User.get_user_by_username(username)
-
-        if not user:
-            logging.error(f"User not found: {username}")
-            return jsonify({'error': 'User not found'}), 404
-
-        # Connect to database
-        conn = get_db_connection()
+    conn = get_db_connection()
+    if conn is None:
+        raise RuntimeError("Database connection failed")
+    try:
         cursor = conn.cursor()
 
-        cursor.execute("SELECT * FROM subscriptions WHERE user_id = %s", (user.id,))
+        # The user's row lock makes the inline attempt and a queued retry run one after the other
+        cursor.execute("SELECT id FROM users WHERE id = %s FOR UPDATE", (user_id,))
+        cursor.execute("SELECT 1 FROM subscriptions WHERE payment_id = %s", (razorpay_payment_id,))
+        if cursor.fetchone():
+            conn.rollback()
+            logging.info(f"Payment {razorpay_payment_id} already provisioned for user {user_id}")
+            return
+
+        # The subscription user lookups read: the latest one
+        cursor.execute("""
+            SELECT id FROM subscriptions WHERE user_id = %s
+            ORDER BY start_date DESC, id DESC
+            LIMIT 1
+        """, (user_id,))
         existing_subscription = cursor.fetchone()
 
         import datetime
@@ -150,21 +126,22 @@ def verify_razorpay_payment():
                 UPDATE subscriptions
                 SET subscription_level = %s, payment_id = %s,
                     start_date = %s, end_date = %s
-                WHERE user_id = %s
+                WHERE id = %s
             """, (
                 plan['subscription_level'],
                 razorpay_payment_id,
                 start_date,
                 end_date,
-                user.id
+                existing_subscription[0]
             ))
         else:
             cursor.execute("""
                 INSERT INTO subscriptions
                 (user_id, subscription_level, payment_id, start_date, end_date, auto_renew)
                 VALUES (%s, %s, %s, %s, %s, %s)
+                ON CONFLICT (payment_id) WHERE payment_id IS NOT NULL DO NOTHING
             """, (
-                user.id,
+                user_id,
                 plan['subscription_level'],
                 razorpay_payment_id,
                 start_date,
@@ -178,14 +155,69 @@ def verify_razorpay_payment():
             WHERE id = %s
         """, (
             plan['subscription_level'],
-            user.id
+            user_id
         ))
 
         conn.commit()
         cursor.close()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
         conn.close()
 
-        return jsonify({'message': 'Payment successful and subscription provisioned'}), 200
+    invalidate_identity(user_id)  # Cached subscription level is now stale
+    logging.info(f"Provisioned {plan_id} for user {user_id} (payment {razorpay_payment_id})")
+
+
+# --------------------------------------------------------------------------------#
+#                                  VERIFY PAYMENT                                  #
+# --------------------------------------------------------------------------------#
+@payment_bp.route('/verify-payment', methods=['POST'])
+@login_required
+def verify_razorpay_payment():
+    try:
+        data = request.get_json()
+
+        # Get parameters sent by Razorpay callback
+        razorpay_payment_id = data.get('razorpay_payment_id')
+        razorpay_order_id = data.get('razorpay_order_id')
+        razorpay_signature = data.get('razorpay_signature')
+        plan_id = data.get('plan_id')
+
+        # Verify signature
+        params_dict = {
+            'razorpay_payment_id': razorpay_payment_id,
+            'razorpay_order_id': razorpay_order_id,
+            'razorpay_signature': razorpay_signature
+        }
+
+        # Verify the payment signature
+        try:
+            razorpay_client.utility.verify_payment_signature(params_dict)
+        except Exception as e:
+            logging.error(f"Signature verification failed: {e}")
+            return jsonify({'error': 'Payment signature verification failed'}), 400
+
+        # Get plan details
+        if plan_id not in PRICING:
+            logging.error(f"Invalid plan ID: {plan_id}")
+            return jsonify({'error': 'Invalid plan ID'}), 400
+
+        # Get the user information
+        user = g.user
+
+        # The payment is captured and verified; if provisioning fails now it is retried in the
+        # background and the client polls /get-subscription until the plan shows up
+        try:
+            provision_subscription(user.id, plan_id, razorpay_payment_id)
+        except Exception as e:
+            logging.exception(f"Provisioning {plan_id} for user {user.id} failed, retrying in the background: {e}")
+            jobs.enqueue('payments.provision_subscription', user.id, plan_id, razorpay_payment_id)
+            return jsonify({'message': 'Payment received, your subscription is being activated',
+                            'status': 'pending'}), 202
+
+        return jsonify({'message': 'Payment successful and subscription provisioned', 'status': 'active'}), 200
 
     except Exception as e:
         logging.exception(f"Error verifying payment: {e}")
@@ -196,18 +228,11 @@ def verify_razorpay_payment():
 @login_required
 def get_subscription():
     try:
-        username = session['username']
-        user = User.get_user_by_username(username)
+        user = g.user
 
-        conn = get_db_connection()
+        conn = get_db_connection(readonly=True)
         cursor = conn.cursor()
-        cursor.execute("""
-            SELECT subscription_level, end_date
-            FROM subscriptions
-            WHERE user_id = %s
-            ORDER BY end_date DESC
-            LIMIT 1
-        """, (user.id,))
+        cursor.execute(queries.SUBSCRIPTION_END_DATE, (user.id,))
         subscription = cursor.fetchone()
         conn.close()
 
@@ -1,11 +1,19 @@
 # --- scene_routes.py --- (Revised with Subscription Checks, Caching, and Thumbnail Fix)
-from flask import Blueprint, request, jsonify, session, current_app
-import boto3
+from flask import Blueprint, Response, request, jsonify, current_app, g, redirect
+import re
 import json
-from botocore.exceptions import ClientError
+import hashlib
+import uuid
 from utils.db import get_db_connection
-from models import User
+from utils.storage import get_storage, StorageError, ObjectNotFound
+from models import Scene, Texture, SceneVersion, SceneUpload
 from utils.decorators import login_required
+from utils.identity import has_paid_plan
+from utils.pagination import encode_cursor, decode_cursor, parse_limit
+from utils.compression import gzip_bytes, gunzip_bytes, gunzip_chunks, accepts_encoding
+from utils.json_patch import apply_patch, apply_merge_patch, JsonPatchError
+from utils.textures import extract_textures, texture_refs, inline_textures, upload_textures, fetch_texture, delete_texture_objects
+from utils import thumbnails, scene_history, scene_index, community_examples, jobs, queries
 import os
 from dotenv import load_dotenv
 from pathlib import Path
@@ -21,81 +29,79 @@ scene_bp = Blueprint('scene', __name__, url_prefix='/')
 
 
 # --- Configuration ---
-AWS_REGION = os.environ.get('AWS_REGION')
-S3_BUCKET_NAME = os.environ.get('S3_BUCKET_NAME')
-AWS_ACCESS_KEY_ID = os.environ.get('AWS_ACCESS_KEY_ID')
-AWS_SECRET_ACCESS_KEY = os.environ.get('AWS_SECRET_ACCESS_KEY')
-
-SUPABASE_S3_REGION = os.environ.get('SUPABASE_S3_REGION')
-SUPABASE_S3_ENDPOINT = os.environ.get('SUPABASE_S3_ENDPOINT')
-SUPABASE_S3_ACCESS_KEY = os.environ.get('SUPABASE_S3_ACCESS_KEY')
-SUPABASE_S3_SECRET_KEY = os.environ.get('SUPABASE_S3_SECRET_KEY')
-SUPABASE_BUCKET_NAME = os.environ.get('SUPABASE_BUCKET_NAME')
-SUPABASE_API_KEY = os.environ.get('SUPABASE_SERVICE_ROLE_KEY')
-SUPABASE_URL = os.environ.get('SUPABASE_URL')
-
-CLOUDFLARE_ACCESS_KEY = os.environ.get('CLOUDFLARE_ACCESS_KEY')
-CLOUDFLARE_SECRET_KEY = os.environ.get('CLOUDFLARE_SECRET_KEY')
-CLOUDFLARE_TOKEN = os.environ.get('CLOUDFLARE_TOKEN')
-CLOUDFLARE_ENDPOINT = os.environ.get('CLOUDFLARE_ENDPOINT')
-CLOUDFLARE_R2_REGION = "auto"
-CLOUDFLARE_BUCKET_NAME = os.environ.get('CLOUDFLARE_BUCKET_NAME')
+# Scene documents live in the 'scenes' storage, thumbnails in 'media' and community examples
+# in 'community' (utils/storage.py); buckets and credentials are resolved on first use.
+S3_BUCKET_NAME = os.environ.get('S3_BUCKET_NAME')  # Recorded in Scenes.s3_bucket_name
+
+SCENE_STREAM_CHUNK_SIZE = int(os.environ.get('SCENE_STREAM_CHUNK_SIZE', 64 * 1024))  # Bytes per streamed chunk
+PAYLOAD_CACHE_CONTROL = 'private, no-cache'  # Scene/example payloads are kept but revalidated (If-None-Match)
+
+# --- Direct Upload Configuration ---
+SCENE_UPLOAD_URL_TTL = int(os.environ.get('SCENE_UPLOAD_URL_TTL', 900))                        # Seconds upload targets stay valid
+SCENE_UPLOAD_MAX_BYTES = int(os.environ.get('SCENE_UPLOAD_MAX_BYTES', 50 * 1024 * 1024))       # Enforced by the POST policy
+THUMBNAIL_UPLOAD_MAX_BYTES = int(os.environ.get('THUMBNAIL_UPLOAD_MAX_BYTES', 5 * 1024 * 1024))  # Checked on commit
+SCENE_DOWNLOAD_URL_TTL = int(os.environ.get('SCENE_DOWNLOAD_URL_TTL', 300))                    # Seconds presigned scene GETs stay valid
+BULK_DELETE_MAX_SCENES = int(os.environ.get('BULK_DELETE_MAX_SCENES', 10000))                # Scene ids per /delete-scenes call
 
 # --- Logging Configuration ---
 logging.basicConfig(level=logging.INFO)
 
 
-if not AWS_REGION:
-    raise ValueError("AWS_REGION environment variable not set.")
-if not S3_BUCKET_NAME:
-    raise ValueError("S3_BUCKET_NAME environment variable not set.")
-
-if AWS_ACCESS_KEY_ID and AWS_SECRET_ACCESS_KEY:
-    s3_client = boto3.client(
-        's3',
-        region_name=AWS_REGION,
-        aws_access_key_id=AWS_ACCESS_KEY_ID,
-        aws_secret_access_key=AWS_SECRET_ACCESS_KEY
-    )
-else:
-    s3_client = boto3.client('s3', region_name=AWS_REGION)
+def _put_scene_document(cursor, scene_id, version, scene_name, object_key, document, restored_from=None):
+    """Writes a scene document to storage with its textures split out into shared blobs,
+    and records it as `version` in the scene's history.
 
-if not SUPABASE_S3_ENDPOINT or not SUPABASE_API_KEY or not SUPABASE_BUCKET_NAME:
-    raise ValueError("Supabase environment variables (URL, KEY, BUCKET_NAME) are not set.")
+    Texture rows are synced on the caller's transaction; only textures that storage has
+    never seen are uploaded. References already in the document (patches, restores) are
+    kept. Returns ((hash, key) of textures that lost their last reference, which the caller
+    passes to delete_texture_objects after committing; the gzipped document for the
+    scenes.record_version job).
+    """
+    blobs = extract_textures(document.get('objects'))
+    refs = texture_refs(document.get('objects'))
+    created, orphaned = Texture.sync_scene(cursor, scene_id, blobs, refs)
+    upload_textures({texture_hash: blobs[texture_hash] for texture_hash in created})
+    SceneVersion.begin(cursor, scene_id, version, scene_name, refs, restored_from)
 
-cloudflare_r2_client = boto3.client(
-    's3',
-    region_name=CLOUDFLARE_R2_REGION,
-    endpoint_url=CLOUDFLARE_ENDPOINT,
-    aws_access_key_id=CLOUDFLARE_ACCESS_KEY,
-    aws_secret_access_key=CLOUDFLARE_SECRET_KEY
-)
+    json_data = gzip_bytes(json.dumps(document).encode('utf-8'))
+    get_storage('scenes').put(object_key, json_data, content_type='application/json', content_encoding='gzip',
+                              metadata={'texture-refs': '1' if refs else '0'})
+    print(f"Uploaded scene data: {object_key} ({len(refs)} textures, {len(created)} new)")
+    return orphaned, json_data
 
 
 @scene_bp.route('/save', methods=['POST'])
 @login_required
 def save_scene():
-    username = session.get('username')
-    if not username:
-        return jsonify({'error': 'Unauthorized'}), 403
-
-    user = User.get_user_by_username(username)
-    if not user:
-        return jsonify({'error': 'User not found'}), 404
+    user = g.user
+    username = user.username
     user_id = user.id
 
-    # --- SUBSCRIPTION CHECK (with Redis caching) ---
-    if current_app.redis:
-        try:
-            subscription_key = f"subscription:{user_id}"
-            subscription_level = current_app.redis.get(subscription_key)
-            if subscription_level:
-                subscription_level = subscription_level.decode('utf-8')
-                logging.info(f"Subscription level retrieved from cache for user {username}")
-                if subscription_level == 'free':
-                    return jsonify({'error': 'Saving scenes requires a Pro subscription'}), 403
-        except Exception as e:
-            logging.error(f"Error checking subscription from Redis: {e}")
+    # --- SUBSCRIPTION CHECK (identity cache, refreshed when a payment is verified) ---
+    if not has_paid_plan(user):
+        return jsonify({'error': 'Saving scenes requires a Pro subscription'}), 403
+
+    scene_data_json = request.form.get('sceneData')
+    scene_name = request.form.get('sceneName')
+    if not scene_data_json or not scene_name:
+        return jsonify({'error': 'Missing required data'}), 400
+    try:
+        scene_data = json.loads(scene_data_json)
+    except ValueError:
+        return jsonify({'error': 'sceneData is not valid JSON'}), 400
+    if not isinstance(scene_data, dict):
+        return jsonify({'error': 'sceneData must be a JSON object'}), 400
+
+    objects = scene_data.get('objects')
+    scene_settings = scene_data.get('sceneSettings')
+    scene_id = scene_data.get('sceneId')
+    thumbnail_file = request.files.get('thumbnail')
+    thumbnail_bytes = thumbnail_file.read() if thumbnail_file else None
+
+    if scene_id:
+        object_key = f"{user_id}/{scene_id}-{scene_name}-{username}.json"
+    else:
+        object_key = f"{user_id}/{scene_name}-{username}.json"
 
     conn = None
     try:
@@ -103,123 +109,44 @@ def save_scene():
         if conn is None:
             return jsonify({'error': 'Database connection failed'}), 500
 
-        if not current_app.redis or not subscription_level: # Only query if not cached
-            with conn.cursor() as cursor:
-                cursor.execute("SELECT subscription_level FROM users WHERE id = %s", (user_id,))
-                user_subscription = cursor.fetchone()
-
-            if not user_subscription or user_subscription[0] == 'free':
-                if current_app.redis:
-                    try:
-                        current_app.redis.setex(subscription_key, 3600, 'free')  # Cache for 1 hour
-                        logging.info(f"Cached subscription level 'free' for user {username}")
-                    except Exception as e:
-                        logging.error(f"Error caching subscription level: {e}")
-
-                return jsonify({'error': 'Saving scenes requires a Pro subscription'}), 403
-            else:
-                if current_app.redis:
-                    try:
-                        current_app.redis.setex(subscription_key, 3600, user_subscription[0])
-                        logging.info(f"Cached subscription level '{user_subscription[0]}' for user {username}")
-                        subscription_level = user_subscription[0] #set subscription to user subscription to prevent name error
-                    except Exception as e:
-                        logging.error(f"Error caching subscription level: {e}")
-
-
-        scene_data_json = request.form.get('sceneData')
-        scene_name = request.form.get('sceneName')
-        if not scene_data_json or not scene_name:
-            return jsonify({'error': 'Missing required data'}), 400
-        scene_data = json.loads(scene_data_json)
-
-        objects = scene_data.get('objects')
-        scene_settings = scene_data.get('sceneSettings')
-        scene_id = scene_data.get('sceneId')
-
         with conn.cursor() as cursor:
-            if scene_id:
-                object_key = f"{user_id}/{scene_id}-{scene_name}-{username}.json"
-                cursor.execute(
-                    "UPDATE Scenes SET s3_bucket_name = %s, scene_name = %s, s3_key = %s, updated_at = NOW() WHERE scene_id = %s AND user_id = %s",
-                    (S3_BUCKET_NAME, scene_name, object_key, scene_id, user_id)
-                )
-                if cursor.rowcount == 0:
-                    conn.rollback()
-                    return jsonify({'error': 'Scene not found or unauthorized'}), 404
-            else:
-                object_key = f"{user_id}/{scene_name}-{username}.json"
-                cursor.execute(
-                    "INSERT INTO Scenes (user_id, s3_bucket_name, scene_name, s3_key) VALUES (%s, %s, %s, %s) RETURNING scene_id",
-                    (user_id, S3_BUCKET_NAME, scene_name, object_key)
-                )
-                scene_id = cursor.fetchone()[0]
-
-            json_data = json.dumps({'objects': objects, 'sceneSettings': scene_settings})
-            s3_client.put_object(Bucket=S3_BUCKET_NAME, Key=object_key, Body=json_data, ContentType='application/json')
-            print(f"Uploaded scene data to S3: {object_key}")
-
-            thumbnail_file = request.files.get('thumbnail')
-            if thumbnail_file:
-                thumbnail_path = f"Thumbnails/{user_id}/{scene_id}.png"
-                try:
-                    # Use BytesIO to avoid writing to disk
-                    from io import BytesIO
-                    thumbnail_data = BytesIO()
-                    thumbnail_file.save(thumbnail_data)
-                    thumbnail_data.seek(0)  # Reset pointer to beginning of the stream
-
-                    cloudflare_r2_client.put_object(
-                        Bucket=CLOUDFLARE_BUCKET_NAME,
-                        Key=thumbnail_path,
-                        Body=thumbnail_data,
-                        ContentType='image/png'
-                    )
-                    print(f"Uploaded thumbnail to Cloudflare R2: {thumbnail_path}")
-
-                except ClientError as e:
-                    print(f"Cloudflare R2 Error: {e}")
-                    conn.rollback()
-                    return jsonify({'error': f'Failed to upload thumbnail to Cloudflare R2: {str(e)}'}), 500
-                except Exception as e:
-                    print(f"General Error uploading thumbnail: {e}")
-                    conn.rollback()
-                    return jsonify({'error': 'Failed to upload thumbnail'}), 500
+            # Scene upsert and thumbnail upsert in a single statement
+            saved = Scene.save(cursor, user_id, scene_id, scene_name, S3_BUCKET_NAME, object_key,
+                               with_thumbnail=bool(thumbnail_bytes))
+            if not saved:
+                conn.rollback()
+                return jsonify({'error': 'Scene not found or unauthorized'}), 404
+            scene_id, version, thumbnail_path = saved
 
-                cursor.execute("SELECT id FROM scene_thumbnails WHERE scene_id = %s", (scene_id,))
-                existing_thumbnail = cursor.fetchone()
-
-                if existing_thumbnail:
-                    cursor.execute(
-                        "UPDATE scene_thumbnails SET image_url = %s WHERE scene_id = %s",
-                        (thumbnail_path, scene_id)
-                    )
-                else:
-                    cursor.execute(
-                        "INSERT INTO scene_thumbnails (scene_id, image_url) VALUES (%s, %s)",
-                        (scene_id, thumbnail_path)
-                    )
+            orphaned_textures, stored = _put_scene_document(
+                cursor, scene_id, version, scene_name, object_key, {'objects': objects, 'sceneSettings': scene_settings})
 
             conn.commit()
+            delete_texture_objects(orphaned_textures)
+            jobs.enqueue('scenes.record_version', scene_id, version, stored)
 
-            # --- Invalidate the cache when a scene is saved ---
+            scene_index.refresh(user_id, [scene_id])  # Write the saved scene through to the listing index
+
+            # --- Invalidate the cached scene details ---
             if current_app.redis:
                 try:
-                    scene_list_key = f"scenes:{user_id}"
-                    current_app.redis.delete(scene_list_key)  # Invalidate scenes list
                     scene_key = f"scene:{scene_id}"
                     current_app.redis.delete(scene_key)       # Invalidate scene details
                     logging.info(f"Invalidated scene cache for user {username}, scene {scene_id}")
                 except Exception as e:
                     logging.error(f"Error invalidating cache: {e}")
 
-            return jsonify({'message': 'Scene saved successfully', 'sceneId': scene_id}), 200 if scene_id else 201
+            # Thumbnail upload and resizing happen in the background (utils/thumbnails.py)
+            if thumbnail_bytes:
+                jobs.enqueue('scenes.process_thumbnail', user_id, scene_id, thumbnail_path, version, thumbnail_bytes)
+
+            return jsonify({'message': 'Scene saved successfully', 'sceneId': scene_id, 'version': version}), 200 if scene_id else 201
 
-    except ClientError as e:
+    except StorageError as e:
         if conn:
             conn.rollback()
-        print(f"S3 Error: {e}")
-        return jsonify({'error': 'Failed to upload scene data to S3'}), 500
+        print(f"Storage Error: {e}")
+        return jsonify({'error': 'Failed to upload scene data to storage'}), 500
     except Exception as e:
         if conn:
             conn.rollback()
@@ -229,6 +156,525 @@ def save_scene():
         if conn and not conn.closed:
             conn.close()
 
+def _upload_keys(user_id, upload_id):
+    """Object keys for a direct upload. Derived server-side, so a commit can only claim the caller's own uploads."""
+    return f"{user_id}/uploads/{upload_id}.json", f"Thumbnails/{user_id}/{upload_id}.png"
+
+
+@scene_bp.route('/save/init', methods=['POST'])
+@login_required
+def init_scene_upload():
+    """Phase one of a direct save: hands out upload targets for the scene and its thumbnail.
+
+    Each target says how to upload: {"method": "POST", "url", "fields"} (send the fields
+    plus the file as multipart form data; S3 enforces size and content type) or {"method":
+    "PUT", "url", "headers"}. The client uploads the scene JSON and optionally the PNG
+    thumbnail, then calls /save/commit with the returned uploadId. Pass {"gzip": true} to
+    upload a gzipped scene; it is then served with Content-Encoding: gzip like any other.
+    """
+    user = g.user
+    if not has_paid_plan(user):
+        return jsonify({'error': 'Saving scenes requires a Pro subscription'}), 403
+
+    data = request.get_json(silent=True) or {}
+    upload_id = uuid.uuid4().hex
+    scene_key, thumbnail_key = _upload_keys(user.id, upload_id)
+
+    try:
+        scene_target = get_storage('scenes').presign_upload(
+            scene_key, 'application/json', SCENE_UPLOAD_MAX_BYTES, expires_in=SCENE_UPLOAD_URL_TTL,
+            content_encoding='gzip' if data.get('gzip') else None)
+        thumbnail_target = get_storage('media').presign_upload(
+            thumbnail_key, 'image/png', THUMBNAIL_UPLOAD_MAX_BYTES, expires_in=SCENE_UPLOAD_URL_TTL)
+    except Exception as e:
+        print(f"Error creating upload targets: {e}")
+        return jsonify({'error': 'Failed to create upload targets'}), 500
+
+    return jsonify({
+        'uploadId': upload_id,
+        'expiresIn': SCENE_UPLOAD_URL_TTL,
+        'scene': scene_target,
+        'thumbnail': thumbnail_target,
+    }), 200
+
+
+@scene_bp.route('/save/commit', methods=['POST'])
+@login_required
+def commit_scene_upload():
+    """Phase two of a direct save: records an uploaded scene after checking the objects exist.
+
+    Body: {"uploadId": ..., "sceneName": ..., "sceneId": optional, "thumbnail": bool}.
+    Scenes saved this way keep their textures inline (they never pass through the worker),
+    so any texture references held by the previous version are released. An uploadId is
+    committed once: repeating the same commit returns its result again, committing it to
+    another scene is a 409.
+    """
+    user = g.user
+    user_id = user.id
+    if not has_paid_plan(user):
+        return jsonify({'error': 'Saving scenes requires a Pro subscription'}), 403
+
+    data = request.get_json(silent=True) or {}
+    upload_id = data.get('uploadId')
+    scene_name = data.get('sceneName')
+    scene_id = data.get('sceneId')
+    with_thumbnail = bool(data.get('thumbnail'))
+    if not isinstance(upload_id, str) or not re.fullmatch(r'[0-9a-f]{32}', upload_id) or not scene_name:
+        return jsonify({'error': 'uploadId and sceneName are required'}), 400
+    if scene_id is not None and not isinstance(scene_id, int):
+        return jsonify({'error': 'sceneId must be an integer'}), 400
+
+    scene_key, thumbnail_key = _upload_keys(user_id, upload_id)
+    try:
+        uploaded_scene = get_storage('scenes').head(scene_key)
+        if uploaded_scene is None:
+            return jsonify({'error': 'Scene upload not found'}), 400
+        if uploaded_scene.content_length > SCENE_UPLOAD_MAX_BYTES:  # PUT targets cannot enforce the limit
+            return jsonify({'error': 'Scene is too large'}), 413
+        if with_thumbnail:
+            thumbnail = get_storage('media').head(thumbnail_key)
+            if thumbnail is None:
+                return jsonify({'error': 'Thumbnail upload not found'}), 400
+            if thumbnail.content_length > THUMBNAIL_UPLOAD_MAX_BYTES:
+                return jsonify({'error': 'Thumbnail is too large'}), 413
+    except StorageError as e:
+        print(f"Storage Error: {e}")
+        return jsonify({'error': 'Failed to verify uploaded objects'}), 500
+
+    conn = None
+    try:
+        conn = get_db_connection()
+        if conn is None:
+            return jsonify({'error': 'Database connection failed'}), 500
+
+        with conn.cursor() as cursor:
+            previous_scene_key = previous_thumbnail_key = None
+            if scene_id:
+                cursor.execute(queries.OWNED_SCENE_FOR_UPLOAD, (scene_id, user_id))
+                previous = cursor.fetchone()
+                if not previous:
+                    conn.rollback()
+                    return jsonify({'error': 'Scene not found or unauthorized'}), 404
+                previous_scene_key, previous_thumbnail_key = previous
+
+            saved = Scene.save(cursor, user_id, scene_id, scene_name, S3_BUCKET_NAME, scene_key,
+                               with_thumbnail=with_thumbnail, thumbnail_key=thumbnail_key)
+            if not saved:
+                conn.rollback()
+                return jsonify({'error': 'Scene not found or unauthorized'}), 404
+            saved_scene_id, version, _ = saved
+            committed = SceneUpload.claim(cursor, upload_id, user_id, saved_scene_id, version)
+            if committed:
+                conn.rollback()
+                if scene_id not in (None, committed[0]):  # Would make two scenes share its objects
+                    return jsonify({'error': 'Upload was already committed', 'sceneId': committed[0]}), 409
+                return jsonify({'message': 'Scene saved successfully', 'sceneId': committed[0],  # A retry
+                                'version': committed[1]}), 200
+            SceneVersion.begin(cursor, saved_scene_id, version, scene_name, ())
+
+            orphaned_textures = Texture.release_scene(cursor, scene_id) if scene_id else []
+            conn.commit()
+        delete_texture_objects(orphaned_textures)
+        jobs.enqueue('scenes.record_version', saved_scene_id, version, s3_key=scene_key)
+
+        # Objects replaced by this upload (a retried commit points at the same keys and deletes nothing)
+        superseded = []
+        if previous_scene_key and previous_scene_key != scene_key:
+            superseded.append(('scenes', previous_scene_key))
+        if with_thumbnail and previous_thumbnail_key and previous_thumbnail_key != thumbnail_key:
+            # Its variants are replaced (and deleted) once the new thumbnail's are recorded
+            superseded.append(('media', previous_thumbnail_key))
+        if superseded:
+            jobs.enqueue('storage.delete_objects', superseded)
+
+        scene_index.refresh(user_id, [saved_scene_id])
+        if current_app.redis:
+            try:
+                current_app.redis.delete(f"scene:{saved_scene_id}")
+            except Exception as e:
+                logging.error(f"Error invalidating cache: {e}")
+
+        if with_thumbnail:
+            jobs.enqueue('scenes.process_thumbnail', user_id, saved_scene_id, thumbnail_key, version)
+
+        return jsonify({'message': 'Scene saved successfully', 'sceneId': saved_scene_id, 'version': version}), 200 if scene_id else 201
+
+    except Exception as e:
+        if conn:
+            conn.rollback()
+        print(f"Error committing scene upload: {e}")
+        return jsonify({'error': 'An unexpected error occurred'}), 500
+    finally:
+        if conn and not conn.closed:
+            conn.close()
+
+
+@jobs.job('scenes.process_thumbnail')
+def _process_thumbnail_job(user_id, scene_id, image_url, version, image_bytes=None):
+    """Background half of a save: stores and resizes the thumbnail, then updates the scene's listing entry."""
+    if thumbnails.process_thumbnail(scene_id, image_url, version, image_bytes):
+        scene_index.refresh(user_id, [scene_id])
+
+
+def _stored_json_response(obj, inline_texture_refs=False):
+    """Builds the response for a JSON document fetched from object storage.
+
+    Stored bytes are piped to the client in SCENE_STREAM_CHUNK_SIZE chunks without being
+    parsed: gzipped objects go out as-is (Content-Encoding: gzip) to clients that accept
+    gzip and are decompressed chunk by chunk for those that do not; objects saved before
+    compression are already plain JSON. Only scenes whose texture references must be
+    inlined are read into memory and parsed.
+    """
+    gzipped = obj.content_encoding == 'gzip'
+
+    if inline_texture_refs and obj.metadata.get('texture-refs') == '1':
+        try:
+            file_content = obj.read()
+        finally:
+            obj.close()
+        if gzipped:
+            file_content = gunzip_bytes(file_content)
+        scene_data = json.loads(file_content.decode('utf-8'))
+        inline_textures(scene_data.get('objects'))
+        return jsonify(scene_data), 200
+
+    if gzipped and not accepts_encoding(request, 'gzip'):
+        response = Response(_stream_body(obj, gunzip_chunks), mimetype='application/json', direct_passthrough=True)
+    else:
+        response = Response(_stream_body(obj), mimetype='application/json', direct_passthrough=True)
+        if obj.content_length is not None:
+            response.headers['Content-Length'] = str(obj.content_length)
+        if gzipped:
+            response.headers['Content-Encoding'] = 'gzip'
+    if gzipped:
+        response.vary.add('Accept-Encoding')
+    return response, 200
+
+
+def _payload_etag(*parts):
+    """Strong ETag for a JSON payload. The last part says whether the client takes gzip,
+    since a gzipped and a plain response must not share an ETag."""
+    return '-'.join(str(part) for part in parts) + ('-gz' if accepts_encoding(request, 'gzip') else '')
+
+
+def _not_modified(etag, **headers):
+    """A 304 when the request's If-None-Match already holds `etag`, otherwise None."""
+    if not request.if_none_match.contains_weak(etag):
+        return None
+    response = Response(status=304)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = PAYLOAD_CACHE_CONTROL
+    response.vary.add('Accept-Encoding')
+    response.headers.update(headers)
+    return response
+
+
+def _with_etag(response, etag):
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = PAYLOAD_CACHE_CONTROL
+    response.vary.add('Accept-Encoding')
+    return response
+
+
+def _stream_body(obj, transform=None):
+    """Yields a stored object's body chunk by chunk and always releases it (connection or file mapping)."""
+    try:
+        chunks = obj.iter_chunks(SCENE_STREAM_CHUNK_SIZE)
+        yield from (transform(chunks) if transform else chunks)
+    finally:
+        obj.close()
+
+
+def _load_scene_document(s3_key):
+    """Fetches and parses a stored scene document (texture references left as they are)."""
+    obj = get_storage('scenes').get(s3_key)
+    try:
+        file_content = obj.read()
+    finally:
+        obj.close()
+    if obj.content_encoding == 'gzip':
+        file_content = gunzip_bytes(file_content)
+    return json.loads(file_content.decode('utf-8'))
+
+
+@scene_bp.route('/scenes/<int:scene_id>', methods=['PATCH'])
+@login_required
+def patch_scene(scene_id):
+    """Incremental save: applies a patch to the stored scene instead of re-uploading all of it.
+
+    Body: {"baseVersion": n, "patch": [RFC 6902 ops]} or {"baseVersion": n, "mergePatch": {RFC 7396}}.
+    Paths address the stored document ({"objects": [...], "sceneSettings": {...}}). Returns
+    409 with the current version when baseVersion is stale, so the client can reload or resend.
+    """
+    user = g.user
+    user_id = user.id
+
+    if not has_paid_plan(user):
+        return jsonify({'error': 'Saving scenes requires a Pro subscription'}), 403
+
+    data = request.get_json(silent=True) or {}
+    base_version = data.get('baseVersion')
+    valid_base = isinstance(base_version, int) and not isinstance(base_version, bool)  # JSON true is not version 1
+    if not valid_base or ('patch' in data) == ('mergePatch' in data):
+        return jsonify({'error': 'baseVersion and exactly one of patch or mergePatch are required'}), 400
+
+    conn = None
+    try:
+        conn = get_db_connection()
+        if conn is None:
+            return jsonify({'error': 'Database connection failed'}), 500
+
+        with conn.cursor() as cursor:
+            claimed = Scene.bump_version(cursor, scene_id, user_id, base_version)
+            if not claimed:
+                conn.rollback()
+                cursor.execute("SELECT version FROM Scenes WHERE scene_id = %s AND user_id = %s", (scene_id, user_id))
+                current = cursor.fetchone()
+                if not current:
+                    return jsonify({'error': 'Scene not found or unauthorized'}), 404
+                return jsonify({'error': 'Scene has changed since baseVersion', 'currentVersion': current[0]}), 409
+            version, object_key, scene_name = claimed
+
+            document = _load_scene_document(object_key)
+            try:
+                if 'patch' in data:
+                    document = apply_patch(document, data['patch'])
+                else:
+                    document = apply_merge_patch(document, data['mergePatch'])
+            except JsonPatchError as e:
+                conn.rollback()
+                return jsonify({'error': f'Patch does not apply: {e}'}), 422
+            if not isinstance(document, dict) or not isinstance(document.get('objects', []), list):
+                conn.rollback()
+                return jsonify({'error': 'Patched scene is not a valid scene document'}), 422
+
+            orphaned_textures, stored = _put_scene_document(cursor, scene_id, version, scene_name, object_key, document)
+            conn.commit()
+        delete_texture_objects(orphaned_textures)
+        jobs.enqueue('scenes.record_version', scene_id, version, stored)
+
+        scene_index.refresh(user_id, [scene_id])
+        if current_app.redis:
+            try:
+                current_app.redis.delete(f"scene:{scene_id}")
+            except Exception as e:
+                logging.error(f"Error invalidating cache: {e}")
+
+        return jsonify({'message': 'Scene patched successfully', 'sceneId': scene_id, 'version': version}), 200
+
+    except StorageError as e:
+        if conn:
+            conn.rollback()
+        print(f"Storage Error: {e}")
+        return jsonify({'error': 'Failed to update scene data in storage'}), 500
+    except Exception as e:
+        if conn:
+            conn.rollback()
+        print(f"Error patching scene: {e}")
+        return jsonify({'error': 'An unexpected error occurred'}), 500
+    finally:
+        if conn and not conn.closed:
+            conn.close()
+
+
+@scene_bp.route('/scenes/<int:scene_id>/versions', methods=['GET'])
+@login_required
+def list_scene_versions(scene_id):
+    """Version history, newest first, paginated like /get-user-scenes (?limit, ?cursor).
+
+    newBytes is what each version added to storage: the compressed size of the chunks no
+    earlier version had. ready is false until the background job has chunked the version.
+    """
+    cursor_param = request.args.get('cursor')
+    try:
+        limit = parse_limit(request.args.get('limit'))
+        after = decode_cursor(cursor_param, 1, (int,)) if cursor_param else None
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    conn = None
+    try:
+        conn = get_db_connection(readonly=True)
+        if conn is None:
+            return jsonify({'error': 'Database connection failed'}), 500
+
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT version FROM Scenes WHERE scene_id = %s AND user_id = %s", (scene_id, g.user.id))
+            current = cursor.fetchone()
+            if not current:
+                return jsonify({'error': 'Scene not found'}), 404
+
+            cursor.execute(queries.SCENE_VERSIONS_PAGE, (scene_id, after[0] if after else 2 ** 31 - 1, limit + 1))
+            versions = cursor.fetchall()
+
+        next_cursor = None
+        if len(versions) > limit:
+            versions = versions[:limit]
+            next_cursor = encode_cursor(versions[-1][0])
+
+        return jsonify({
+            'currentVersion': current[0],
+            'versions': [{
+                'version': version,
+                'sceneName': scene_name,
+                'createdAt': created_at.isoformat(),
+                'byteSize': byte_size,
+                'newBytes': new_bytes,
+                'restoredFrom': restored_from,
+                'ready': ready,
+            } for version, scene_name, created_at, byte_size, new_bytes, restored_from, ready in versions],
+            'next_cursor': next_cursor,
+        }), 200
+
+    except Exception as e:
+        print(f"Error listing scene versions: {e}")
+        return jsonify({'error': str(e)}), 500
+    finally:
+        if conn is not None and not conn.closed:
+            conn.close()
+
+
+def _find_version(cursor, scene_id, version):
+    """Returns (status, chunk hashes or error message) for a version of an owned scene."""
+    recorded = SceneVersion.get(cursor, scene_id, version)
+    if not recorded:
+        return 404, 'Version not found'
+    if recorded[0] is None:
+        return 409, 'Version is still being recorded, try again shortly'
+    return 200, recorded[0]
+
+
+def _load_version_document(cursor, scene_id, version):
+    """Returns (status, document or error message) for a recorded version of an owned scene."""
+    status, found = _find_version(cursor, scene_id, version)
+    if status != 200:
+        return status, found
+    return 200, json.loads(scene_history.load_version(found).decode('utf-8'))
+
+
+@scene_bp.route('/scenes/<int:scene_id>/versions/<int:version>', methods=['GET'])
+@login_required
+def get_scene_version(scene_id, version):
+    """One version of a scene, with textures inlined like /get-scene (?textures=refs to skip that)."""
+    inline_texture_refs = request.args.get('textures') != 'refs'
+    etag = f"scene-{scene_id}-v{version}-{'inline' if inline_texture_refs else 'refs'}"  # Versions never change
+    conn = None
+    try:
+        conn = get_db_connection(readonly=True)
+        if conn is None:
+            return jsonify({'error': 'Database connection failed'}), 500
+
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM Scenes WHERE scene_id = %s AND user_id = %s", (scene_id, g.user.id))
+            if not cursor.fetchone():
+                return jsonify({'error': 'Scene not found'}), 404
+            status, chunk_hashes = _find_version(cursor, scene_id, version)  # Before any 304: it may be gone
+        if status != 200:
+            return jsonify({'error': chunk_hashes}), status
+        not_modified = _not_modified(etag, **{'X-Scene-Version': str(version)})
+        if not_modified:
+            return not_modified
+
+        document = json.loads(scene_history.load_version(chunk_hashes).decode('utf-8'))
+        if inline_texture_refs:
+            inline_textures(document.get('objects'))
+        response = jsonify(document)
+        response.headers['X-Scene-Version'] = str(version)
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = PAYLOAD_CACHE_CONTROL
+        return response, 200
+
+    except StorageError as e:
+        print(f"Storage Error: {e}")
+        return jsonify({'error': 'Failed to retrieve scene version from storage'}), 500
+    except Exception as e:
+        print(f"Error getting scene version: {e}")
+        return jsonify({'error': str(e)}), 500
+    finally:
+        if conn is not None and not conn.closed:
+            conn.close()
+
+
+@scene_bp.route('/scenes/<int:scene_id>/versions/<int:version>/restore', methods=['POST'])
+@login_required
+def restore_scene_version(scene_id, version):
+    """Saves an old version as the newest one; history is kept, so a restore can be undone.
+
+    Body (optional): {"baseVersion": n} fails with 409 if the scene has moved on since n.
+    """
+    user = g.user
+    user_id = user.id
+    if not has_paid_plan(user):
+        return jsonify({'error': 'Saving scenes requires a Pro subscription'}), 403
+
+    base_version = (request.get_json(silent=True) or {}).get('baseVersion')
+    if base_version is not None and (not isinstance(base_version, int) or isinstance(base_version, bool)):
+        return jsonify({'error': 'baseVersion must be an integer'}), 400
+
+    conn = None
+    try:
+        conn = get_db_connection()
+        if conn is None:
+            return jsonify({'error': 'Database connection failed'}), 500
+
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT version FROM Scenes WHERE scene_id = %s AND user_id = %s FOR UPDATE",
+                           (scene_id, user_id))
+            current = cursor.fetchone()
+            if not current:
+                conn.rollback()
+                return jsonify({'error': 'Scene not found or unauthorized'}), 404
+            if base_version is not None and base_version != current[0]:
+                conn.rollback()
+                return jsonify({'error': 'Scene has changed since baseVersion', 'currentVersion': current[0]}), 409
+
+            status, document = _load_version_document(cursor, scene_id, version)
+            if status != 200:
+                conn.rollback()
+                return jsonify({'error': document}), status
+
+            new_version, object_key, scene_name = Scene.bump_version(cursor, scene_id, user_id, current[0])
+            orphaned_textures, stored = _put_scene_document(
+                cursor, scene_id, new_version, scene_name, object_key, document, restored_from=version)
+            conn.commit()
+        delete_texture_objects(orphaned_textures)
+        jobs.enqueue('scenes.record_version', scene_id, new_version, stored)
+
+        scene_index.refresh(user_id, [scene_id])
+        if current_app.redis:
+            try:
+                current_app.redis.delete(f"scene:{scene_id}")
+            except Exception as e:
+                logging.error(f"Error invalidating cache: {e}")
+
+        return jsonify({'message': 'Scene version restored', 'sceneId': scene_id,
+                        'version': new_version, 'restoredFrom': version}), 200
+
+    except StorageError as e:
+        if conn:
+            conn.rollback()
+        print(f"Storage Error: {e}")
+        return jsonify({'error': 'Failed to restore scene version'}), 500
+    except Exception as e:
+        if conn:
+            conn.rollback()
+        print(f"Error restoring scene version: {e}")
+        return jsonify({'error': 'An unexpected error occurred'}), 500
+    finally:
+        if conn and not conn.closed:
+            conn.close()
+
+
+def _presigned_scene_url(s3_key):
+    """Short-lived GET URL for a stored scene, so large downloads bypass the workers.
+
+    The object is served exactly as stored: gzipped documents carry Content-Encoding: gzip,
+    and documents with split-out textures contain {"$texture": hash} references
+    (fetch them from /textures/<hash>).
+    """
+    return get_storage('scenes').presign(s3_key, expires_in=SCENE_DOWNLOAD_URL_TTL)
+
+
 @scene_bp.route('/get-scene-url', methods=['GET'])
 @login_required
 def get_scene_url():
@@ -236,19 +682,26 @@ def get_scene_url():
     if not scene_id:
         return jsonify({'error': 'sceneId is required'}), 400
 
+    conn = None
     try:
-        conn = get_db_connection()
+        conn = get_db_connection(readonly=True)
         if conn is None:
             return jsonify({'error': 'Database connection failed'}), 500
 
         with conn.cursor() as cursor:
-            cursor.execute("SELECT s3_key, scene_name FROM Scenes WHERE scene_id = %s", (scene_id,))
+            cursor.execute(queries.OWNED_SCENE, (scene_id, g.user.id))
             scene_data = cursor.fetchone()
 
         if not scene_data:
             return jsonify({'error': 'Scene not found'}), 404
 
-        return jsonify({'s3Key': scene_data[0], 'sceneName': scene_data[1]}), 200
+        return jsonify({
+            's3Key': scene_data[0],
+            'sceneName': scene_data[1],
+            'version': scene_data[2],
+            'url': _presigned_scene_url(scene_data[0]),
+            'expiresIn': SCENE_DOWNLOAD_URL_TTL,
+        }), 200
 
     except Exception as e:
         print(f"Error getting scene URL: {e}")
@@ -261,18 +714,29 @@ def get_scene_url():
 @scene_bp.route('/get-scene', methods=['GET'])
 @login_required
 def get_scene():
+    """Returns a scene document.
+
+    ?mode=redirect answers with a 302 to a presigned storage URL and ?mode=url with
+    {"url": ..., "version": ...}; both skip proxying the bytes through the worker and
+    serve the document as stored (see _presigned_scene_url). The default mode proxies,
+    with an ETag built from the scene version: a matching If-None-Match gets a 304
+    straight from the database row, without touching storage.
+    """
     scene_id = request.args.get('sceneId')
     if not scene_id:
         return jsonify({'error': 'sceneId is required'}), 400
+    mode = request.args.get('mode', 'proxy')
+    if mode not in ('proxy', 'url', 'redirect'):
+        return jsonify({'error': 'mode must be proxy, url or redirect'}), 400
 
     conn = None
     try:
-        conn = get_db_connection()
+        conn = get_db_connection(readonly=True)
         if conn is None:
             return jsonify({'error': 'Database connection failed'}), 500
 
         with conn.cursor() as cursor:
-            cursor.execute("SELECT s3_key, scene_name FROM Scenes WHERE scene_id = %s", (scene_id,))
+            cursor.execute(queries.OWNED_SCENE, (scene_id, g.user.id))
             scene_data = cursor.fetchone()
 
         if not scene_data:
@@ -280,16 +744,32 @@ def get_scene():
 
         s3_key = scene_data[0]
 
-        response = s3_client.get_object(Bucket=S3_BUCKET_NAME, Key=s3_key)
-        file_content = response['Body'].read()
-
-        scene_data = json.loads(file_content.decode('utf-8'))  # Parse JSON data
-
-        return jsonify(scene_data), 200
-
-    except ClientError as e:
-        print(f"S3 Error: {e}")
-        return jsonify({'error': 'Failed to retrieve scene from S3'}), 500
+        if mode == 'url':
+            return jsonify({'url': _presigned_scene_url(s3_key), 'version': scene_data[2],
+                            'expiresIn': SCENE_DOWNLOAD_URL_TTL}), 200
+        if mode == 'redirect':
+            response = redirect(_presigned_scene_url(s3_key), code=302)
+            response.headers['X-Scene-Version'] = str(scene_data[2])
+            response.headers['Cache-Control'] = 'no-store'  # The target URL expires
+            return response
+
+        # ?textures=refs returns {"$texture": hash} references (fetch them from /textures/<hash>)
+        inline_texture_refs = request.args.get('textures') != 'refs'
+        etag = _payload_etag('scene', scene_id, f"v{scene_data[2]}", 'inline' if inline_texture_refs else 'refs')
+        not_modified = _not_modified(etag, **{'X-Scene-Version': str(scene_data[2])})
+        if not_modified:
+            return not_modified
+
+        obj = get_storage('scenes').get(s3_key)
+        response, status = _stored_json_response(obj, inline_texture_refs=inline_texture_refs)
+        response.headers['X-Scene-Version'] = str(scene_data[2])  # baseVersion for PATCH /scenes/<id>
+        return _with_etag(response, etag), status
+
+    except ObjectNotFound:
+        return jsonify({'error': 'Scene data not found in storage'}), 404
+    except StorageError as e:
+        print(f"Storage Error: {e}")
+        return jsonify({'error': 'Failed to retrieve scene from storage'}), 500
     except Exception as e:
         print(f"Error getting scene: {e}")
         return jsonify({'error': str(e)}), 500
@@ -297,11 +777,29 @@ def get_scene():
         if conn is not None:
             conn.close()
 
+@scene_bp.route('/textures/<texture_hash>', methods=['GET'])
+@login_required
+def get_texture(texture_hash):
+    if not re.fullmatch(r'[0-9a-f]{64}', texture_hash):
+        return jsonify({'error': 'Invalid texture hash'}), 400
+
+    try:
+        data = fetch_texture(texture_hash)
+    except ObjectNotFound:
+        return jsonify({'error': 'Texture not found'}), 404
+    except StorageError as e:
+        print(f"Storage Error: {e}")
+        return jsonify({'error': 'Failed to retrieve texture from storage'}), 500
+
+    response = Response(data, mimetype='image/png')
+    response.headers['Cache-Control'] = 'private, max-age=31536000, immutable'  # Content-addressed, never changes
+    return response, 200
+
 @scene_bp.route('/community-examples', methods=['GET'])
 @login_required
 def get_community_examples():
     try:
-        conn = get_db_connection()
+        conn = get_db_connection(readonly=True)
         if conn is None:
             return jsonify({'error': 'Database connection failed'}), 500
 
@@ -334,7 +832,7 @@ def get_community_example_url():
         return jsonify({'error': 'exampleId is required'}), 400
 
     try:
-        conn = get_db_connection()
+        conn = get_db_connection(readonly=True)
         with conn.cursor() as cursor:
             cursor.execute("SELECT s3_key FROM community_examples WHERE example_id = %s", (example_id,))
             example_data = cursor.fetchone()
@@ -354,13 +852,20 @@ def get_community_example_url():
 @scene_bp.route('/get-community-example', methods=['GET'])
 @login_required
 def get_community_example():
+    """Serves an example body from the in-process cache, then Redis, then storage
+    (utils/community_examples.py). Cache hits skip the database as well as storage."""
     example_id = request.args.get('exampleId')
     if not example_id:
         return jsonify({'error': 'exampleId is required'}), 400
 
+    version = community_examples.current_version()
+    cached = community_examples.get(example_id, version)
+    if cached:
+        return _cached_example_response(example_id, cached)
+
     conn = None
     try:
-        conn = get_db_connection()
+        conn = get_db_connection(readonly=True)
         with conn.cursor() as cursor:
             cursor.execute("SELECT s3_key FROM community_examples WHERE example_id = %s", (example_id,))
             example_data = cursor.fetchone()
@@ -369,24 +874,39 @@ def get_community_example():
             return jsonify({'error': 'Community example not found'}), 404
 
         s3_key = example_data[0]
-
-        s3_client = boto3.client(
-            's3',
-            region_name=os.environ.get('SUPABASE_S3_REGION'),
-            endpoint_url=os.environ.get('SUPABASE_S3_ENDPOINT'),
-            aws_access_key_id=os.environ.get('SUPABASE_S3_ACCESS_KEY'),
-            aws_secret_access_key=os.environ.get('SUPABASE_S3_SECRET_KEY')
-        )
-
-        response = s3_client.get_object(Bucket=os.environ.get('SUPABASE_BUCKET_NAME'), Key=s3_key)
-        # print(response)
-        file_content = response['Body'].read()
-
-        return jsonify(json.loads(file_content.decode('utf-8')))
-
-    except ClientError as e:
-        print(f"S3 Error: {e}")
-        return jsonify({'error': 'Failed to retrieve scene from Supabase Storage'}), 500
+        community = get_storage('community')
+
+        # Examples have no version column, so the ETag comes from storage; a conditional
+        # request costs a HEAD instead of a full GET when the client is up to date
+        if request.if_none_match:
+            head = community.head(s3_key)
+            if head is None:
+                return jsonify({'error': 'Community example data not found'}), 404
+            if head.etag:
+                not_modified = _not_modified(_payload_etag('example', example_id, head.etag))
+                if not_modified:
+                    return not_modified
+
+        obj = community.get(s3_key)
+        if obj.content_length is not None and obj.content_length <= community_examples.EXAMPLE_CACHE_MAX_ENTRY_BYTES:
+            try:
+                body = obj.read()
+            finally:
+                obj.close()
+            example = community_examples.CachedExample(obj.etag or hashlib.md5(body).hexdigest(), obj.content_encoding, body)
+            community_examples.put(example_id, version, example)
+            return _cached_example_response(example_id, example)
+
+        response, status = _stored_json_response(obj)
+        if obj.etag:
+            _with_etag(response, _payload_etag('example', example_id, obj.etag))
+        return response, status
+
+    except ObjectNotFound:
+        return jsonify({'error': 'Community example data not found'}), 404
+    except StorageError as e:
+        print(f"Storage Error: {e}")
+        return jsonify({'error': 'Failed to retrieve community example from storage'}), 500
     except Exception as e:
         print(f"Error getting community example: {e}")
         return jsonify({'error': str(e)}), 500
@@ -395,76 +915,85 @@ def get_community_example():
             conn.close()
 
 
+def _cached_example_response(example_id, example):
+    """Builds the response for a cached example body, honouring If-None-Match and Accept-Encoding."""
+    etag = _payload_etag('example', example_id, example.etag)
+    not_modified = _not_modified(etag)
+    if not_modified:
+        return not_modified
+
+    body = example.body
+    gzipped = example.content_encoding == 'gzip'
+    if gzipped and not accepts_encoding(request, 'gzip'):
+        body = gunzip_bytes(body)
+    response = Response(body, mimetype='application/json')
+    if gzipped and body is example.body:
+        response.headers['Content-Encoding'] = 'gzip'
+    return _with_etag(response, etag), 200
+
+
+def _render_scene_rows(scenes):
+    """Turns (scene_id, scene_name, updated_at, image_url, variants) rows into the JSON the homepage expects."""
+    ist = pytz.timezone('Europe/London')
+    scene_list = []
+
+    # Variant keys carry their version and never change, so they are signed in one batch with
+    # URLs that repeat within a signing window (browsers reuse the cached images). Originals are
+    # overwritten in place by new uploads and get a fresh URL on every request instead.
+    thumbnail_keys = {scene[0]: thumbnails.list_thumbnail_key(scene[3], scene[4]) for scene in scenes if scene[3]}
+    originals = {scene[3] for scene in scenes if scene[3]}
+    thumbnail_urls = {}
+    try:
+        media = get_storage('media')
+        thumbnail_urls = media.presign_many([key for key in thumbnail_keys.values() if key not in originals],
+                                            expires_in=3600)  # Valid for at least 1 hour
+        for key in originals.intersection(thumbnail_keys.values()):
+            thumbnail_urls[key] = media.presign(key, expires_in=3600)
+    except Exception as e:
+        print(f"Error generating signed thumbnail URLs: {e}")
+
+    for scene in scenes:
+        last_updated = scene[2]
+        if last_updated.tzinfo is None:
+            last_updated = ist.localize(last_updated)
+
+        thumbnail_url = thumbnail_urls.get(thumbnail_keys.get(scene[0]))  # None if no thumbnail exists
+
+        scene_list.append({
+            "scene_id": scene[0],
+            "scene_name": scene[1],
+            "last_updated": timeago.format(last_updated, datetime.now(ist)),
+            "thumbnail_url": thumbnail_url
+        })
+    return scene_list
+
 
 @scene_bp.route('/scenes', methods=['GET'])
 @login_required
 def get_user_scenes():
-    user = User.get_user_by_username(session.get('username'))
-    if not user:
-        return jsonify({'error': 'User not found'}), 404
-
+    user = g.user
     user_id = user.id
-    cache_key = f"scenes:{user_id}"  # Unique cache key for the user's scenes
 
-    if current_app.redis:
-        try:
-            cached_scenes = current_app.redis.get(cache_key)
-            if cached_scenes:
-                logging.info(f"Returning scene list from cache for user {user_id}")
-                return jsonify(json.loads(cached_scenes.decode('utf-8'))), 200  # Return cached scene list
-        except Exception as e:
-            logging.error(f"Error retrieving scene list from cache: {e}")
+    # Passing `limit` or `cursor` switches to keyset pagination on (updated_at, scene_id).
+    if 'limit' in request.args or 'cursor' in request.args:
+        return _get_user_scenes_page(user_id)
+
+    # Rows come from the write-through index (utils/scene_index.py); times and URLs are rendered per request
+    scenes = scene_index.list_scenes(user_id)
+    if scenes is not None:
+        return jsonify(_render_scene_rows(scenes)), 200
 
     conn = None
     try:
-        conn = get_db_connection()
+        conn = get_db_connection(readonly=True)
         if conn is None:
             return jsonify({'error': 'Database connection failed'}), 500
 
         with conn.cursor() as cursor:
-            cursor.execute("""
-                SELECT s.scene_id, s.scene_name, s.updated_at, st.image_url
-                FROM Scenes s
-                LEFT JOIN scene_thumbnails st ON s.scene_id = st.scene_id
-                WHERE s.user_id = %s
-                ORDER BY s.updated_at DESC
-            """, (user.id,))
+            cursor.execute(queries.USER_SCENES, (user.id,))
             scenes = cursor.fetchall()
 
-        ist = pytz.timezone('Europe/London')
-        scene_list = []
-
-        for scene in scenes:
-            last_updated = scene[2]
-            if last_updated.tzinfo is None:
-                last_updated = ist.localize(last_updated)
-
-            thumbnail_url = None  # Default None if no thumbnail exists
-            if scene[3]:
-                try:
-                    thumbnail_url = cloudflare_r2_client.generate_presigned_url(
-                        'get_object',
-                        Params={'Bucket': CLOUDFLARE_BUCKET_NAME, 'Key': scene[3]},
-                        ExpiresIn=3600  # URL valid for 1 hour
-                    )
-                except Exception as e:
-                    print(f"Error generating signed URL for scene {scene[0]}: {e}")
-
-            scene_list.append({
-                "scene_id": scene[0],
-                "scene_name": scene[1],
-                "last_updated": timeago.format(last_updated, datetime.now(ist)),
-                "thumbnail_url": thumbnail_url
-            })
-
-        if current_app.redis:
-            try:
-                current_app.redis.setex(cache_key, 3600, json.dumps(scene_list))
-                logging.info(f"Cached scene list for user {user_id}")
-            except Exception as e:
-                logging.error(f"Error caching scene list: {e}")
-
-        return jsonify(scene_list), 200
+        return jsonify(_render_scene_rows(scenes)), 200
 
     except Exception as e:
         print(f"Error getting user scenes: {e}")
@@ -472,30 +1001,105 @@ def get_user_scenes():
     finally:
         if conn is not None and not conn.closed:
             conn.close()
-            
-            
+
+
+def _get_user_scenes_page(user_id):
+    cursor_param = request.args.get('cursor')
+    try:
+        limit = parse_limit(request.args.get('limit'))
+        after = decode_cursor(cursor_param, 2, (str, int)) if cursor_param else None
+        if after:
+            datetime.fromisoformat(after[0])  # Raises ValueError unless it is an ISO timestamp
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    scenes = scene_index.list_scenes(user_id, after, limit + 1)
+    if scenes is None:
+        conn = None
+        try:
+            conn = get_db_connection(readonly=True)
+            if conn is None:
+                return jsonify({'error': 'Database connection failed'}), 500
+
+            with conn.cursor() as cursor:
+                if after:
+                    cursor.execute(queries.USER_SCENES_PAGE_AFTER, (user_id, after[0], after[1], limit + 1))
+                else:
+                    cursor.execute(queries.USER_SCENES_PAGE, (user_id, limit + 1))
+                scenes = cursor.fetchall()
+
+        except Exception as e:
+            print(f"Error getting user scene page: {e}")
+            return jsonify({'error': str(e)}), 500
+        finally:
+            if conn is not None and not conn.closed:
+                conn.close()
+
+    next_cursor = None
+    if len(scenes) > limit:  # One extra row tells us there is another page
+        scenes = scenes[:limit]
+        next_cursor = encode_cursor(scenes[-1][2].isoformat(), scenes[-1][0])
+
+    return jsonify({'scenes': _render_scene_rows(scenes), 'next_cursor': next_cursor}), 200
+
+
+def _delete_scenes(conn, user_id, scene_ids):
+    """Deletes whichever of `scene_ids` the user owns, with their thumbnails and texture references.
+
+    Ownership is checked with one query and the rows go in one transaction; the stored
+    objects are then removed by a background job (batched DeleteObjects calls running
+    concurrently, failures queued in pending_storage_deletes). Returns the deleted scene ids.
+    """
+    with conn.cursor() as cursor:
+        cursor.execute(queries.OWNED_SCENES_FOR_DELETE, (list(scene_ids), user_id))
+        owned = cursor.fetchall()
+        if not owned:
+            conn.rollback()
+            return []
+        owned_ids = [row[0] for row in owned]
+
+        # Release shared textures; blobs nobody else references go with the scenes
+        orphaned_textures = Texture.release_scenes(cursor, owned_ids)
+        orphaned_chunks, version_textures = SceneVersion.release_scenes(cursor, owned_ids)  # Their version history
+        orphaned_textures += version_textures
+        cursor.execute("DELETE FROM scene_thumbnails WHERE scene_id = ANY(%s)", (owned_ids,))
+        cursor.execute("DELETE FROM Scenes WHERE scene_id = ANY(%s) AND user_id = %s", (owned_ids, user_id))
+    conn.commit()
+    logging.info(f"Deleted {len(owned_ids)} scene record(s) for user {user_id}")
+    scene_history.delete_chunk_objects(orphaned_chunks)
+    delete_texture_objects(orphaned_textures)
+
+    targets = [('scenes', s3_key) for _, s3_key, _, _ in owned]
+    targets += [('media', image_url) for _, _, image_url, _ in owned if image_url]
+    targets += [('media', key) for _, _, _, variants in owned for key in thumbnails.variant_keys(variants)]
+    if targets:
+        jobs.enqueue('storage.delete_objects', targets)  # Failures land in pending_storage_deletes
+
+    scene_index.remove(user_id, owned_ids)
+    if current_app.redis:
+        try:
+            current_app.redis.delete(*[f"scene:{scene_id}" for scene_id in owned_ids])
+        except Exception as e:
+            logging.error(f"Error invalidating Redis cache for user {user_id}: {e}")
+            # Cache invalidation failure is usually not critical enough to fail the request
+    return owned_ids
+
+
 # --- Delete Scene Route ---
-# This route deletes a scene and its associated thumbnail from S3 and R2, respectively.
+# This route deletes a scene, its thumbnail and its stored objects (storage deletes run in the background).
 @scene_bp.route('/delete-scene', methods=['DELETE'])
 @login_required
 def delete_scene():
-    username = session.get('username')
-    if not username:
-        # This check is technically redundant due to @login_required,
-        # but good for clarity if the decorator were removed.
-        return jsonify({'error': 'Unauthorized'}), 403
+    user = g.user
+    username = user.username
+    user_id = user.id
 
-    scene_id = request.args.get('sceneId')
+    scene_id = request.args.get('sceneId', type=int)
     if not scene_id:
         return jsonify({'error': 'Missing sceneId parameter'}), 400
 
     conn = None
     try:
-        user = User.get_user_by_username(username)
-        if not user:
-            return jsonify({'error': 'User not found'}), 404
-        user_id = user.id
-
         logging.info(f"Attempting to delete scene {scene_id} for user {username} (ID: {user_id})")
 
         conn = get_db_connection()
@@ -503,95 +1107,54 @@ def delete_scene():
             logging.error("Database connection failed during scene deletion.")
             return jsonify({'error': 'Database connection failed'}), 500
 
-        # --- 1. Verify Scene Ownership and Get S3/Thumbnail Keys ---
-        s3_key_to_delete = None
-        thumbnail_key_to_delete = None
-        with conn.cursor() as cursor:
-            # Check if scene exists AND belongs to the user, get S3 key
-            cursor.execute(
-                "SELECT s3_key FROM Scenes WHERE scene_id = %s AND user_id = %s",
-                (scene_id, user_id)
-            )
-            scene_result = cursor.fetchone()
-            if not scene_result:
-                logging.warning(f"Scene {scene_id} not found or user {user_id} does not own it.")
-                return jsonify({'error': 'Scene not found or you do not have permission to delete it'}), 404
-            s3_key_to_delete = scene_result[0]
-            logging.info(f"Found scene {scene_id} owned by user {user_id}. S3 key: {s3_key_to_delete}")
-
-            # Check if a thumbnail exists for this scene, get its key (image_url)
-            cursor.execute(
-                "SELECT image_url FROM scene_thumbnails WHERE scene_id = %s",
-                (scene_id,)
-            )
-            thumbnail_result = cursor.fetchone()
-            if thumbnail_result:
-                thumbnail_key_to_delete = thumbnail_result[0]
-                logging.info(f"Found thumbnail for scene {scene_id}. R2 key: {thumbnail_key_to_delete}")
-
-        # --- 2. Delete from External Storage (S3 and R2) ---
-        # Delete Scene Data from AWS S3
-        if s3_key_to_delete:
-            try:
-                logging.info(f"Deleting S3 object: Bucket={S3_BUCKET_NAME}, Key={s3_key_to_delete}")
-                s3_client.delete_object(Bucket=S3_BUCKET_NAME, Key=s3_key_to_delete)
-                logging.info(f"Successfully deleted S3 object: {s3_key_to_delete}")
-            except ClientError as e:
-                logging.error(f"Failed to delete S3 object {s3_key_to_delete}: {e}")
-                # Decide if this is fatal. For now, log and continue, but the DB record will remain.
-                # Could return 500 here if S3 deletion is critical before DB deletion.
-                # Let's proceed but log the inconsistency.
-                pass # Logged the error, continue to attempt other deletions
-
-        # Delete Thumbnail from Cloudflare R2
-        if thumbnail_key_to_delete:
-            try:
-                logging.info(f"Deleting R2 object: Bucket={CLOUDFLARE_BUCKET_NAME}, Key={thumbnail_key_to_delete}")
-                cloudflare_r2_client.delete_object(Bucket=CLOUDFLARE_BUCKET_NAME, Key=thumbnail_key_to_delete)
-                logging.info(f"Successfully deleted R2 object: {thumbnail_key_to_delete}")
-            except ClientError as e:
-                logging.error(f"Failed to delete R2 object {thumbnail_key_to_delete}: {e}")
-                # Log and continue
-                pass
-
-        # --- 3. Delete from Database (PostgreSQL) ---
-        with conn.cursor() as cursor:
-            # Delete thumbnail record first (if it exists)
-            if thumbnail_key_to_delete:
-                 logging.info(f"Deleting thumbnail record for scene_id {scene_id} from database.")
-                 cursor.execute("DELETE FROM scene_thumbnails WHERE scene_id = %s", (scene_id,))
-                 logging.info(f"Deleted thumbnail record for scene_id {scene_id} (Rows affected: {cursor.rowcount})")
+        if not _delete_scenes(conn, user_id, [scene_id]):
+            logging.warning(f"Scene {scene_id} not found or user {user_id} does not own it.")
+            return jsonify({'error': 'Scene not found or you do not have permission to delete it'}), 404
 
+        return jsonify({'message': 'Scene deleted successfully'}), 200
+
+    except Exception as e:
+        if conn:
+            conn.rollback() # Rollback DB changes if any error occurred before commit
+            logging.error(f"Database transaction rolled back due to error during scene {scene_id} deletion.")
+        logging.exception(f"Error deleting scene {scene_id} for user {username}: {e}") # Use logging.exception to include stack trace
+        return jsonify({'error': 'An unexpected error occurred during scene deletion'}), 500
+    finally:
+        if conn and not conn.closed:
+            conn.close()
 
-            # Delete scene record (ensuring user_id match again for safety)
-            logging.info(f"Deleting scene record for scene_id {scene_id} and user_id {user_id} from database.")
-            cursor.execute("DELETE FROM Scenes WHERE scene_id = %s AND user_id = %s", (scene_id, user_id))
-            logging.info(f"Deleted scene record for scene_id {scene_id} (Rows affected: {cursor.rowcount})")
 
+@scene_bp.route('/delete-scenes', methods=['POST'])
+@login_required
+def delete_scenes():
+    """Bulk delete. Body: {"sceneIds": [...]}. Ids the user does not own are reported as not found."""
+    user_id = g.user.id
 
-        conn.commit() # Commit transaction after successful deletions
-        logging.info(f"Database transaction committed for scene {scene_id} deletion.")
+    scene_ids = (request.get_json(silent=True) or {}).get('sceneIds')
+    if not isinstance(scene_ids, list) or not scene_ids or not all(isinstance(i, int) for i in scene_ids):
+        return jsonify({'error': 'sceneIds must be a non-empty list of integers'}), 400
+    scene_ids = list(dict.fromkeys(scene_ids))
+    if len(scene_ids) > BULK_DELETE_MAX_SCENES:
+        return jsonify({'error': f'At most {BULK_DELETE_MAX_SCENES} scenes can be deleted per request'}), 400
 
-        # --- 4. Invalidate Cache ---
-        if current_app.redis:
-            try:
-                scene_list_key = f"scenes:{user_id}"
-                scene_key = f"scene:{scene_id}" # If you cache individual scenes
-                deleted_count = current_app.redis.delete(scene_list_key, scene_key)
-                logging.info(f"Invalidated Redis cache keys: {scene_list_key}, {scene_key}. Keys deleted: {deleted_count}")
-            except Exception as e:
-                logging.error(f"Error invalidating Redis cache for user {user_id}, scene {scene_id}: {e}")
-                # Cache invalidation failure is usually not critical enough to fail the request
+    conn = None
+    try:
+        conn = get_db_connection()
+        if conn is None:
+            return jsonify({'error': 'Database connection failed'}), 500
 
-        return jsonify({'message': 'Scene deleted successfully'}), 200
+        deleted = set(_delete_scenes(conn, user_id, scene_ids))
+        return jsonify({
+            'message': f'Deleted {len(deleted)} scene(s)',
+            'deleted': [scene_id for scene_id in scene_ids if scene_id in deleted],
+            'notFound': [scene_id for scene_id in scene_ids if scene_id not in deleted],
+        }), 200
 
     except Exception as e:
         if conn:
-            conn.rollback() # Rollback DB changes if any error occurred before commit
-            logging.error(f"Database transaction rolled back due to error during scene {scene_id} deletion.")
-        logging.exception(f"Error deleting scene {scene_id} for user {username}: {e}") # Use logging.exception to include stack trace
+            conn.rollback()
+        logging.exception(f"Error bulk deleting scenes for user {user_id}: {e}")
         return jsonify({'error': 'An unexpected error occurred during scene deletion'}), 500
     finally:
         if conn and not conn.closed:
             conn.close()
-            logging.debug(f"Database connection closed for scene {scene_id} deletion request.")
\ No newline at end of file
@@ -0,0 +1,61 @@
+# --- storage_routes.py --- Presigned URL endpoint for the local storage backend
+from flask import Blueprint, Response, request, jsonify, stream_with_context
+from utils.storage import get_storage, LocalBackend, ObjectNotFound, StorageError, STORAGES
+import logging
+
+storage_bp = Blueprint('storage', __name__, url_prefix='/storage')
+
+
+@storage_bp.route('/<name>/<path:key>', methods=['GET', 'PUT'])
+def local_object(name, key):
+    """Serves LocalBackend presigned URLs. No session needed: the HMAC signature is the credential."""
+    if name not in STORAGES or not isinstance(get_storage(name), LocalBackend):
+        return jsonify({'error': 'Not found'}), 404
+    storage = get_storage(name)
+
+    limits = storage.verify(request.method, key, request.args)
+    if limits is None:
+        return jsonify({'error': 'Invalid or expired signature'}), 403
+
+    try:
+        if request.method == 'PUT':
+            content_type = request.headers.get('Content-Type', 'application/octet-stream')
+            if limits['content_type'] and content_type != limits['content_type']:
+                return jsonify({'error': 'Content-Type does not match the signed upload'}), 400
+            content_encoding = request.headers.get('Content-Encoding')
+            if content_encoding != limits['content_encoding']:
+                return jsonify({'error': 'Content-Encoding does not match the signed upload'}), 400
+            max_bytes = limits['max_bytes']
+            if max_bytes and (request.content_length or 0) > max_bytes:
+                return jsonify({'error': 'Upload is too large'}), 413
+            data = request.stream.read(max_bytes + 1) if max_bytes else request.get_data()
+            if max_bytes and len(data) > max_bytes:
+                return jsonify({'error': 'Upload is too large'}), 413
+
+            etag = storage.put(key, data, content_type=content_type, content_encoding=content_encoding)
+            response = Response(status=200)
+            response.set_etag(etag)
+            return response
+
+        obj = storage.get(key)
+
+        def generate():
+            try:
+                yield from obj.iter_chunks()
+            finally:
+                obj.close()
+
+        response = Response(stream_with_context(generate()), mimetype=obj.content_type, direct_passthrough=True)
+        response.headers['Content-Length'] = str(obj.content_length)
+        if obj.content_encoding:
+            response.headers['Content-Encoding'] = obj.content_encoding
+        if obj.cache_control:
+            response.headers['Cache-Control'] = obj.cache_control
+        response.set_etag(obj.etag)
+        return response
+
+    except ObjectNotFound:
+        return jsonify({'error': 'Not found'}), 404
+    except StorageError as e:
+        logging.error(f"Local storage error for {name}/{key}: {e}")
+        return jsonify({'error': 'Storage error'}), 500
@@ -1,32 +1,16 @@
 from flask import Blueprint, jsonify, request, current_app
-import boto3
-from botocore.exceptions import ClientError
 import psycopg2
 import os
 from utils.decorators import login_required # Keep if authentication is needed for tutorials
 from datetime import datetime, timedelta
 from utils.db import get_db_connection
+from utils.storage import get_storage, StorageError
 import logging
 import json
 
 tutorial_bp = Blueprint('tutorials', __name__, url_prefix='/tutorials')
 
-# Assuming R2 client setup is similar to library_routes.py
-# You might want to move this to a shared utils file if not already done
-CLOUDFLARE_ACCESS_KEY = os.environ.get('CLOUDFLARE_ACCESS_KEY')
-CLOUDFLARE_SECRET_KEY = os.environ.get('CLOUDFLARE_SECRET_KEY')
-CLOUDFLARE_ENDPOINT = os.environ.get('CLOUDFLARE_ENDPOINT')
-CLOUDFLARE_R2_REGION = "auto"
-CLOUDFLARE_BUCKET_NAME = os.environ.get('CLOUDFLARE_BUCKET_NAME')
-
-def get_r2_client():
-     return boto3.client(
-        's3',
-        region_name=CLOUDFLARE_R2_REGION,
-        endpoint_url=CLOUDFLARE_ENDPOINT,
-        aws_access_key_id=CLOUDFLARE_ACCESS_KEY,
-        aws_secret_access_key=CLOUDFLARE_SECRET_KEY
-    )
+# Videos and thumbnails live in the 'media' storage (utils/storage.py)
 
 # --- Logging Configuration ---
 logging.basicConfig(level=logging.INFO)
@@ -48,7 +32,7 @@ def get_tutorials():
 
     conn = None
     try:
-        conn = get_db_connection()
+        conn = get_db_connection(readonly=True)
         if conn is None:
             return jsonify({'message': 'Database connection failed'}), 500
 
@@ -63,27 +47,22 @@ def get_tutorials():
             column_names = [desc[0] for desc in cursor.description]
 
         tutorial_list = []
-        r2_client = get_r2_client()
-
-        for tutorial_row in tutorials_raw:
-            tutorial_dict = dict(zip(column_names, tutorial_row))
-            thumbnail_url = None
-
-            # Generate presigned URL for the thumbnail
-            if tutorial_dict.get('thumbnail_key'):
-                try:
-                    thumbnail_url = r2_client.generate_presigned_url(
-                        'get_object',
-                        Params={'Bucket': CLOUDFLARE_BUCKET_NAME, 'Key': tutorial_dict['thumbnail_key']},
-                        ExpiresIn=3600  # 1 hour validity for thumbnail URL
-                    )
-                except ClientError as e:
-                    logging.error(f"Error generating presigned URL for thumbnail {tutorial_dict['thumbnail_key']}: {e}")
-                except Exception as e:
-                    logging.error(f"Unexpected error generating presigned URL for thumbnail {tutorial_dict['thumbnail_key']}: {e}")
-
-
-            tutorial_dict['thumbnail_url'] = thumbnail_url
+        tutorial_dicts = [dict(zip(column_names, tutorial_row)) for tutorial_row in tutorials_raw]
+
+        # Presigned thumbnail URLs, signed in one batch and stable within a signing window (browser-cacheable)
+        thumbnail_urls = {}
+        try:
+            thumbnail_urls = get_storage('media').presign_many(
+                [tutorial_dict['thumbnail_key'] for tutorial_dict in tutorial_dicts if tutorial_dict.get('thumbnail_key')],
+                expires_in=3600  # Valid for at least 1 hour
+            )
+        except StorageError as e:
+            logging.error(f"Error generating presigned URLs for tutorial thumbnails: {e}")
+        except Exception as e:
+            logging.error(f"Unexpected error generating presigned URLs for tutorial thumbnails: {e}")
+
+        for tutorial_dict in tutorial_dicts:
+            tutorial_dict['thumbnail_url'] = thumbnail_urls.get(tutorial_dict.get('thumbnail_key'))
             # We don't need the raw key in the frontend response
             tutorial_dict.pop('thumbnail_key', None)
             tutorial_list.append(tutorial_dict)
@@ -126,7 +105,7 @@ def get_tutorial_signed_url(tutorial_id):
 
     conn = None
     try:
-        conn = get_db_connection()
+        conn = get_db_connection(readonly=True)
         if conn is None:
             return jsonify({'message': 'Database connection failed'}), 500
 
@@ -142,14 +121,9 @@ def get_tutorial_signed_url(tutorial_id):
             if not video_key:
                  return jsonify({'message': 'Video key not found for this tutorial'}), 404
 
-        r2_client = get_r2_client()
         try:
-            presigned_url = r2_client.generate_presigned_url(
-                'get_object',
-                Params={'Bucket': CLOUDFLARE_BUCKET_NAME, 'Key': video_key},
-                ExpiresIn=3600 # 1 hour validity for the video link
-            )
-        except ClientError as e:
+            presigned_url = get_storage('media').presign(video_key, expires_in=3600)  # 1 hour validity for the video link
+        except StorageError as e:
             logging.error(f"Error generating presigned URL for video {video_key}: {e}")
             return jsonify({'message': 'Failed to generate video URL'}), 500
         except Exception as e:
@@ -1,24 +1,70 @@
-from flask import Blueprint, jsonify, session
-from models import User, UserLog  # Absolute import
+import json
+import psycopg2
+from datetime import datetime
+from flask import Blueprint, Response, jsonify, g, request, stream_with_context
+from models import UserLog  # Absolute import
 from utils.decorators import login_required  # Absolute import
+from utils.pagination import encode_cursor, decode_cursor, parse_limit
 
 user_bp = Blueprint('user', __name__, url_prefix='/user')
 
 @user_bp.route('/logs', methods=['GET'])
 @login_required
 def get_user_logs():
-    username = session['username']
-    user = User.get_user_by_username(username)
-    if not user:
-        return jsonify({'message': 'User not found'}), 404
-    logs = UserLog.get_logs_by_user_id(user.id)
-    log_list = [
-        {
+    """Streams the user's activity log as JSON, newest first.
+
+    Optional `since`/`until` (ISO 8601) bound the time range. Passing `limit` and/or
+    `cursor` returns one page as {"logs": [...], "next_cursor": ...} instead of the
+    whole history as a bare list.
+    """
+    user = g.user
+    username = user.username
+    paginated = 'limit' in request.args or 'cursor' in request.args
+
+    try:
+        since = datetime.fromisoformat(request.args['since']) if request.args.get('since') else None
+        until = datetime.fromisoformat(request.args['until']) if request.args.get('until') else None
+        limit = parse_limit(request.args.get('limit')) if paginated else None
+        before = None
+        if request.args.get('cursor'):
+            timestamp, log_id = decode_cursor(request.args['cursor'], 2, (str, int))
+            before = (datetime.fromisoformat(timestamp), log_id)
+    except ValueError as e:
+        return jsonify({'message': f'Invalid query parameter: {e}'}), 400
+
+    try:
+        logs = UserLog.iter_logs_by_user_id(
+            user.id, since=since, until=until, before=before,
+            limit=limit + 1 if paginated else None  # One extra row tells us there is another page
+        )
+    except psycopg2.Error as e:
+        print(f"Error fetching user logs: {e}")
+        return jsonify({'message': 'Failed to fetch logs'}), 500
+
+    def to_json(log):
+        return json.dumps({
             'log_id': log.log_id,
             'user_id': log.user_id,
             'activity': log.activity,
             'timestamp': log.timestamp.isoformat(),
             'username': username
-        } for log in logs
-    ]
-    return jsonify(log_list), 200
+        })
+
+    def generate():
+        yield '{"logs":[' if paginated else '['
+        next_cursor = None
+        last = None
+        try:
+            for count, log in enumerate(logs):
+                if paginated and count == limit:
+                    next_cursor = encode_cursor(last.timestamp.isoformat(), last.log_id)
+                    break
+                yield (',' if count else '') + to_json(log)
+                last = log
+        finally:
+            logs.close()  # Closes the server-side cursor even if the client went away
+        # Only reached when every row was sent: a database error mid-stream propagates and
+        # aborts the response, so the client never sees a truncated list as complete JSON
+        yield f'],"next_cursor":{json.dumps(next_cursor)}}}' if paginated else ']'
+
+    return Response(stream_with_context(generate()), mimetype='application/json'), 200
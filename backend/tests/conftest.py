@@ -0,0 +1,5 @@
+# Run from backend/: python -m pytest
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
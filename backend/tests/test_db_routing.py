@@ -0,0 +1,195 @@
+# tests/test_db_routing.py
+"""Read routing in utils/db.py: get_db_connection(readonly=True) and the read-your-writes window.
+
+The routing tests need two Postgres DSNs and are skipped without them. Both may point at
+the same server, the replica pool's connections are read-only either way:
+    TEST_DB_URL=postgresql://localhost/test TEST_DB_REPLICA_URL=postgresql://localhost/test python -m pytest
+"""
+import os
+import time
+from types import SimpleNamespace
+import fakeredis
+import psycopg2
+import pytest
+from flask import Flask, g
+from redis.exceptions import ConnectionError as RedisConnectionError
+from utils import db
+
+PRIMARY_DSN = os.environ.get('TEST_DB_URL')
+REPLICA_DSN = os.environ.get('TEST_DB_REPLICA_URL')
+UNREACHABLE_DSN = 'host=127.0.0.1 port=1 connect_timeout=1'
+
+needs_postgres = pytest.mark.skipif(not (PRIMARY_DSN and REPLICA_DSN),
+                                    reason="TEST_DB_URL and TEST_DB_REPLICA_URL are not set")
+
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    app.secret_key = 'test'
+    app.redis = fakeredis.FakeRedis()
+    db.init_app(app)
+    db._local_writes.clear()
+    return app
+
+
+@pytest.fixture
+def replicas(monkeypatch):
+    """Points the primary pool at TEST_DB_URL and the replica pools at the given DSNs."""
+    monkeypatch.setattr(db, '_pool', db.ConnectionPool({'dsn': PRIMARY_DSN}))
+
+    def use(*dsns):
+        monkeypatch.setattr(db, 'DB_REPLICA_URLS', ','.join(dsns))
+        monkeypatch.setattr(db, '_replica_pools', None)
+
+    use(REPLICA_DSN)
+    yield use
+    db._pool.closeall()
+    for pool in db._replica_pools or []:
+        pool.closeall()
+
+
+def request_as(app, user_id):
+    ctx = app.test_request_context()
+    ctx.push()
+    g.user = SimpleNamespace(id=user_id)
+    return ctx
+
+
+def read_only(conn):
+    with conn.cursor() as cursor:
+        cursor.execute("SHOW default_transaction_read_only")
+        return cursor.fetchone()[0] == 'on'
+
+
+def write(app, user_id):
+    """Commits a (no-op) transaction on the primary as `user_id`."""
+    with app.test_request_context():
+        g.user = SimpleNamespace(id=user_id)
+        conn = db.get_db_connection()
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT 1")
+        conn.commit()
+
+
+def wrote_recently(app, user_id):
+    with app.test_request_context():
+        g.user = SimpleNamespace(id=user_id)
+        return db.recently_wrote()
+
+
+# --- Read-your-writes window ---
+
+def test_commit_pins_the_writer_only(app, monkeypatch):
+    monkeypatch.setattr(db, 'DB_READ_YOUR_WRITES_WINDOW', 0.2)
+    with app.test_request_context():
+        g.user = SimpleNamespace(id=1)
+        db.mark_write()
+        assert db.recently_wrote()
+
+    assert wrote_recently(app, 1)  # Shared through Redis, so any worker sees it
+    assert not wrote_recently(app, 2)
+    time.sleep(0.3)
+    assert not wrote_recently(app, 1)
+
+
+def test_window_without_redis(app, monkeypatch):
+    monkeypatch.setattr(db, 'DB_READ_YOUR_WRITES_WINDOW', 0.2)
+    app.redis = None
+    with app.test_request_context():
+        g.user = SimpleNamespace(id=1)
+        db.mark_write()
+
+    assert wrote_recently(app, 1)
+    time.sleep(0.3)
+    assert not wrote_recently(app, 1)
+
+
+def test_unknown_redis_state_counts_as_a_write(app):
+    def unreachable(key):
+        raise RedisConnectionError("down")
+    app.redis = SimpleNamespace(exists=unreachable)
+    assert wrote_recently(app, 1)
+
+
+# --- Routing (Postgres) ---
+
+@needs_postgres
+def test_reads_go_to_the_replica(app, replicas):
+    ctx = request_as(app, 1)
+    try:
+        assert read_only(db.get_db_connection(readonly=True))
+        assert not read_only(db.get_db_connection())
+    finally:
+        ctx.pop()
+
+
+@needs_postgres
+def test_reads_after_a_write_stay_on_the_primary(app, replicas, monkeypatch):
+    monkeypatch.setattr(db, 'DB_READ_YOUR_WRITES_WINDOW', 1)
+    write(app, 1)
+
+    ctx = request_as(app, 1)
+    try:
+        assert not read_only(db.get_db_connection(readonly=True))
+    finally:
+        ctx.pop()
+
+    ctx = request_as(app, 2)  # Other users still read from the replica
+    try:
+        assert read_only(db.get_db_connection(readonly=True))
+    finally:
+        ctx.pop()
+
+    time.sleep(1.1)
+    ctx = request_as(app, 1)
+    try:
+        assert read_only(db.get_db_connection(readonly=True))
+    finally:
+        ctx.pop()
+
+
+@needs_postgres
+def test_request_holding_the_primary_reads_from_it(app, replicas):
+    ctx = request_as(app, 1)
+    try:
+        primary = db.get_db_connection()
+        assert db.get_db_connection(readonly=True) is primary
+    finally:
+        ctx.pop()
+
+
+@needs_postgres
+def test_unreachable_replica_is_skipped(app, replicas):
+    replicas(UNREACHABLE_DSN, REPLICA_DSN)
+    for _ in range(2):  # The round robin starts at each replica once
+        ctx = request_as(app, 1)
+        try:
+            assert read_only(db.get_db_connection(readonly=True))
+        finally:
+            ctx.pop()
+
+
+@needs_postgres
+def test_falls_back_to_the_primary(app, replicas):
+    replicas(UNREACHABLE_DSN)
+    ctx = request_as(app, 1)
+    try:
+        conn = db.get_db_connection(readonly=True)
+        assert conn is not None
+        assert not read_only(conn)
+    finally:
+        ctx.pop()
+
+
+@needs_postgres
+def test_replica_connections_refuse_writes(app, replicas):
+    ctx = request_as(app, 1)
+    try:
+        conn = db.get_db_connection(readonly=True)
+        with pytest.raises(psycopg2.errors.ReadOnlySqlTransaction):
+            with conn.cursor() as cursor:
+                cursor.execute("CREATE TEMP TABLE routing_probe (id INTEGER)")
+        conn.rollback()
+    finally:
+        ctx.pop()
@@ -0,0 +1,137 @@
+# tests/test_jobs.py
+"""The Redis job queue (utils/jobs.py), run against fakeredis."""
+import time
+import fakeredis
+import pytest
+from flask import Flask
+from redis.exceptions import ConnectionError as RedisConnectionError
+from utils import jobs
+
+calls = []
+
+
+@jobs.job('test.record')
+def record(*args, **kwargs):
+    calls.append((args, kwargs))
+
+
+@jobs.job('test.fail')
+def fail(*args):
+    raise RuntimeError("boom")
+
+
+@pytest.fixture
+def app():
+    return Flask(__name__)
+
+
+@pytest.fixture
+def redis_client():
+    return fakeredis.FakeRedis()
+
+
+@pytest.fixture
+def queue(redis_client):
+    calls.clear()
+    return jobs.JobQueue(redis_client, max_attempts=3)
+
+
+def make_due(redis_client):
+    """Moves every delayed job's due time into the past."""
+    for data in redis_client.zrange(jobs.JOB_DELAYED_KEY, 0, -1):
+        redis_client.zadd(jobs.JOB_DELAYED_KEY, {data: 0})
+
+
+def test_enqueue_and_run(app, queue, redis_client):
+    queue.enqueue('test.record', 1, b'\x00bytes', key='value')
+    assert redis_client.llen(jobs.JOB_QUEUE_KEY) == 1
+
+    queue.work(app, burst=True)
+
+    assert calls == [((1, b'\x00bytes'), {'key': 'value'})]
+    assert queue.pending() == 0
+    assert redis_client.llen(queue._processing_key) == 0  # Acknowledged
+
+
+def test_enqueue_unknown_job(queue):
+    with pytest.raises(KeyError):
+        queue.enqueue('test.missing')
+
+
+def test_failed_job_is_retried_with_backoff(app, queue, redis_client, monkeypatch):
+    monkeypatch.setattr(jobs.random, 'uniform', lambda low, high: 1.0)
+    queue.enqueue('test.fail')
+    before = time.time()
+
+    queue.work(app, burst=True)
+
+    delayed = redis_client.zrange(jobs.JOB_DELAYED_KEY, 0, -1, withscores=True)
+    assert len(delayed) == 1
+    payload, due = jobs.loads(delayed[0][0]), delayed[0][1]
+    assert payload['attempts'] == 1
+    assert 'RuntimeError: boom' in payload['error']
+    assert due - before == pytest.approx(jobs.backoff_delay(1), abs=1)
+
+    make_due(redis_client)
+    queue.work(app, burst=True)
+    payload, due = redis_client.zrange(jobs.JOB_DELAYED_KEY, 0, -1, withscores=True)[0]
+    assert jobs.loads(payload)['attempts'] == 2
+    assert due - time.time() == pytest.approx(jobs.backoff_delay(2), abs=1)  # Doubled
+
+
+def test_job_is_dead_lettered_after_max_attempts(app, queue, redis_client):
+    job_id = queue.enqueue('test.fail', 'arg')
+    for _ in range(3):
+        make_due(redis_client)
+        queue.work(app, burst=True)
+
+    assert queue.pending() == 0
+    dead = queue.dead_letters()
+    assert [job['id'] for job in dead] == [job_id]
+    assert dead[0]['attempts'] == 3 and dead[0]['args'] == ['arg']
+    assert redis_client.llen(queue._processing_key) == 0
+
+
+def test_delayed_job_is_promoted_when_due(app, queue, redis_client):
+    queue.enqueue('test.record', 'later', delay=60)
+
+    queue.work(app, burst=True)
+    assert calls == []
+    assert redis_client.zcard(jobs.JOB_DELAYED_KEY) == 1
+
+    make_due(redis_client)
+    queue.work(app, burst=True)
+    assert calls == [(('later',), {})]
+    assert queue.pending() == 0
+
+
+def test_jobs_of_a_dead_worker_are_requeued(app, queue, redis_client):
+    crashed = jobs.JobQueue(redis_client)
+    queue.enqueue('test.record', 'in flight')
+    payload, receipt = crashed._pop(0)  # Taken, then the worker dies before acking
+    assert payload['args'] == ['in flight'] and receipt is not None
+    assert queue.pending() == 0
+
+    queue.work(app, burst=True)  # No heartbeat for `crashed`, so its job comes back
+    assert calls == [(('in flight',), {})]
+    assert redis_client.llen(crashed._processing_key) == 0
+
+
+def test_jobs_of_a_live_worker_are_left_alone(queue, redis_client):
+    busy = jobs.JobQueue(redis_client)
+    busy.heartbeat()
+    queue.enqueue('test.record')
+    busy._pop(0)
+
+    assert queue.recover_stale() == 0
+    assert redis_client.llen(busy._processing_key) == 1
+
+
+def test_enqueue_falls_back_in_process_when_redis_fails(app, queue, monkeypatch):
+    def unavailable(*args, **kwargs):
+        raise RedisConnectionError("Redis is down")
+
+    monkeypatch.setattr(queue.redis, 'lpush', unavailable)
+    queue.enqueue('test.record', 'kept')  # Does not raise into the (already committed) caller
+
+    assert queue._pop_local(0)['args'] == ['kept']
@@ -0,0 +1,158 @@
+# utils/activity_log.py
+import os
+import json
+import atexit
+import logging
+import threading
+from collections import deque
+from datetime import datetime, timezone
+
+# --- Activity Log Configuration ---
+ACTIVITY_LOG_BACKEND = os.environ.get('ACTIVITY_LOG_BACKEND', 'memory')          # 'memory' or 'redis'
+ACTIVITY_LOG_BATCH_SIZE = int(os.environ.get('ACTIVITY_LOG_BATCH_SIZE', 200))    # Flush once this many are queued
+ACTIVITY_LOG_FLUSH_INTERVAL = float(os.environ.get('ACTIVITY_LOG_FLUSH_INTERVAL', 2))  # ...or after this many seconds
+ACTIVITY_LOG_MAX_BUFFER = int(os.environ.get('ACTIVITY_LOG_MAX_BUFFER', 10000))  # Oldest entries dropped beyond this
+ACTIVITY_LOG_REDIS_KEY = 'activity_log:queue'
+
+
+class ActivityLogger:
+    """Write-behind buffer for user_logs rows.
+
+    log() only appends to a queue (a local deque, or a Redis list shared by all workers);
+    a daemon thread hands batches to `write_batch` when the batch size or the flush
+    interval is reached, and close() drains whatever is left on shutdown.
+    """
+
+    def __init__(self, write_batch, redis_client=None, batch_size=ACTIVITY_LOG_BATCH_SIZE,
+                 flush_interval=ACTIVITY_LOG_FLUSH_INTERVAL, max_buffer=ACTIVITY_LOG_MAX_BUFFER):
+        self.write_batch = write_batch
+        self.redis = redis_client
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_buffer = max_buffer
+        self._buffer = deque(maxlen=max_buffer)
+        self._dropped = 0  # Entries log() pushed out of a full buffer since the last report
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._flush_lock = threading.Lock()
+        self._thread = None
+        self._thread_lock = threading.Lock()
+
+    def log(self, user_id, activity, timestamp=None):
+        entry = (user_id, activity, timestamp or datetime.now(timezone.utc))
+        if self.redis is not None:
+            try:
+                queued = self.redis.rpush(ACTIVITY_LOG_REDIS_KEY, json.dumps(
+                    [entry[0], entry[1], entry[2].isoformat()]))
+                if queued >= self.max_buffer:
+                    self.redis.ltrim(ACTIVITY_LOG_REDIS_KEY, -self.max_buffer, -1)
+            except Exception as e:
+                logging.error(f"Error queueing activity log in Redis, buffering locally: {e}")
+                queued = self._append(entry)
+        else:
+            queued = self._append(entry)
+
+        self._ensure_thread()
+        if queued >= self.batch_size:
+            self._wake.set()
+        return True
+
+    def flush(self):
+        """Writes queued entries in batches until the queue is empty. Returns the number written."""
+        written = 0
+        with self._flush_lock:
+            dropped, self._dropped = self._dropped, 0
+            if dropped:
+                logging.error(f"Activity log buffer was full, dropped the {dropped} oldest entries")
+            while True:
+                batch = self._take_batch()
+                if not batch:
+                    return written
+                try:
+                    if not self.write_batch(batch):
+                        raise RuntimeError("write_batch reported failure")
+                except Exception as e:
+                    logging.error(f"Error flushing {len(batch)} activity logs, will retry: {e}")
+                    self._requeue(batch)
+                    return written
+                written += len(batch)
+
+    def close(self):
+        self._stopped.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.flush_interval + 5)
+        self.flush()
+
+    def _append(self, entry):
+        if len(self._buffer) >= self.max_buffer:
+            self._dropped += 1  # Reported by flush() rather than once per call
+        self._buffer.append(entry)  # A full deque drops from the left, the oldest end
+        return len(self._buffer)
+
+    def _requeue(self, batch):
+        """Puts a failed batch back in front of the buffer for the next attempt. When it no
+        longer fits, the oldest entries are dropped (the batch is older than anything
+        buffered meanwhile), in line with the buffer's own policy."""
+        overflow = len(batch) + len(self._buffer) - self.max_buffer
+        if overflow > 0:
+            logging.error(f"Activity log buffer is full, dropped the {overflow} oldest entries")
+            if overflow >= len(batch):
+                for _ in range(overflow - len(batch)):
+                    self._buffer.popleft()
+                return
+            batch = batch[overflow:]
+        self._buffer.extendleft(reversed(batch))
+
+    def _take_batch(self):
+        batch = []
+        while self._buffer and len(batch) < self.batch_size:
+            batch.append(self._buffer.popleft())
+        if self.redis is not None and len(batch) < self.batch_size:
+            try:
+                wanted = self.batch_size - len(batch)
+                pipe = self.redis.pipeline()  # MULTI/EXEC, so two workers never take the same entries
+                pipe.lrange(ACTIVITY_LOG_REDIS_KEY, 0, wanted - 1)
+                pipe.ltrim(ACTIVITY_LOG_REDIS_KEY, wanted, -1)
+                raw_entries, _ = pipe.execute()
+                for raw in raw_entries:
+                    user_id, activity, timestamp = json.loads(raw)
+                    batch.append((user_id, activity, datetime.fromisoformat(timestamp)))
+            except Exception as e:
+                logging.error(f"Error reading activity logs from Redis: {e}")
+        return batch
+
+    def _ensure_thread(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._thread_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='activity-log-flusher', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+
+_logger = None
+
+
+def init_app(app):
+    """Creates the process-wide activity logger and drains it when the process exits."""
+    global _logger
+    from models import UserLog  # models queues through this module, so import lazily
+    redis_client = app.redis if ACTIVITY_LOG_BACKEND == 'redis' else None
+    _logger = ActivityLogger(UserLog.create_logs, redis_client=redis_client)
+    atexit.register(_logger.close)
+    return _logger
+
+
+def log(user_id, activity):
+    """Queues one activity entry. Costs a deque append (or one RPUSH in Redis mode)."""
+    if _logger is None:
+        from models import UserLog
+        return UserLog.create_logs([(user_id, activity, datetime.now(timezone.utc))])
+    return _logger.log(user_id, activity)
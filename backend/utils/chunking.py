@@ -0,0 +1,75 @@
+# utils/chunking.py
+"""Content-defined chunking (FastCDC) for deduplicating successive versions of a document.
+
+Cut points depend only on the bytes around them, so an edit only changes the chunks it
+touches: inserting a few bytes near the start of a scene shifts every later offset but
+leaves the later chunks, and their hashes, as they were.
+"""
+import os
+import hashlib
+
+CHUNK_MIN_SIZE = int(os.environ.get('CHUNK_MIN_SIZE', 2 * 1024))     # No cut point is considered before this
+CHUNK_AVG_SIZE = int(os.environ.get('CHUNK_AVG_SIZE', 8 * 1024))     # Rounded to a power of two
+CHUNK_MAX_SIZE = int(os.environ.get('CHUNK_MAX_SIZE', 64 * 1024))    # Forced cut
+
+# 32-bit gear hash: every byte adds a fixed random value and older bytes shift out after 32
+# steps. The table is derived from sha256 so it never changes between deploys; a different
+# table would still chunk correctly but would stop deduplicating against stored versions.
+_GEAR = tuple(int.from_bytes(hashlib.sha256(bytes([i])).digest()[:4], 'big') for i in range(256))
+_HASH_MASK = 0xFFFFFFFF
+
+
+def _mask(bits):
+    """`bits` one-bits at the top of the hash, where the most recent 32 bytes all contribute."""
+    return ((1 << bits) - 1) << (32 - bits)
+
+
+def _cut_masks(avg_size):
+    # Normalised chunking: a stricter mask before the average size and a looser one after
+    # it pulls chunk sizes towards the average.
+    bits = max(avg_size.bit_length() - 1, 1)
+    return _mask(bits + 1), _mask(max(bits - 1, 1))
+
+
+def cut_point(data, start, min_size=CHUNK_MIN_SIZE, avg_size=CHUNK_AVG_SIZE, max_size=CHUNK_MAX_SIZE):
+    """Returns the end offset of the chunk starting at `start`."""
+    remaining = len(data) - start
+    if remaining <= min_size:
+        return len(data)
+    end = start + min(remaining, max_size)
+    normal = start + min(remaining, avg_size)
+    mask_small, mask_large = _cut_masks(avg_size)
+    gear = _GEAR
+
+    h = 0
+    i = start + min_size  # FastCDC skips the first min_size bytes: no cut can land there
+    while i < normal:
+        h = ((h << 1) + gear[data[i]]) & _HASH_MASK
+        i += 1
+        if not h & mask_small:
+            return i
+    while i < end:
+        h = ((h << 1) + gear[data[i]]) & _HASH_MASK
+        i += 1
+        if not h & mask_large:
+            return i
+    return end
+
+
+def iter_chunks(data, min_size=CHUNK_MIN_SIZE, avg_size=CHUNK_AVG_SIZE, max_size=CHUNK_MAX_SIZE):
+    """Yields consecutive memoryview slices of `data` that concatenate back to it."""
+    view = memoryview(data)
+    start = 0
+    while start < len(data):
+        end = cut_point(view, start, min_size, avg_size, max_size)
+        yield view[start:end]
+        start = end
+
+
+def chunk_hash(chunk):
+    return hashlib.sha256(chunk).hexdigest()
+
+
+def split(data, **sizes):
+    """Returns [(sha256 hex, bytes)] for every chunk of `data`, in order."""
+    return [(chunk_hash(chunk), bytes(chunk)) for chunk in iter_chunks(data, **sizes)]
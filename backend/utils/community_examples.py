@@ -0,0 +1,128 @@
+# utils/community_examples.py
+"""Two-tier cache for community example bodies: an in-process byte-bounded LRU, then Redis.
+
+Every user who opens an example asks for the same handful of documents, so each worker
+keeps the stored bytes in memory and a hit costs a dict lookup. Entries are keyed by a
+version stamp kept in Redis: bumping it (after changing examples in storage) retires every
+cached copy in every worker within EXAMPLE_VERSION_CHECK_INTERVAL seconds.
+
+Usage (from backend/):
+    python -m utils.community_examples invalidate   # bump the version stamp
+"""
+import os
+import sys
+import time
+import logging
+import threading
+from collections import namedtuple
+from flask import current_app
+from utils.lru import ByteLRU
+
+# --- Community Example Cache Configuration ---
+EXAMPLE_CACHE_MAX_BYTES = int(os.environ.get('EXAMPLE_CACHE_MAX_BYTES', 64 * 1024 * 1024))         # Per worker
+EXAMPLE_CACHE_MAX_ENTRY_BYTES = int(os.environ.get('EXAMPLE_CACHE_MAX_ENTRY_BYTES', 8 * 1024 * 1024))  # Larger ones are streamed, never cached
+EXAMPLE_LOCAL_TTL = int(os.environ.get('EXAMPLE_LOCAL_TTL', 300))                   # Seconds a worker keeps a body
+EXAMPLE_REDIS_TTL = int(os.environ.get('EXAMPLE_REDIS_TTL', 3600))                  # Seconds the shared copy lives in Redis
+EXAMPLE_VERSION_CHECK_INTERVAL = float(os.environ.get('EXAMPLE_VERSION_CHECK_INTERVAL', 15))  # Seconds a worker trusts its version stamp
+
+EXAMPLE_VERSION_KEY = 'community_examples:version'
+
+# body is the object exactly as stored (gzipped when content_encoding says so)
+CachedExample = namedtuple('CachedExample', ['etag', 'content_encoding', 'body'])
+
+_local_cache = ByteLRU(EXAMPLE_CACHE_MAX_BYTES, EXAMPLE_LOCAL_TTL, EXAMPLE_CACHE_MAX_ENTRY_BYTES)
+_version = {'stamp': 0, 'checked_at': float('-inf')}
+_version_lock = threading.Lock()
+
+
+def _redis_key(example_id, version):
+    return f"community_example:v{version}:{example_id}"
+
+
+def current_version():
+    """The version stamp, re-read from Redis at most every EXAMPLE_VERSION_CHECK_INTERVAL seconds."""
+    redis_client = current_app.redis
+    if not redis_client:
+        return 0
+    now = time.monotonic()
+    with _version_lock:
+        if now - _version['checked_at'] < EXAMPLE_VERSION_CHECK_INTERVAL:
+            return _version['stamp']
+        _version['checked_at'] = now  # Other threads keep using the old stamp while this one asks
+        stamp = _version['stamp']
+    try:
+        stamp = int(redis_client.get(EXAMPLE_VERSION_KEY) or 0)
+    except Exception as e:
+        logging.error(f"Error reading community example version: {e}")
+    with _version_lock:
+        if stamp != _version['stamp']:
+            _local_cache.clear()  # Entries for the old stamp can never be hit again
+            _version['stamp'] = stamp
+    return stamp
+
+
+def get(example_id, version):
+    """Returns the CachedExample from memory or Redis, or None."""
+    example = _local_cache.get((version, example_id))
+    if example is not None:
+        return example
+
+    if current_app.redis:
+        try:
+            cached = current_app.redis.hgetall(_redis_key(example_id, version))
+            if cached:
+                encoding = cached.get(b'content_encoding') or None
+                example = CachedExample(cached[b'etag'].decode('ascii'),
+                                        encoding.decode('ascii') if encoding else None,
+                                        cached[b'body'])
+                _local_cache.put((version, example_id), example, len(example.body))
+                return example
+        except Exception as e:
+            logging.error(f"Error retrieving community example {example_id} from cache: {e}")
+    return None
+
+
+def put(example_id, version, example):
+    """Stores an example in both tiers under the stamp it was looked up with."""
+    if not _local_cache.put((version, example_id), example, len(example.body)):
+        return  # Too large to cache
+    if current_app.redis:
+        try:
+            key = _redis_key(example_id, version)
+            pipe = current_app.redis.pipeline()
+            pipe.hset(key, mapping={'etag': example.etag, 'content_encoding': example.content_encoding or '',
+                                    'body': example.body})
+            pipe.expire(key, EXAMPLE_REDIS_TTL)
+            pipe.execute()
+        except Exception as e:
+            logging.error(f"Error caching community example {example_id}: {e}")
+
+
+def invalidate(redis_client=None):
+    """Retires every cached example (all workers pick it up within EXAMPLE_VERSION_CHECK_INTERVAL)."""
+    _local_cache.clear()
+    redis_client = redis_client if redis_client is not None else current_app.redis
+    if redis_client:
+        return redis_client.incr(EXAMPLE_VERSION_KEY)
+    return None
+
+
+def stats():
+    return _local_cache.stats()
+
+
+def main(argv):
+    if len(argv) < 2 or argv[1] != 'invalidate':
+        print(__doc__)
+        return 2
+    import redis
+    redis_url = os.environ.get('REDIS_URL')
+    if not redis_url:
+        print("REDIS_URL is not set; nothing to invalidate")
+        return 1
+    print(f"Community example cache version is now {invalidate(redis.Redis.from_url(redis_url))}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
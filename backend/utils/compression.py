@@ -0,0 +1,32 @@
+# utils/compression.py
+import os
+import gzip
+import zlib
+
+SCENE_COMPRESSION_LEVEL = int(os.environ.get('SCENE_COMPRESSION_LEVEL', 6))  # 1 (fast) .. 9 (small)
+
+
+def gzip_bytes(data):
+    """Gzips `data` deterministically (mtime=0), so identical scenes produce identical objects."""
+    return gzip.compress(data, compresslevel=SCENE_COMPRESSION_LEVEL, mtime=0)
+
+
+def gunzip_bytes(data):
+    return gzip.decompress(data)
+
+
+def gunzip_chunks(chunks):
+    """Incrementally decompresses an iterable of gzip chunks, so memory stays at one chunk."""
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)  # 16+: expect a gzip header
+    for chunk in chunks:
+        data = decompressor.decompress(chunk)
+        if data:
+            yield data
+    tail = decompressor.flush()
+    if tail:
+        yield tail
+
+
+def accepts_encoding(request, encoding):
+    """True if the client's Accept-Encoding allows `encoding` (explicitly or via '*')."""
+    return request.accept_encodings[encoding] > 0
@@ -1,6 +1,12 @@
 # utils/db.py
 import psycopg2
+from psycopg2 import extensions
 import os
+import time
+import logging
+import threading
+import itertools
+from flask import g, session, current_app, has_app_context, has_request_context
 from dotenv import load_dotenv
 from pathlib import Path  # Import the Path class
 
@@ -8,27 +14,341 @@ from pathlib import Path  # Import the Path class
 env_path = Path(__file__).resolve().parent.parent / '.env'  # Go up two levels
 load_dotenv(dotenv_path=env_path)
 
-def get_db_connection():
-    """Establishes a connection to the Supabase database."""
-    # Debugging prints (Keep these for now!)
-    print(f"DB_HOST: {os.environ.get('SUPABASE_DB_HOST')}")
-    print(f"DB_USER: {os.environ.get('SUPABASE_DB_USER')}")
-    print(f"DB_PASSWORD: {os.environ.get('SUPABASE_DB_PASSWORD')}")
-    print(f"DB_NAME: {os.environ.get('SUPABASE_DB_NAME')}")
-    print(f"DB_PORT: {os.environ.get('SUPABASE_DB_PORT')}")
+# --- Pool Configuration ---
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 5))                # Connections kept open while idle
+DB_POOL_MAX_OVERFLOW = int(os.environ.get('DB_POOL_MAX_OVERFLOW', 10))  # Extra connections allowed under load
+DB_POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', 10))       # Seconds to wait for a free connection
+DB_POOL_MAX_AGE = int(os.environ.get('DB_POOL_MAX_AGE', 1800))       # Recycle connections older than this (seconds)
+DB_POOL_PING_AFTER = int(os.environ.get('DB_POOL_PING_AFTER', 30))   # Ping connections idle longer than this (seconds)
 
-    try:
-        conn = psycopg2.connect(
-            host=os.environ.get('SUPABASE_DB_HOST'),
-            user=os.environ.get('SUPABASE_DB_USER'),
-            password=os.environ.get('SUPABASE_DB_PASSWORD'),
-            database=os.environ.get('SUPABASE_DB_NAME'),
-            port=int(os.environ.get('SUPABASE_DB_PORT', 5432)),
-        )
+# --- Read Replica Configuration ---
+DB_REPLICA_URLS = os.environ.get('SUPABASE_DB_REPLICA_URLS', '')    # Comma-separated libpq DSNs/URLs
+DB_READ_YOUR_WRITES_WINDOW = float(os.environ.get('DB_READ_YOUR_WRITES_WINDOW', 5))  # Seconds reads stay on the primary after a write
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection becomes available within DB_POOL_TIMEOUT."""
+
+
+class ConnectionPool:
+    """Thread-safe pool of psycopg2 connections.
+
+    Keeps up to `size` idle connections around, lets up to `max_overflow` extra
+    connections be opened under load, recycles connections older than `max_age`
+    and pings connections that have been idle for a while before handing them out.
+    """
+
+    def __init__(self, connect_kwargs, size=DB_POOL_SIZE, max_overflow=DB_POOL_MAX_OVERFLOW,
+                 timeout=DB_POOL_TIMEOUT, max_age=DB_POOL_MAX_AGE, ping_after=DB_POOL_PING_AFTER):
+        self.connect_kwargs = connect_kwargs
+        self.size = size
+        self.max_overflow = max_overflow
+        self.timeout = timeout
+        self.max_age = max_age
+        self.ping_after = ping_after
+        self._idle = []      # [(conn, last_used)] - used as a stack so warm connections are reused first
+        self._born = {}      # conn -> creation time, for every connection the pool owns
+        self._total = 0      # open connections plus reserved slots for connections being opened
+        self._cond = threading.Condition()
+
+    def getconn(self):
+        deadline = time.monotonic() + self.timeout
+        while True:
+            conn, last_used = None, None
+            with self._cond:
+                while True:
+                    if self._idle:
+                        conn, last_used = self._idle.pop()
+                        break
+                    if self._total < self.size + self.max_overflow:
+                        self._total += 1  # Reserve a slot, connect outside the lock
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise PoolTimeout(f"No database connection available after {self.timeout}s "
+                                          f"(size={self.size}, max_overflow={self.max_overflow})")
+                    self._cond.wait(remaining)
+
+            if conn is None:
+                try:
+                    return self._connect()
+                except Exception:
+                    self._forget(None)
+                    raise
+
+            if self._is_usable(conn, last_used):
+                return conn
+            self._discard(conn)
+
+    def putconn(self, conn):
+        if conn.closed:
+            self._discard(conn)
+            return
+        try:
+            if conn.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+                conn.rollback()  # Never hand out a connection with someone else's open transaction
+        except psycopg2.Error:
+            self._discard(conn)
+            return
+
+        with self._cond:
+            keep = not self._expired(conn) and len(self._idle) < self.size  # Overflow connections are closed
+            if keep:
+                self._idle.append((conn, time.monotonic()))
+                self._cond.notify()
+        if not keep:
+            self._discard(conn)
+
+    def closeall(self):
+        with self._cond:
+            idle, self._idle = self._idle, []
+        for conn, _ in idle:
+            self._discard(conn)
+
+    def _connect(self):
+        conn = psycopg2.connect(**self.connect_kwargs)
+        with self._cond:
+            self._born[conn] = time.monotonic()
         return conn
-    except psycopg2.Error as e:
+
+    def _expired(self, conn):
+        born = self._born.get(conn)
+        return born is None or time.monotonic() - born > self.max_age
+
+    def _is_usable(self, conn, last_used):
+        if conn.closed or self._expired(conn):
+            return False
+        if time.monotonic() - last_used < self.ping_after:
+            return True
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error as e:
+            logging.warning(f"Discarding broken pooled connection: {e}")
+            return False
+
+    def _discard(self, conn):
+        try:
+            if not conn.closed:
+                conn.close()
+        except psycopg2.Error:
+            pass
+        self._forget(conn)
+
+    def _forget(self, conn):
+        with self._cond:
+            if conn is not None:
+                self._born.pop(conn, None)
+            self._total -= 1
+            self._cond.notify()
+
+
+class PooledConnection:
+    """Proxy around a pooled psycopg2 connection.
+
+    Behaves like the raw connection, except that close() hands it back to the pool.
+    Request-scoped connections ignore close() and are returned on app-context teardown,
+    so models and routes can keep their `finally: conn.close()` blocks.
+    """
+
+    def __init__(self, conn, pool, request_scoped=False, on_commit=None):
+        object.__setattr__(self, '_conn', conn)
+        object.__setattr__(self, '_pool', pool)
+        object.__setattr__(self, '_request_scoped', request_scoped)
+        object.__setattr__(self, '_on_commit', on_commit)
+        object.__setattr__(self, '_released', False)
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def __setattr__(self, name, value):
+        setattr(self._conn, name, value)
+
+    @property
+    def closed(self):
+        return 1 if self._released else self._conn.closed
+
+    def commit(self):
+        self._conn.commit()
+        if self._on_commit is not None:
+            self._on_commit()
+
+    def close(self):
+        if not self._request_scoped:
+            self.release()
+
+    def release(self):
+        if not self._released:
+            object.__setattr__(self, '_released', True)
+            self._pool.putconn(self._conn)
+
+
+_pool = None
+_replica_pools = None
+_replica_turns = itertools.count()  # next() is atomic, so concurrent checkouts never repeat a turn
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Returns the process-wide connection pool for the primary, creating it on first use."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool({
+                    'host': os.environ.get('SUPABASE_DB_HOST'),
+                    'user': os.environ.get('SUPABASE_DB_USER'),
+                    'password': os.environ.get('SUPABASE_DB_PASSWORD'),
+                    'database': os.environ.get('SUPABASE_DB_NAME'),
+                    'port': int(os.environ.get('SUPABASE_DB_PORT', 5432)),
+                })
+    return _pool
+
+
+def get_replica_pools():
+    """Returns one pool per DSN in SUPABASE_DB_REPLICA_URLS (comma-separated), possibly none."""
+    global _replica_pools
+    if _replica_pools is None:
+        with _pool_lock:
+            if _replica_pools is None:
+                dsns = [dsn.strip() for dsn in DB_REPLICA_URLS.split(',') if dsn.strip()]
+                _replica_pools = [
+                    ConnectionPool({'dsn': dsn, 'options': '-c default_transaction_read_only=on'})
+                    for dsn in dsns
+                ]
+    return _replica_pools
+
+
+_local_writes = {}  # user id -> monotonic deadline, when there is no Redis to share it through
+_local_writes_lock = threading.Lock()
+
+
+def _request_user_id():
+    user = g.get('user')
+    if user is not None:
+        return user.id
+    return session.get('user_id')  # Read only: the cookie is never re-issued for this
+
+
+def _write_key(user_id):
+    return f"db:recent_write:{user_id}"
+
+
+def mark_write():
+    """Records that the current user just wrote, pinning their reads (from any browser or
+    worker) to the primary for DB_READ_YOUR_WRITES_WINDOW seconds."""
+    if not has_request_context():
+        return
+    g._recently_wrote = True
+    user_id = _request_user_id()
+    if user_id is None:
+        return
+    redis_client = getattr(current_app, 'redis', None)
+    if redis_client:
+        try:
+            redis_client.set(_write_key(user_id), 1, px=max(int(DB_READ_YOUR_WRITES_WINDOW * 1000), 1))
+            return
+        except Exception as e:
+            logging.error(f"Error recording write for user {user_id}: {e}")
+    now = time.monotonic()
+    with _local_writes_lock:
+        _local_writes[user_id] = now + DB_READ_YOUR_WRITES_WINDOW
+        if len(_local_writes) > 10000:
+            for expired in [uid for uid, deadline in _local_writes.items() if deadline <= now]:
+                del _local_writes[expired]
+
+
+def recently_wrote():
+    """Whether the current user wrote within DB_READ_YOUR_WRITES_WINDOW. Asked once per request."""
+    if not has_request_context():
+        return False
+    if '_recently_wrote' in g:
+        return g._recently_wrote
+    user_id = _request_user_id()
+    wrote = False
+    if user_id is not None:
+        redis_client = getattr(current_app, 'redis', None)
+        if redis_client:
+            try:
+                wrote = bool(redis_client.exists(_write_key(user_id)))
+            except Exception as e:
+                logging.error(f"Error checking recent writes for user {user_id}: {e}")
+                wrote = True  # Can't tell; the primary is always up to date
+        if not wrote:
+            with _local_writes_lock:
+                wrote = _local_writes.get(user_id, 0) > time.monotonic()
+    g._recently_wrote = wrote
+    return wrote
+
+
+def _checkout_replica():
+    """Checks a connection out of the next healthy replica, round robin. None if all fail."""
+    pools = get_replica_pools()
+    start = next(_replica_turns) % max(len(pools), 1)
+    for offset in range(len(pools)):
+        pool = pools[(start + offset) % len(pools)]
+        try:
+            return PooledConnection(pool.getconn(), pool, request_scoped=has_app_context())
+        except (psycopg2.Error, PoolTimeout) as e:
+            logging.warning(f"Replica unavailable, trying the next one: {e}")
+    return None
+
+
+def get_db_connection(readonly=False):
+    """Returns a pooled connection to the Supabase database.
+
+    Inside an app context the same connection is shared by every caller for the rest
+    of the request and released by release_db_connection(). Outside one (scripts,
+    background threads) the caller owns the connection and close() returns it.
+
+    readonly=True routes to a replica when SUPABASE_DB_REPLICA_URLS is set, unless the
+    request already holds a primary connection or the user wrote within the last
+    DB_READ_YOUR_WRITES_WINDOW seconds. It falls back to the primary if no replica answers.
+    """
+    in_app = has_app_context()
+    if in_app and '_db_conn' in g:
+        return g._db_conn
+
+    if readonly and get_replica_pools() and not recently_wrote():
+        if in_app and '_db_read_conn' in g:
+            return g._db_read_conn
+        conn = _checkout_replica()
+        if conn is not None:
+            if in_app:
+                g._db_read_conn = conn
+            return conn
+
+    try:
+        conn = PooledConnection(get_pool().getconn(), get_pool(), request_scoped=in_app, on_commit=mark_write)
+    except (psycopg2.Error, PoolTimeout) as e:
         print(f"Error connecting to PostgreSQL Database: {e}")
         return None
 
+    if in_app:
+        g._db_conn = conn
+    return conn
+
+
+def release_db_connection(exception=None):
+    """Teardown handler: returns the request's connections to their pools."""
+    for name in ('_db_conn', '_db_read_conn'):
+        conn = g.pop(name, None)
+        if conn is not None:
+            conn.release()
+
+
+def init_app(app):
+    app.teardown_appcontext(release_db_connection)
+
+
 def create_tables():
-    return True
\ No newline at end of file
+    """Brings the schema up to date by applying pending migrations (see utils/migrations.py)."""
+    from utils.migrations import run_migrations  # migrations uses get_db_connection, import lazily
+    try:
+        run_migrations()
+        return True
+    except RuntimeError as e:
+        print(f"Error running migrations: {e}")
+        return False
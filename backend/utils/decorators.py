@@ -1,6 +1,7 @@
 # utils/decorators.py
 from functools import wraps
-from flask import session, jsonify, request
+from flask import session, jsonify, request, g
+from utils.identity import get_current_user
 
 def login_required(f):
     @wraps(f)
@@ -8,5 +9,10 @@ def login_required(f):
         if 'username' not in session:
             print(f"Unauthorized request to {request.path}. Session: {session}")  # LOGGING
             return jsonify({'message': 'Unauthorized'}), 401
+        user = get_current_user()  # Resolved once per request, usually from the identity cache
+        if user is None:
+            print(f"Unknown user for request to {request.path}. Session: {session}")  # LOGGING
+            return jsonify({'message': 'Unauthorized'}), 401
+        g.user = user
         return f(*args, **kwargs)
-    return decorated_function
\ No newline at end of file
+    return decorated_function
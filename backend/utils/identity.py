@@ -0,0 +1,136 @@
+# utils/identity.py
+import os
+import json
+import time
+import logging
+import threading
+from flask import session, current_app
+from models import User
+
+# --- Identity Cache Configuration ---
+IDENTITY_LOCAL_TTL = int(os.environ.get('IDENTITY_LOCAL_TTL', 15))    # Seconds a worker trusts its own copy
+IDENTITY_REDIS_TTL = int(os.environ.get('IDENTITY_REDIS_TTL', 300))   # Seconds the shared copy lives in Redis
+IDENTITY_LOCAL_MAX_ENTRIES = int(os.environ.get('IDENTITY_LOCAL_MAX_ENTRIES', 10000))
+
+_local_cache = {}  # user_id -> (expires_at, identity dict)
+_local_lock = threading.Lock()
+
+
+def _redis_key(user_id):
+    return f"identity:{user_id}"
+
+
+def _to_dict(user):
+    # The password hash never leaves the signin path, so it is not cached.
+    return {
+        'id': user.id,
+        'username': user.username,
+        'email': user.email,
+        'subscription_level': user.subscription_level,
+    }
+
+
+def _from_dict(data):
+    return User(data['id'], data['username'], None, data['email'], data['subscription_level'])
+
+
+def _local_get(user_id):
+    with _local_lock:
+        entry = _local_cache.get(user_id)
+        if entry and entry[0] > time.monotonic():
+            return entry[1]
+        _local_cache.pop(user_id, None)
+    return None
+
+
+def _local_set(user_id, data):
+    with _local_lock:
+        if len(_local_cache) >= IDENTITY_LOCAL_MAX_ENTRIES:
+            now = time.monotonic()
+            for key in [k for k, (expires_at, _) in _local_cache.items() if expires_at <= now]:
+                del _local_cache[key]
+            if len(_local_cache) >= IDENTITY_LOCAL_MAX_ENTRIES:
+                _local_cache.clear()
+        _local_cache[user_id] = (time.monotonic() + IDENTITY_LOCAL_TTL, data)
+
+
+def cache_identity(user):
+    """Stores a freshly loaded user in both cache tiers."""
+    data = _to_dict(user)
+    _local_set(user.id, data)
+    if current_app.redis:
+        try:
+            current_app.redis.setex(_redis_key(user.id), IDENTITY_REDIS_TTL, json.dumps(data))
+        except Exception as e:
+            logging.error(f"Error caching identity for user {user.id}: {e}")
+
+
+def invalidate_identity(user_id):
+    """Drops a user's cached identity, e.g. after their subscription changes."""
+    with _local_lock:
+        _local_cache.pop(user_id, None)
+    if current_app.redis:
+        try:
+            current_app.redis.delete(_redis_key(user_id))
+        except Exception as e:
+            logging.error(f"Error invalidating identity for user {user_id}: {e}")
+
+
+def has_paid_plan(user):
+    """Whether `user` may use paid features.
+
+    A cached free tier is re-read from the primary before refusing: another worker's
+    local copy may predate a payment by up to IDENTITY_LOCAL_TTL seconds, and a replica
+    may still lag behind it. Only that primary read is cached back.
+    """
+    if user.subscription_level and user.subscription_level != 'free':
+        return True
+    fresh = User.get_user_by_id(user.id, readonly=False)
+    if fresh is None:
+        return False
+    cache_identity(fresh)
+    return bool(fresh.subscription_level and fresh.subscription_level != 'free')
+
+
+def load_identity(user_id):
+    """Resolves a user by id: in-process cache, then Redis, then Postgres."""
+    data = _local_get(user_id)
+    if data:
+        return _from_dict(data)
+
+    if current_app.redis:
+        try:
+            cached = current_app.redis.get(_redis_key(user_id))
+            if cached:
+                data = json.loads(cached.decode('utf-8'))
+                _local_set(user_id, data)
+                return _from_dict(data)
+        except Exception as e:
+            logging.error(f"Error retrieving identity from cache: {e}")
+
+    user = User.get_user_by_id(user_id)
+    if user:
+        cache_identity(user)
+    return user
+
+
+def get_current_user():
+    """Returns the signed-in User, or None.
+
+    Sessions created before the user id was stored only carry the username; those are
+    resolved once by name and upgraded so later requests hit the cache.
+    """
+    username = session.get('username')
+    if not username:
+        return None
+
+    user_id = session.get('user_id')
+    if user_id is not None:
+        user = load_identity(user_id)
+        return user if user and user.username == username else None
+
+    user = User.get_user_by_username(username)
+    if user:
+        session['user_id'] = user.id
+        cache_identity(user)
+    return user
@@ -0,0 +1,384 @@
+# utils/jobs.py
+"""Background jobs for work that can happen after the response is sent.
+
+Handlers are registered by name with @job('name') and queued with enqueue('name', *args).
+Arguments must be JSON-serialisable (bytes are allowed). Failed jobs are retried with
+exponential backoff and moved to a dead-letter list after JOB_MAX_ATTEMPTS.
+
+JOB_QUEUE_BACKEND=memory (default) runs jobs on threads inside each web process.
+JOB_QUEUE_BACKEND=redis pushes them to Redis, where `python worker.py` picks them up. A
+worker moves each job onto its own processing list while it runs and removes it only once
+the job has finished, failed over to a retry or been dead-lettered; jobs left behind by a
+worker that died are put back on the queue. If Redis cannot take a job, it runs on the
+in-process threads instead, so work queued after a commit is never lost to a Redis blip.
+"""
+import os
+import json
+import time
+import uuid
+import heapq
+import atexit
+import base64
+import random
+import signal
+import socket
+import logging
+import threading
+from collections import deque
+from redis.exceptions import RedisError
+
+# --- Job Queue Configuration ---
+JOB_QUEUE_BACKEND = os.environ.get('JOB_QUEUE_BACKEND', 'memory')       # 'memory' or 'redis'
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 2))                     # Worker threads per process (memory backend)
+JOB_MAX_ATTEMPTS = int(os.environ.get('JOB_MAX_ATTEMPTS', 5))           # Including the first run
+JOB_BACKOFF = float(os.environ.get('JOB_BACKOFF', 2))                   # Seconds before the first retry, doubling
+JOB_MAX_BACKOFF = float(os.environ.get('JOB_MAX_BACKOFF', 300))
+JOB_POLL_INTERVAL = float(os.environ.get('JOB_POLL_INTERVAL', 1))       # Seconds a worker blocks waiting for work
+JOB_DEAD_LETTER_MAX = int(os.environ.get('JOB_DEAD_LETTER_MAX', 1000))  # Dead jobs kept for inspection
+JOB_WORKER_HEARTBEAT = int(os.environ.get('JOB_WORKER_HEARTBEAT', 30))  # Seconds before a silent worker's jobs are requeued
+
+JOB_QUEUE_KEY = 'jobs:queue'
+JOB_DELAYED_KEY = 'jobs:delayed'    # Sorted set scored by the time the job becomes due
+JOB_DEAD_KEY = 'jobs:dead'
+JOB_PROCESSING_PREFIX = 'jobs:processing:'  # + worker id: jobs that worker is running
+JOB_HEARTBEAT_PREFIX = 'jobs:worker:'        # + worker id: expires when the worker stops refreshing it
+
+_handlers = {}
+_periodic = {}  # name -> interval in seconds, enqueued by the worker
+_queue = None
+
+
+def job(name, every=None):
+    """Registers a handler under `name`. `every` (seconds) also has the workers run it periodically."""
+    def register(func):
+        _handlers[name] = func
+        if every:
+            _periodic[name] = every
+        return func
+    return register
+
+
+def _json_default(value):
+    if isinstance(value, (bytes, bytearray)):
+        return {'__bytes__': base64.b64encode(value).decode('ascii')}
+    raise TypeError(f"Job arguments must be JSON-serialisable, got {type(value).__name__}")
+
+
+def _json_object_hook(value):
+    if len(value) == 1 and '__bytes__' in value:
+        return base64.b64decode(value['__bytes__'])
+    return value
+
+
+def dumps(payload):
+    return json.dumps(payload, default=_json_default)
+
+
+def loads(data):
+    return json.loads(data, object_hook=_json_object_hook)
+
+
+def backoff_delay(attempts, base=JOB_BACKOFF, maximum=JOB_MAX_BACKOFF):
+    """Delay before retry number `attempts` (1-based): exponential, capped, with jitter."""
+    return min(base * 2 ** (attempts - 1), maximum) * random.uniform(0.5, 1.0)
+
+
+class JobQueue:
+    """Queue of pending jobs, held in Redis (shared by every process) or in memory.
+
+    Jobs are dicts: {"id", "name", "args", "kwargs", "attempts", "max_attempts"}.
+    """
+
+    def __init__(self, redis_client=None, max_attempts=JOB_MAX_ATTEMPTS):
+        self.redis = redis_client
+        self.max_attempts = max_attempts
+        self._ready = deque()
+        self._delayed = []   # heap of (due, sequence, job)
+        self._dead = deque(maxlen=JOB_DEAD_LETTER_MAX)
+        self._sequence = 0
+        self._next_periodic = {}
+        self._cond = threading.Condition()
+        self._stopped = threading.Event()
+        self._threads = []
+        self._threads_lock = threading.Lock()
+        self._app = None
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._processing_key = JOB_PROCESSING_PREFIX + self.worker_id
+        self._recovered_at = float('-inf')
+
+    # --- Producing ---
+
+    def enqueue(self, name, *args, delay=0, max_attempts=None, **kwargs):
+        if name not in _handlers:
+            raise KeyError(f"No job handler registered for {name!r}")
+        payload = {
+            'id': uuid.uuid4().hex,
+            'name': name,
+            'args': list(args),
+            'kwargs': kwargs,
+            'attempts': 0,
+            'max_attempts': max_attempts or self.max_attempts,
+        }
+        self._push(payload, delay)
+        return payload['id']
+
+    def _push(self, payload, delay=0):
+        if self.redis is not None:
+            data = dumps(payload)
+            try:
+                if delay > 0:
+                    self.redis.zadd(JOB_DELAYED_KEY, {data: time.time() + delay})
+                else:
+                    self.redis.lpush(JOB_QUEUE_KEY, data)
+                return
+            except RedisError as e:
+                # Callers enqueue after committing; never fail them, run the job here instead
+                logging.error(f"Could not queue job {payload['name']} ({payload['id']}) in Redis, "
+                              f"running it in-process: {e}")
+        self._push_local(payload, delay)
+
+    def _push_local(self, payload, delay=0):
+        # Round-trip through JSON so both backends see the same arguments
+        payload = loads(dumps(payload))
+        with self._cond:
+            if delay > 0:
+                self._sequence += 1
+                heapq.heappush(self._delayed, (time.time() + delay, self._sequence, payload))
+            else:
+                self._ready.append(payload)
+            self._cond.notify()
+        self._ensure_threads()
+
+    # --- Consuming ---
+
+    def _pop(self, timeout):
+        """Returns (job, receipt) or (None, None). With Redis the job stays on this worker's
+        processing list until ack(receipt); in memory the receipt is None."""
+        if self.redis is not None:
+            self._promote_due()
+            if timeout <= 0:
+                data = self.redis.lmove(JOB_QUEUE_KEY, self._processing_key, 'RIGHT', 'LEFT')
+            else:
+                data = self.redis.blmove(JOB_QUEUE_KEY, self._processing_key, max(int(timeout), 1), 'RIGHT', 'LEFT')
+            return (loads(data), data) if data else (None, None)
+        return self._pop_local(timeout), None
+
+    def ack(self, receipt):
+        """Removes a finished job from the processing list (retries and dead letters are already stored)."""
+        if receipt is not None:
+            self.redis.lrem(self._processing_key, 1, receipt)
+
+    def heartbeat(self):
+        self.redis.set(JOB_HEARTBEAT_PREFIX + self.worker_id, 1, ex=JOB_WORKER_HEARTBEAT)
+
+    def recover_stale(self):
+        """Puts the jobs of workers whose heartbeat expired back on the queue. Returns how many."""
+        self._recovered_at = time.time()
+        recovered = 0
+        for key in self.redis.scan_iter(match=JOB_PROCESSING_PREFIX + '*'):
+            key = key.decode('utf-8') if isinstance(key, bytes) else key
+            worker_id = key[len(JOB_PROCESSING_PREFIX):]
+            if worker_id == self.worker_id or self.redis.exists(JOB_HEARTBEAT_PREFIX + worker_id):
+                continue
+            while self.redis.lmove(key, JOB_QUEUE_KEY, 'RIGHT', 'RIGHT') is not None:  # Oldest first, next in line
+                recovered += 1
+        if recovered:
+            logging.warning(f"Requeued {recovered} job(s) left behind by stopped workers")
+        return recovered
+
+    def _pop_local(self, timeout):
+        deadline = time.time() + timeout
+        with self._cond:
+            while True:
+                now = time.time()
+                while self._delayed and self._delayed[0][0] <= now:
+                    self._ready.append(heapq.heappop(self._delayed)[2])
+                if self._ready:
+                    return self._ready.popleft()
+                if now >= deadline or self._stopped.is_set():
+                    return None
+                wait = deadline - now
+                if self._delayed:
+                    wait = min(wait, self._delayed[0][0] - now)
+                self._cond.wait(wait)
+
+    def _promote_due(self):
+        """Moves due retries from the delayed set onto the queue. ZREM decides which worker wins."""
+        for data in self.redis.zrangebyscore(JOB_DELAYED_KEY, 0, time.time(), start=0, num=100):
+            if self.redis.zrem(JOB_DELAYED_KEY, data):
+                self.redis.lpush(JOB_QUEUE_KEY, data)
+
+    def run(self, app, payload):
+        """Runs one job inside an app context, scheduling a retry or dead-lettering it on failure."""
+        payload['attempts'] += 1
+        handler = _handlers.get(payload['name'])
+        try:
+            if handler is None:
+                raise KeyError(f"No job handler registered for {payload['name']!r}")
+            with app.app_context():
+                handler(*payload['args'], **payload['kwargs'])
+            return True
+        except Exception as e:
+            payload['error'] = f"{type(e).__name__}: {e}"
+            if handler is not None and payload['attempts'] < payload['max_attempts']:
+                delay = backoff_delay(payload['attempts'])
+                logging.warning(f"Job {payload['name']} ({payload['id']}) failed on attempt "
+                                f"{payload['attempts']}, retrying in {delay:.1f}s: {e}")
+                self._push(payload, delay)
+            elif payload.get('periodic'):
+                logging.error(f"Periodic job {payload['name']} failed, it runs again next interval: {e}")
+            else:
+                logging.error(f"Job {payload['name']} ({payload['id']}) failed permanently: {e}")
+                self._bury(payload)
+            return False
+
+    def _bury(self, payload):
+        payload['failed_at'] = time.time()
+        if self.redis is not None:
+            try:
+                pipe = self.redis.pipeline()
+                pipe.lpush(JOB_DEAD_KEY, dumps(payload))
+                pipe.ltrim(JOB_DEAD_KEY, 0, JOB_DEAD_LETTER_MAX - 1)
+                pipe.execute()
+                return
+            except RedisError as e:
+                logging.error(f"Could not dead-letter job {payload['id']} in Redis, keeping it in memory: {e}")
+        self._dead.appendleft(payload)
+
+    def dead_letters(self, limit=100):
+        """Most recently dead-lettered jobs first."""
+        if self.redis is not None:
+            return [loads(data) for data in self.redis.lrange(JOB_DEAD_KEY, 0, limit - 1)]
+        return list(self._dead)[:limit]
+
+    def pending(self):
+        """Number of queued jobs, including retries that are not due yet."""
+        if self.redis is not None:
+            return self.redis.llen(JOB_QUEUE_KEY) + self.redis.zcard(JOB_DELAYED_KEY)
+        with self._cond:
+            return len(self._ready) + len(self._delayed)
+
+    def work(self, app, burst=False):
+        """Processes jobs until stop() is called. burst=True returns once nothing is due (handy in tests)."""
+        if self.redis is not None:
+            self.heartbeat()
+            self.recover_stale()
+            if not burst:
+                threading.Thread(target=self._beat, name='jobs-heartbeat', daemon=True).start()
+        while not self._stopped.is_set():
+            if not burst:
+                self._enqueue_periodic()
+                if self.redis is not None and time.time() - self._recovered_at >= JOB_WORKER_HEARTBEAT:
+                    self.recover_stale()
+            payload, receipt = self._pop(0 if burst else JOB_POLL_INTERVAL)
+            if payload is None:
+                if burst:
+                    return
+                continue
+            self.run(app, payload)
+            self.ack(receipt)
+
+    def _beat(self):
+        """Keeps this worker's heartbeat alive, also while a long job runs."""
+        while not self._stopped.wait(max(JOB_WORKER_HEARTBEAT / 3, 0.1)):
+            try:
+                self.heartbeat()
+            except RedisError as e:
+                logging.error(f"Could not refresh worker heartbeat: {e}")
+
+    def _work_local(self, app):
+        """Thread loop for jobs that could not be queued in Redis and run in this process."""
+        while not self._stopped.is_set():
+            payload = self._pop_local(JOB_POLL_INTERVAL)
+            if payload is not None:
+                self.run(app, payload)
+
+    def _enqueue_periodic(self):
+        """Enqueues each periodic job once per interval: across all workers with Redis (SET NX
+        as the lock), per process in memory."""
+        now = time.time()
+        for name, interval in _periodic.items():
+            if self.redis is not None:
+                due = self.redis.set(f"jobs:periodic:{name}", 1, nx=True, ex=int(interval))
+            else:
+                with self._cond:
+                    due = self._next_periodic.get(name, 0) <= now
+                    if due:
+                        self._next_periodic[name] = now + interval
+            if due:
+                self._push({'id': uuid.uuid4().hex, 'name': name, 'args': [], 'kwargs': {},
+                            'attempts': 0, 'max_attempts': 1, 'periodic': True})
+
+    def stop(self):
+        self._stopped.set()
+        with self._cond:
+            self._cond.notify_all()
+
+    # --- In-process workers (memory backend) ---
+
+    def start(self, app):
+        self._app = app
+
+    def _ensure_threads(self):
+        if self._threads or self._app is None:
+            return
+        with self._threads_lock:
+            if not self._threads:  # Started on first use, so forked gunicorn workers get their own
+                target = self.work if self.redis is None else self._work_local
+                for i in range(JOB_WORKERS):
+                    thread = threading.Thread(target=target, args=(self._app,), name=f'jobs-{i}', daemon=True)
+                    thread.start()
+                    self._threads.append(thread)
+
+    def close(self, timeout=5):
+        """Lets in-process workers finish what is ready (up to `timeout` seconds), then stops them."""
+        deadline = time.time() + timeout
+        while self._threads and time.time() < deadline:
+            with self._cond:
+                if not self._ready:
+                    break
+            time.sleep(0.05)
+        self.stop()
+        for thread in self._threads:
+            thread.join(max(deadline - time.time(), 0))
+
+
+def init_app(app):
+    """Creates the process-wide queue. The memory backend runs jobs on threads in this process."""
+    global _queue
+    use_redis = JOB_QUEUE_BACKEND == 'redis' and app.redis is not None
+    if JOB_QUEUE_BACKEND == 'redis' and app.redis is None:
+        logging.warning("JOB_QUEUE_BACKEND=redis but REDIS_URL is not set; running jobs in-process")
+    _queue = JobQueue(app.redis if use_redis else None)
+    _queue.start(app)  # With Redis, the threads only start if a job ever has to fall back to this process
+    atexit.register(_queue.close)
+    app.jobs = _queue
+
+
+def get_queue():
+    return _queue
+
+
+def enqueue(name, *args, **kwargs):
+    """Queues a job. Outside an initialised app (scripts) the handler simply runs inline."""
+    if _queue is None:
+        kwargs.pop('delay', None)
+        kwargs.pop('max_attempts', None)
+        _handlers[name](*args, **kwargs)
+        return None
+    return _queue.enqueue(name, *args, **kwargs)
+
+
+def run_worker(app):
+    """Worker loop for the Redis backend; exits cleanly on SIGTERM/SIGINT."""
+    if _queue is None or _queue.redis is None:
+        raise RuntimeError("The worker needs JOB_QUEUE_BACKEND=redis and REDIS_URL")
+
+    def shutdown(signum, frame):
+        logging.info("Worker shutting down after the current job")
+        _queue.stop()
+
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+    logging.info(f"Worker started with handlers: {', '.join(sorted(_handlers))}")
+    _queue.work(app)
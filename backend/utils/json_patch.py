@@ -0,0 +1,136 @@
+# utils/json_patch.py
+"""Minimal JSON Patch (RFC 6902) and JSON Merge Patch (RFC 7396) support for scene documents."""
+import copy
+
+
+class JsonPatchError(ValueError):
+    """Raised when a patch is malformed or does not apply to the document."""
+
+
+def _parse_pointer(pointer):
+    if pointer == '':
+        return []
+    if not isinstance(pointer, str) or not pointer.startswith('/'):
+        raise JsonPatchError(f"Invalid JSON pointer: {pointer!r}")
+    return [token.replace('~1', '/').replace('~0', '~') for token in pointer[1:].split('/')]
+
+
+def _array_index(container, token, allow_end=False):
+    if allow_end and token == '-':
+        return len(container)
+    if not token.isdigit() or (token != '0' and token.startswith('0')):
+        raise JsonPatchError(f"Invalid array index: {token!r}")
+    index = int(token)
+    if index > len(container) or (index == len(container) and not allow_end):
+        raise JsonPatchError(f"Array index out of range: {index}")
+    return index
+
+
+def _resolve(document, tokens):
+    """Walks every token but the last. Returns (parent container, last token)."""
+    node = document
+    for token in tokens[:-1]:
+        if isinstance(node, list):
+            node = node[_array_index(node, token)]
+        elif isinstance(node, dict):
+            if token not in node:
+                raise JsonPatchError(f"Path not found at {token!r}")
+            node = node[token]
+        else:
+            raise JsonPatchError(f"Cannot descend into a scalar at {token!r}")
+    return node, tokens[-1]
+
+
+def _get(document, pointer):
+    tokens = _parse_pointer(pointer)
+    if not tokens:
+        return document
+    parent, key = _resolve(document, tokens)
+    if isinstance(parent, list):
+        return parent[_array_index(parent, key)]
+    if isinstance(parent, dict) and key in parent:
+        return parent[key]
+    raise JsonPatchError(f"Path not found: {pointer}")
+
+
+def _add(document, pointer, value):
+    tokens = _parse_pointer(pointer)
+    if not tokens:
+        return value
+    parent, key = _resolve(document, tokens)
+    if isinstance(parent, list):
+        parent.insert(_array_index(parent, key, allow_end=True), value)
+    elif isinstance(parent, dict):
+        parent[key] = value
+    else:
+        raise JsonPatchError(f"Cannot add to a scalar: {pointer}")
+    return document
+
+
+def _remove(document, pointer):
+    tokens = _parse_pointer(pointer)
+    if not tokens:
+        raise JsonPatchError("Cannot remove the whole document")
+    parent, key = _resolve(document, tokens)
+    if isinstance(parent, list):
+        return parent.pop(_array_index(parent, key))
+    if isinstance(parent, dict) and key in parent:
+        return parent.pop(key)
+    raise JsonPatchError(f"Path not found: {pointer}")
+
+
+def apply_patch(document, operations):
+    """Applies an RFC 6902 operation list and returns the patched document.
+
+    The document may be modified in place; callers discard it if JsonPatchError is raised.
+    """
+    if not isinstance(operations, list):
+        raise JsonPatchError("A JSON Patch must be a list of operations")
+
+    for operation in operations:
+        if not isinstance(operation, dict) or 'op' not in operation or 'path' not in operation:
+            raise JsonPatchError(f"Malformed operation: {operation!r}")
+        op, path = operation['op'], operation['path']
+
+        if op in ('add', 'replace', 'test') and 'value' not in operation:
+            raise JsonPatchError(f"'{op}' needs a value")
+        if op in ('move', 'copy') and 'from' not in operation:
+            raise JsonPatchError(f"'{op}' needs a from pointer")
+        if not isinstance(path, str) or (op in ('move', 'copy') and not isinstance(operation['from'], str)):
+            raise JsonPatchError(f"Pointers must be strings: {operation!r}")
+
+        if op == 'add':
+            document = _add(document, path, operation['value'])
+        elif op == 'remove':
+            _remove(document, path)
+        elif op == 'replace':
+            if _parse_pointer(path):
+                _get(document, path)  # Target must exist
+                _remove(document, path)
+            document = _add(document, path, operation['value'])
+        elif op == 'move':
+            if path.startswith(operation['from'] + '/'):
+                raise JsonPatchError("Cannot move a value into one of its children")
+            document = _add(document, path, _remove(document, operation['from']))
+        elif op == 'copy':
+            document = _add(document, path, copy.deepcopy(_get(document, operation['from'])))
+        elif op == 'test':
+            if _get(document, path) != operation['value']:
+                raise JsonPatchError(f"Test failed at {path}")
+        else:
+            raise JsonPatchError(f"Unknown operation: {op!r}")
+    return document
+
+
+def apply_merge_patch(target, patch):
+    """Applies an RFC 7396 merge patch and returns the result."""
+    if not isinstance(patch, dict):
+        return copy.deepcopy(patch)
+    if not isinstance(target, dict):
+        target = {}
+    for key, value in patch.items():
+        if value is None:
+            target.pop(key, None)
+        else:
+            target[key] = apply_merge_patch(target.get(key), value)
+    return target
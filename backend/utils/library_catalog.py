@@ -0,0 +1,254 @@
+# utils/library_catalog.py
+"""In-memory index of the model library, served to /library/models without touching Postgres.
+
+Each worker loads library_models once and keeps it as an immutable LibraryCatalog:
+category facets, an inverted index from name tokens to models (searched by prefix, so
+results show up as the user types) and precomputed sort orders that pages are sliced from
+with keyset cursors. Writes bump a version stamp in Redis; every worker re-reads the stamp
+at most every LIBRARY_CATALOG_CHECK_INTERVAL seconds and rebuilds when it moved, and in any
+case after LIBRARY_CATALOG_MAX_AGE seconds (edits made directly in the database). Without
+Redis a write only reaches the worker that made it, so the others reload after the much
+shorter LIBRARY_CATALOG_LOCAL_MAX_AGE instead.
+
+Usage (from backend/):
+    python -m utils.library_catalog invalidate   # bump the version stamp
+"""
+import os
+import re
+import sys
+import time
+import logging
+import threading
+from bisect import bisect_left, bisect_right
+from flask import current_app
+from utils.db import get_db_connection
+from utils.pagination import decode_cursor
+
+# --- Library Catalog Configuration ---
+LIBRARY_CATALOG_CHECK_INTERVAL = float(os.environ.get('LIBRARY_CATALOG_CHECK_INTERVAL', 15))  # Seconds a worker trusts its version stamp
+LIBRARY_CATALOG_MAX_AGE = float(os.environ.get('LIBRARY_CATALOG_MAX_AGE', 3600))              # Seconds before a reload regardless of the stamp
+LIBRARY_CATALOG_LOCAL_MAX_AGE = float(os.environ.get('LIBRARY_CATALOG_LOCAL_MAX_AGE', 15))     # Same, without Redis to carry the stamp
+LIBRARY_SEARCH_MAX_TERMS = 8  # Query words beyond this are ignored
+
+LIBRARY_CATALOG_VERSION_KEY = 'library_catalog:version'
+
+_TOKEN_RE = re.compile(r'[^\W_]+')
+
+# sort name -> (sort key of a model, types of the key's values, which cursors carry)
+SORTS = {
+    'name': (lambda model: ((model['model_name'] or '').casefold(), model['id']), (str, int)),
+    'newest': (lambda model: (-model['id'],), (int,)),
+}
+DEFAULT_SORT = 'name'
+
+_catalog = {'index': None, 'stamp': None, 'loaded_at': float('-inf'), 'checked_at': float('-inf')}
+_catalog_lock = threading.Lock()
+_reload_lock = threading.Lock()
+
+
+def tokenize(text):
+    return _TOKEN_RE.findall(text.casefold())
+
+
+class LibraryCatalog:
+    """Immutable, searchable snapshot of library_models.
+
+    Models are stored in name order, so a model's position is also its rank for the
+    default sort and a set of positions is put in order by sorting the integers.
+    """
+
+    def __init__(self, rows):
+        self.models = sorted(rows, key=SORTS['name'][0])
+        count = len(self.models)
+
+        # sort -> (positions in that order, rank of each position, sort key at each rank)
+        self.orders = {}
+        for sort, (key, _) in SORTS.items():
+            order = sorted(range(count), key=lambda position: key(self.models[position]))
+            rank = [0] * count
+            for index, position in enumerate(order):
+                rank[position] = index
+            self.orders[sort] = (order, rank, [key(self.models[position]) for position in order])
+
+        self.categories = {}
+        postings = {}
+        for position, model in enumerate(self.models):
+            self.categories.setdefault(model['model_category'], []).append(position)
+            for token in set(tokenize(model['model_name'] or '')):
+                postings.setdefault(token, []).append(position)
+        self.tokens = sorted(postings)  # Bisected for prefix matches
+        self.postings = [postings[token] for token in self.tokens]
+        self.category_counts = {category: len(positions) for category, positions in self.categories.items()}
+
+    def __len__(self):
+        return len(self.models)
+
+    def _prefix_matches(self, prefix):
+        """Positions of models with a name token starting with `prefix`."""
+        start = bisect_left(self.tokens, prefix)
+        end = bisect_left(self.tokens, prefix + '\U0010ffff', start)
+        if end - start == 1:
+            return set(self.postings[start])
+        matches = set()
+        for postings in self.postings[start:end]:
+            matches.update(postings)
+        return matches
+
+    def _matching(self, query):
+        """Positions matching every word of `query`, or None for no query (everything)."""
+        terms = sorted(set(tokenize(query or '')[:LIBRARY_SEARCH_MAX_TERMS]), key=len, reverse=True)
+        if not terms:
+            return None
+        matches = None
+        for term in terms:  # Longest (most selective) prefixes first
+            term_matches = self._prefix_matches(term)
+            matches = term_matches if matches is None else matches & term_matches
+            if not matches:
+                return set()
+        return matches
+
+    def search(self, category=None, query=None, sort=DEFAULT_SORT, after=None, limit=None):
+        """Returns (models, total, facets) for one page of results.
+
+        `models` holds at most `limit` models (all of them if None) in `sort` order,
+        starting after the sort key `after`. `total` counts every match and `facets`
+        counts the matches per category, ignoring the category filter.
+        """
+        order, rank, keys = self.orders[sort]
+        matches = self._matching(query)
+
+        if matches is None:
+            facets = self.category_counts
+        else:
+            facets = {}
+            for position in matches:
+                category_name = self.models[position]['model_category']
+                facets[category_name] = facets.get(category_name, 0) + 1
+
+        if category:
+            in_category = self.categories.get(category, [])
+            matches = set(in_category) if matches is None else matches.intersection(in_category)
+
+        start = bisect_right(keys, tuple(after)) if after else 0
+        if matches is None:
+            total = len(self.models)
+            page = order[start:] if limit is None else order[start:start + limit]
+        else:
+            total = len(matches)
+            if len(matches) * 8 < len(self.models):  # Few matches: sort them instead of scanning the order
+                ranked = sorted(rank[position] for position in matches)
+                ranked = ranked[bisect_left(ranked, start):]
+                page = [order[index] for index in (ranked if limit is None else ranked[:limit])]
+            else:
+                page = []
+                for position in order[start:]:
+                    if position in matches:
+                        page.append(position)
+                        if limit is not None and len(page) == limit:
+                            break
+        return [self.models[position] for position in page], total, facets
+
+    def cursor_key(self, sort, model):
+        return list(SORTS[sort][0](model))
+
+
+def parse_cursor(sort, cursor):
+    """Unpacks a cursor made from cursor_key for `sort`. Raises ValueError if it does not fit."""
+    types = SORTS[sort][1]
+    return decode_cursor(cursor, len(types), types)
+
+
+def _load():
+    conn = get_db_connection()  # The primary: a reload right after a write must see it
+    if conn is None:
+        raise RuntimeError("Database connection failed")
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT * FROM library_models")
+            column_names = [desc[0] for desc in cursor.description]
+            return [dict(zip(column_names, row)) for row in cursor.fetchall()]
+    finally:
+        conn.close()
+
+
+def _current_stamp():
+    redis_client = current_app.redis
+    if not redis_client:
+        return None
+    try:
+        return int(redis_client.get(LIBRARY_CATALOG_VERSION_KEY) or 0)
+    except Exception as e:
+        logging.error(f"Error reading library catalog version: {e}")
+        return _catalog['stamp']
+
+
+def get_catalog():
+    """The worker's catalog, (re)loaded when the version stamp moved or it is too old.
+
+    One thread reloads while the others keep serving the previous snapshot; only the very
+    first load makes callers wait.
+    """
+    now = time.monotonic()
+    with _catalog_lock:
+        index, stamp = _catalog['index'], _catalog['stamp']
+        check = now - _catalog['checked_at'] >= LIBRARY_CATALOG_CHECK_INTERVAL
+        if check:
+            _catalog['checked_at'] = now  # Other threads keep using the catalog while this one asks
+    if check:
+        latest = _current_stamp()
+        max_age = LIBRARY_CATALOG_MAX_AGE if current_app.redis else LIBRARY_CATALOG_LOCAL_MAX_AGE
+        stale = index is None or latest != stamp or now - _catalog['loaded_at'] >= max_age
+    else:
+        stale = index is None
+    if not stale:
+        return index
+
+    if not _reload_lock.acquire(blocking=index is None):
+        return index  # Another thread is reloading; serve the old snapshot meanwhile
+    try:
+        if _catalog['index'] is not index:
+            return _catalog['index']  # Reloaded while we waited for the lock
+        stamp = _current_stamp()  # Read first: a write landing during the load moves it again
+        started = time.monotonic()
+        try:
+            index = LibraryCatalog(_load())
+        except Exception as e:
+            if _catalog['index'] is None:
+                raise
+            logging.error(f"Error reloading library catalog, serving the previous one: {e}")
+            return _catalog['index']
+        with _catalog_lock:
+            _catalog.update(index=index, stamp=stamp, loaded_at=started)
+        logging.info(f"Loaded library catalog: {len(index)} models in {time.monotonic() - started:.2f}s")
+        return index
+    finally:
+        _reload_lock.release()
+
+
+def invalidate(redis_client=None):
+    """Makes every worker reload the catalog (this one on its next request, the others
+    within LIBRARY_CATALOG_CHECK_INTERVAL)."""
+    with _catalog_lock:
+        _catalog['checked_at'] = float('-inf')
+        _catalog['loaded_at'] = float('-inf')
+    redis_client = redis_client if redis_client is not None else current_app.redis
+    if redis_client:
+        return redis_client.incr(LIBRARY_CATALOG_VERSION_KEY)
+    return None
+
+
+def main(argv):
+    if len(argv) < 2 or argv[1] != 'invalidate':
+        print(__doc__)
+        return 2
+    import redis
+    redis_url = os.environ.get('REDIS_URL')
+    if not redis_url:
+        print("REDIS_URL is not set; nothing to invalidate")
+        return 1
+    print(f"Library catalog version is now {invalidate(redis.Redis.from_url(redis_url))}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -0,0 +1,67 @@
+# utils/lru.py
+import time
+import threading
+from collections import OrderedDict
+
+
+class ByteLRU:
+    """Thread-safe LRU bounded by the total size of its values, not their count, with a TTL.
+
+    Callers pass each value's size, so one large entry evicts as many small ones as it
+    takes to fit instead of counting as a single slot.
+    """
+
+    def __init__(self, max_bytes, ttl, max_entry_bytes=None):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.max_entry_bytes = min(max_entry_bytes or max_bytes, max_bytes)
+        self._entries = OrderedDict()  # key -> (expires_at, size, value), least recently used first
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[2]
+            if entry is not None:
+                self._remove(key)
+            self.misses += 1
+            return None
+
+    def put(self, key, value, size):
+        """Stores `value`, evicting the least recently used entries to make room.
+        Returns False (and stores nothing) if it is larger than max_entry_bytes."""
+        if size > self.max_entry_bytes:
+            return False
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + self.ttl, size, value)
+            self._size += size
+            while self._size > self.max_bytes:
+                _, (_, evicted_size, _) = self._entries.popitem(last=False)
+                self._size -= evicted_size
+        return True
+
+    def discard(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def _remove(self, key):
+        self._size -= self._entries.pop(key)[1]
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'bytes': self._size, 'maxBytes': self.max_bytes,
+                    'hits': self.hits, 'misses': self.misses}
@@ -0,0 +1,170 @@
+# utils/migrations.py
+"""Versioned schema migrations and a query-plan check for the hot paths.
+
+Usage (from backend/):
+    python -m utils.migrations migrate   # apply pending migrations/NNNN_name.sql files
+    python -m utils.migrations status    # list applied and pending migrations
+    python -m utils.migrations check     # EXPLAIN hot queries, fail on seq scans of large tables
+"""
+import os
+import sys
+import json
+import psycopg2
+from pathlib import Path
+from utils.db import get_db_connection
+from utils import queries
+
+MIGRATIONS_DIR = Path(__file__).resolve().parent.parent / 'migrations'
+MIGRATION_LOCK_ID = 4173301  # pg_advisory_lock key, so two deploys never migrate at once
+SEQ_SCAN_ROW_THRESHOLD = int(os.environ.get('SEQ_SCAN_ROW_THRESHOLD', 10000))
+
+# (name, query, sample parameters) for every query on a request path that must stay indexed.
+HOT_QUERIES = [
+    ("User.get_user_by_username", queries.USER_BY_USERNAME, ('sample',)),
+    ("User.get_user_by_id", queries.USER_BY_ID, (1,)),
+    ("Subscription.get_subscription_by_user_id", queries.LATEST_SUBSCRIPTION, (1,)),
+    ("payment.get_subscription", queries.SUBSCRIPTION_END_DATE, (1,)),
+    ("Scene.list_rows / scene.get_user_scenes", queries.USER_SCENES, (1,)),
+    ("scene_index.refresh", queries.USER_SCENES_BY_ID, (1, [1, 2])),
+    ("scene.get_user_scenes", queries.USER_SCENES_PAGE, (1, 51)),
+    ("scene.get_user_scenes (next page)", queries.USER_SCENES_PAGE_AFTER, (1, '2024-01-01T00:00:00', 1, 51)),
+    ("scene.get_scene", queries.OWNED_SCENE, (1, 1)),
+    ("scene.commit_scene_upload", queries.OWNED_SCENE_FOR_UPLOAD, (1, 1)),
+    ("scene._delete_scenes", queries.OWNED_SCENES_FOR_DELETE, ([1, 2], 1)),
+    ("scene.list_scene_versions", queries.SCENE_VERSIONS_PAGE, (1, 2 ** 31 - 1, 51)),
+    ("SceneVersion.get", queries.SCENE_VERSION, (1, 1)),
+    ("Texture.sync_scene (stored textures)", queries.STORED_TEXTURES, (['0' * 64],)),
+    ("Texture.sync_scene (scene textures)", queries.SCENE_TEXTURE_HASHES, (1,)),
+    ("Texture.release_scenes", queries.RELEASE_SCENE_TEXTURES, ([1, 2],)),
+    ("UserLog.iter_logs_by_user_id", *queries.user_logs(1, limit=51)),
+]
+
+
+def discover_migrations():
+    """Returns [(version, name, path)] for every migrations/NNNN_name.sql file, in order."""
+    migrations = []
+    for path in sorted(MIGRATIONS_DIR.glob('*.sql')):
+        version, _, name = path.stem.partition('_')
+        if not version.isdigit():
+            raise ValueError(f"Migration file {path.name} must start with a numeric version")
+        migrations.append((version, name, path))
+    return migrations
+
+
+def _ensure_migrations_table(conn):
+    with conn.cursor() as cursor:
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                version TEXT PRIMARY KEY,
+                name TEXT NOT NULL,
+                applied_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+            )
+        """)
+    conn.commit()
+
+
+def applied_versions(conn):
+    _ensure_migrations_table(conn)
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT version FROM schema_migrations")
+        return {row[0] for row in cursor.fetchall()}
+
+
+def run_migrations():
+    """Applies pending migrations, each in its own transaction. Returns the versions applied."""
+    conn = get_db_connection()
+    if conn is None:
+        raise RuntimeError("Database connection failed")
+
+    applied = []
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT pg_advisory_lock(%s)", (MIGRATION_LOCK_ID,))
+        done = applied_versions(conn)
+        for version, name, path in discover_migrations():
+            if version in done:
+                continue
+            print(f"Applying migration {version}_{name}")
+            try:
+                with conn.cursor() as cursor:
+                    cursor.execute(path.read_text())
+                    cursor.execute("INSERT INTO schema_migrations (version, name) VALUES (%s, %s)", (version, name))
+                conn.commit()
+            except psycopg2.Error as e:
+                conn.rollback()
+                raise RuntimeError(f"Migration {version}_{name} failed: {e}") from e
+            applied.append(version)
+        return applied
+    finally:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT pg_advisory_unlock(%s)", (MIGRATION_LOCK_ID,))
+        conn.commit()
+        conn.close()
+
+
+def _seq_scans(plan):
+    """Yields the relation name of every Seq Scan node in an EXPLAIN (FORMAT JSON) plan tree."""
+    if plan.get('Node Type') == 'Seq Scan':
+        yield plan.get('Relation Name')
+    for child in plan.get('Plans', []):
+        yield from _seq_scans(child)
+
+
+def check_query_plans(row_threshold=SEQ_SCAN_ROW_THRESHOLD):
+    """EXPLAINs every HOT_QUERIES entry. Returns [(query name, table, estimated rows)] for each
+    sequential scan over a table whose planner estimate is at least `row_threshold` rows."""
+    conn = get_db_connection()
+    if conn is None:
+        raise RuntimeError("Database connection failed")
+
+    problems = []
+    try:
+        with conn.cursor() as cursor:
+            for name, query, params in HOT_QUERIES:
+                cursor.execute("EXPLAIN (FORMAT JSON) " + query, params)
+                plan = cursor.fetchone()[0]
+                if isinstance(plan, str):
+                    plan = json.loads(plan)
+                for table in set(_seq_scans(plan[0]['Plan'])):
+                    cursor.execute("SELECT reltuples::BIGINT FROM pg_class WHERE oid = to_regclass(%s)", (table,))
+                    row = cursor.fetchone()
+                    estimated_rows = row[0] if row else 0
+                    if estimated_rows >= row_threshold:
+                        problems.append((name, table, estimated_rows))
+        conn.rollback()
+        return problems
+    finally:
+        conn.close()
+
+
+def main(argv):
+    command = argv[1] if len(argv) > 1 else 'migrate'
+    if command == 'migrate':
+        applied = run_migrations()
+        print(f"Applied {len(applied)} migration(s)" if applied else "Database is up to date")
+        return 0
+    if command == 'status':
+        conn = get_db_connection()
+        if conn is None:
+            print("Database connection failed")
+            return 1
+        try:
+            done = applied_versions(conn)
+        finally:
+            conn.close()
+        for version, name, _ in discover_migrations():
+            print(f"[{'x' if version in done else ' '}] {version}_{name}")
+        return 0
+    if command == 'check':
+        problems = check_query_plans()
+        for name, table, rows in problems:
+            print(f"FAIL {name}: sequential scan on {table} (~{rows} rows)")
+        if not problems:
+            print(f"OK: no sequential scans on tables with >= {SEQ_SCAN_ROW_THRESHOLD} rows")
+        return 1 if problems else 0
+    print(__doc__)
+    return 2
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -0,0 +1,38 @@
+# utils/pagination.py
+import json
+import base64
+import binascii
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+def encode_cursor(*values):
+    """Packs the sort key of the last row on a page into an opaque, URL-safe cursor."""
+    raw = json.dumps(list(values), default=str, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor, size, types=None):
+    """Unpacks a cursor made by encode_cursor. Raises ValueError if it was tampered with.
+
+    `types` optionally gives the expected type of each value (bools never pass for int).
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')).decode('utf-8'))
+    except (binascii.Error, UnicodeError, ValueError) as e:
+        raise ValueError(f"Invalid cursor: {e}")
+    if not isinstance(values, list) or len(values) != size:
+        raise ValueError("Invalid cursor")
+    if types and not all(isinstance(value, value_type) and not isinstance(value, bool)
+                         for value, value_type in zip(values, types)):
+        raise ValueError("Invalid cursor")
+    return values
+
+
+def parse_limit(value, default=DEFAULT_PAGE_SIZE, maximum=MAX_PAGE_SIZE):
+    """Parses a `limit` query parameter, clamped to [1, maximum]. Raises ValueError if not a number."""
+    if value is None or value == '':
+        return default
+    return max(1, min(int(value), maximum))
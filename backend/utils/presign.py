@@ -0,0 +1,110 @@
+# utils/presign.py
+"""Stable, time-bucketed SigV4 presigned GET URLs.
+
+boto3 signs every URL with the current second, so listing the same thumbnails twice yields
+different URLs and browsers and CDNs never get a cache hit. Here the signing time is
+rounded down to a PRESIGN_WINDOW_SECONDS boundary and the URL lives for the window plus
+the requested lifetime: within a window the same key always gets the same URL, and each
+URL is still valid for at least `expires_in` seconds after it was handed out. The derived
+SigV4 signing key depends only on the secret, the day and the region, so it is computed
+once per day instead of once per URL.
+"""
+import os
+import hmac
+import time
+import hashlib
+import threading
+from datetime import datetime, timezone
+from urllib.parse import quote, urlsplit
+
+PRESIGN_WINDOW_SECONDS = int(os.environ.get('PRESIGN_WINDOW_SECONDS', 3600))  # URLs are reused for up to this long
+PRESIGN_MAX_EXPIRES = 7 * 24 * 3600  # SigV4 limit on X-Amz-Expires
+
+_ALGORITHM = 'AWS4-HMAC-SHA256'
+_signing_keys = {}  # (secret, date, region, service) -> derived key
+_signing_keys_lock = threading.Lock()
+
+
+def signing_window(expires_in, now=None, window=PRESIGN_WINDOW_SECONDS):
+    """Returns (signed_at, lifetime): the start of the current window and a lifetime that
+    keeps the URL valid for `expires_in` seconds from `now`. The window never exceeds
+    `expires_in`, so short-lived URLs stay short-lived."""
+    now = int(time.time() if now is None else now)
+    window = max(min(window, expires_in), 1)
+    signed_at = now - now % window
+    return signed_at, min(expires_in + window, PRESIGN_MAX_EXPIRES)
+
+
+def _hmac(key, message):
+    return hmac.new(key, message.encode('utf-8'), hashlib.sha256).digest()
+
+
+def signing_key(secret_key, date, region, service='s3'):
+    cache_key = (secret_key, date, region, service)
+    key = _signing_keys.get(cache_key)
+    if key is None:
+        key = _hmac(_hmac(_hmac(_hmac(f"AWS4{secret_key}".encode('utf-8'), date), region), service), 'aws4_request')
+        with _signing_keys_lock:
+            if len(_signing_keys) > 64:  # Old days and rotated secrets
+                _signing_keys.clear()
+            _signing_keys[cache_key] = key
+    return key
+
+
+def _encode(value, safe='-_.~'):
+    return quote(value, safe=safe)
+
+
+class S3Presigner:
+    """Signs GET URLs for one bucket on an S3-compatible endpoint.
+
+    `endpoint_url` None means AWS itself (virtual-hosted style, as boto3 does);
+    custom endpoints (R2, Supabase) use path style.
+    """
+
+    def __init__(self, bucket, region, endpoint_url=None):
+        self.bucket = bucket
+        self.region = region or 'us-east-1'
+        if endpoint_url:
+            parts = urlsplit(endpoint_url)
+            self.scheme, self.host = parts.scheme or 'https', parts.netloc
+            self.path_prefix = f"{parts.path.rstrip('/')}/{_encode(bucket)}"
+        elif '.' not in bucket:
+            self.scheme, self.host, self.path_prefix = 'https', f"{bucket}.s3.{self.region}.amazonaws.com", ''
+        else:  # Dotted bucket names break TLS on virtual hosts
+            self.scheme, self.host = 'https', f"s3.{self.region}.amazonaws.com"
+            self.path_prefix = f"/{_encode(bucket)}"
+
+    def sign_many(self, keys, credentials, signed_at, lifetime):
+        """Returns {key: url} for GETs of `keys`, all signed at `signed_at` (epoch seconds)."""
+        access_key, secret_key, token = credentials
+        stamp = datetime.fromtimestamp(signed_at, timezone.utc)
+        amz_date = stamp.strftime('%Y%m%dT%H%M%SZ')
+        date = amz_date[:8]
+        scope = f"{date}/{self.region}/s3/aws4_request"
+        key = signing_key(secret_key, date, self.region)
+
+        params = {
+            'X-Amz-Algorithm': _ALGORITHM,
+            'X-Amz-Credential': f"{access_key}/{scope}",
+            'X-Amz-Date': amz_date,
+            'X-Amz-Expires': str(lifetime),
+            'X-Amz-SignedHeaders': 'host',
+        }
+        if token:
+            params['X-Amz-Security-Token'] = token
+        query = '&'.join(f"{_encode(name)}={_encode(value)}" for name, value in sorted(params.items()))
+        base = f"{self.scheme}://{self.host}"
+        headers_block = f"host:{self.host}\n\nhost\nUNSIGNED-PAYLOAD"
+
+        urls = {}
+        for object_key in keys:
+            if object_key in urls:
+                continue
+            path = f"{self.path_prefix}/{_encode(object_key, safe='-_.~/')}"
+            canonical_request = f"GET\n{path}\n{query}\n{headers_block}"
+            string_to_sign = '\n'.join([_ALGORITHM, amz_date, scope,
+                                        hashlib.sha256(canonical_request.encode('utf-8')).hexdigest()])
+            signature = hmac.new(key, string_to_sign.encode('utf-8'), hashlib.sha256).hexdigest()
+            urls[object_key] = f"{base}{path}?{query}&X-Amz-Signature={signature}"
+        return urls
@@ -0,0 +1,124 @@
+# utils/queries.py
+"""SQL of the hot request paths, shared by the models/routes that run it and by
+utils/migrations.py, which EXPLAINs the very same strings to catch missing indexes."""
+
+USER_BY_USERNAME = """
+    SELECT u.*, s.subscription_level
+    FROM users u
+    LEFT JOIN subscriptions s ON u.id = s.user_id
+    WHERE u.username = %s
+    ORDER BY s.start_date DESC
+    LIMIT 1
+"""
+
+USER_BY_ID = """
+    SELECT u.*, s.subscription_level
+    FROM users u
+    LEFT JOIN subscriptions s ON u.id = s.user_id
+    WHERE u.id = %s
+    ORDER BY s.start_date DESC
+    LIMIT 1
+"""
+
+LATEST_SUBSCRIPTION = """
+    SELECT *
+    FROM subscriptions
+    WHERE user_id = %s
+    ORDER BY start_date DESC
+    LIMIT 1
+"""
+
+SUBSCRIPTION_END_DATE = """
+    SELECT subscription_level, end_date
+    FROM subscriptions
+    WHERE user_id = %s
+    ORDER BY end_date DESC
+    LIMIT 1
+"""
+
+# Listing rows: (scene_id, scene_name, updated_at, image_url, variants), newest first
+_SCENE_LISTING = """
+    SELECT s.scene_id, s.scene_name, s.updated_at, st.image_url, st.variants
+    FROM Scenes s
+    LEFT JOIN scene_thumbnails st ON s.scene_id = st.scene_id
+"""
+USER_SCENES = _SCENE_LISTING + """
+    WHERE s.user_id = %s
+    ORDER BY s.updated_at DESC, s.scene_id DESC
+"""
+USER_SCENES_BY_ID = _SCENE_LISTING + """
+    WHERE s.user_id = %s AND s.scene_id = ANY(%s)
+    ORDER BY s.updated_at DESC, s.scene_id DESC
+"""
+USER_SCENES_PAGE = USER_SCENES + "LIMIT %s"
+USER_SCENES_PAGE_AFTER = _SCENE_LISTING + """
+    WHERE s.user_id = %s AND (s.updated_at, s.scene_id) < (%s, %s)
+    ORDER BY s.updated_at DESC, s.scene_id DESC
+    LIMIT %s
+"""
+
+OWNED_SCENE = "SELECT s3_key, scene_name, version FROM Scenes WHERE scene_id = %s AND user_id = %s"
+
+OWNED_SCENE_FOR_UPLOAD = """
+    SELECT s.s3_key, st.image_url
+    FROM Scenes s
+    LEFT JOIN scene_thumbnails st ON s.scene_id = st.scene_id
+    WHERE s.scene_id = %s AND s.user_id = %s
+    FOR UPDATE OF s
+"""
+
+OWNED_SCENES_FOR_DELETE = """
+    SELECT s.scene_id, s.s3_key, st.image_url, st.variants
+    FROM Scenes s
+    LEFT JOIN scene_thumbnails st ON s.scene_id = st.scene_id
+    WHERE s.scene_id = ANY(%s) AND s.user_id = %s
+    FOR UPDATE OF s
+"""
+
+SCENE_VERSIONS_PAGE = """
+    SELECT version, scene_name, created_at, byte_size, new_bytes, restored_from, chunk_hashes IS NOT NULL
+    FROM scene_versions
+    WHERE scene_id = %s AND version < %s
+    ORDER BY version DESC
+    LIMIT %s
+"""
+
+SCENE_VERSION = """
+    SELECT chunk_hashes, texture_hashes, scene_name FROM scene_versions
+    WHERE scene_id = %s AND version = %s
+"""
+
+STORED_TEXTURES = "SELECT hash FROM textures WHERE hash = ANY(%s)"
+
+SCENE_TEXTURE_HASHES = "SELECT texture_hash FROM scene_textures WHERE scene_id = %s"
+
+RELEASE_SCENE_TEXTURES = """
+    WITH released AS (
+        DELETE FROM scene_textures WHERE scene_id = ANY(%s) RETURNING texture_hash
+    )
+    UPDATE textures t
+    SET ref_count = t.ref_count - r.n
+    FROM (SELECT texture_hash, COUNT(*) AS n FROM released GROUP BY texture_hash) r
+    WHERE t.hash = r.texture_hash
+    RETURNING t.hash, t.ref_count
+"""
+
+
+def user_logs(user_id, since=None, until=None, before=None, limit=None):
+    """(query, params) for a user's logs newest first; `before` is a (timestamp, log_id) keyset bound."""
+    query = "SELECT log_id, user_id, activity, timestamp FROM user_logs WHERE user_id = %s"
+    params = [user_id]
+    if since is not None:
+        query += " AND timestamp >= %s"
+        params.append(since)
+    if until is not None:
+        query += " AND timestamp < %s"
+        params.append(until)
+    if before is not None:
+        query += " AND (timestamp, log_id) < (%s, %s)"
+        params.extend(before)
+    query += " ORDER BY timestamp DESC, log_id DESC"
+    if limit is not None:
+        query += " LIMIT %s"
+        params.append(limit)
+    return query, params
@@ -0,0 +1,142 @@
+# utils/scene_history.py
+"""Scene version history with chunk-level deduplication.
+
+Every save records a scene_versions row on its own transaction; a background job then
+splits the document into content-defined chunks (utils/chunking.py) and stores each chunk
+once, by hash, in the 'scenes' storage. Successive versions share every chunk an edit did
+not touch, so history grows with the size of the edits rather than the size of the scene.
+"""
+import os
+import hashlib
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from utils.db import get_db_connection
+from utils.storage import get_storage, ObjectNotFound
+from utils.textures import delete_texture_objects
+from utils.compression import gzip_bytes, gunzip_bytes
+from utils.chunking import split
+from utils import jobs
+
+SCENE_HISTORY_MAX_VERSIONS = int(os.environ.get('SCENE_HISTORY_MAX_VERSIONS', 50))  # Per scene, 0 keeps every version
+SCENE_CHUNK_WORKERS = int(os.environ.get('SCENE_CHUNK_WORKERS', 8))                # Concurrent chunk uploads/fetches
+
+
+def chunk_key(chunk_hash):
+    return f"chunks/{chunk_hash[:2]}/{chunk_hash}.gz"
+
+
+def _document_bytes(data, s3_key):
+    """The uncompressed scene JSON, from the gzipped bytes a save passed along or from storage."""
+    if data is not None:
+        return gunzip_bytes(data)
+    obj = get_storage('scenes').get(s3_key)
+    try:
+        raw = obj.read()
+    finally:
+        obj.close()
+    return gunzip_bytes(raw) if obj.content_encoding == 'gzip' else raw
+
+
+def _upload_chunk(item):
+    chunk_hash, data = item
+    get_storage('scenes').put(chunk_key(chunk_hash), data, content_type='application/octet-stream',
+                              cache_control='private, max-age=31536000, immutable')
+
+
+def _fetch_chunk(chunk_hash):
+    obj = get_storage('scenes').get(chunk_key(chunk_hash))
+    try:
+        data = gunzip_bytes(obj.read())
+    finally:
+        obj.close()
+    if hashlib.sha256(data).hexdigest() != chunk_hash:
+        raise ValueError(f"Chunk {chunk_hash} is corrupt")
+    return data
+
+
+@jobs.job('scenes.record_version')
+def record_version(scene_id, version, data=None, s3_key=None):
+    """Chunks a pending version and stores the chunks storage has not seen yet, then prunes
+    versions beyond SCENE_HISTORY_MAX_VERSIONS. `data` is the gzipped document; without
+    it the document is read from `s3_key`. Returns True if the version was recorded."""
+    from models import SceneVersion  # models imports this module for chunk_key, import lazily
+
+    try:
+        raw = _document_bytes(data, s3_key)
+    except ObjectNotFound:
+        # A direct upload that a later commit already replaced and deleted
+        logging.warning(f"Scene {scene_id} v{version} is no longer in storage, discarding it")
+        discard_version(scene_id, version)
+        return False
+    chunks = split(raw)
+    compressed = {chunk_hash: gzip_bytes(chunk) for chunk_hash, chunk in chunks}
+
+    conn = get_db_connection()
+    if conn is None:
+        raise RuntimeError("Database connection failed")
+    try:
+        with conn.cursor() as cursor:
+            created = SceneVersion.record_chunks(
+                cursor, scene_id, version,
+                [(chunk_hash, len(chunk), len(compressed[chunk_hash])) for chunk_hash, chunk in chunks],
+                len(raw))
+            if created is None:
+                conn.rollback()
+                return False
+
+            if created:
+                with ThreadPoolExecutor(max_workers=min(SCENE_CHUNK_WORKERS, len(created))) as pool:
+                    list(pool.map(_upload_chunk, [(chunk_hash, compressed[chunk_hash]) for chunk_hash in created]))
+
+            orphaned_chunks = orphaned_textures = []
+            if SCENE_HISTORY_MAX_VERSIONS:
+                orphaned_chunks, orphaned_textures = SceneVersion.prune(cursor, scene_id, SCENE_HISTORY_MAX_VERSIONS)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    delete_chunk_objects(orphaned_chunks)
+    delete_texture_objects(orphaned_textures)
+
+    logging.info(f"Recorded scene {scene_id} v{version}: {len(chunks)} chunks, {len(created)} new")
+    return True
+
+
+def discard_version(scene_id, version):
+    """Deletes a pending version whose document is gone, releasing its texture references."""
+    from models import SceneVersion
+
+    conn = get_db_connection()
+    if conn is None:
+        raise RuntimeError("Database connection failed")
+    try:
+        with conn.cursor() as cursor:
+            orphaned_chunks, orphaned_textures = SceneVersion.discard(cursor, scene_id, version)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    delete_chunk_objects(orphaned_chunks)
+    delete_texture_objects(orphaned_textures)
+
+
+def load_version(chunk_hashes):
+    """Reassembles a recorded version's document bytes, fetching its chunks concurrently."""
+    distinct = list(dict.fromkeys(chunk_hashes))
+    if not distinct:
+        return b''
+    with ThreadPoolExecutor(max_workers=min(SCENE_CHUNK_WORKERS, len(distinct))) as pool:
+        chunks = dict(zip(distinct, pool.map(_fetch_chunk, distinct)))
+    return b''.join(chunks[chunk_hash] for chunk_hash in chunk_hashes)
+
+
+def delete_chunk_objects(blobs):
+    """Queues removal of chunks no version references any more, given as the (hash, key)
+    list SceneVersion's release methods return. Call after the deleting transaction has
+    committed, like utils.textures.delete_texture_objects."""
+    if blobs:
+        jobs.enqueue('storage.delete_blobs', 'chunk', [list(blob) for blob in blobs], 'scenes')
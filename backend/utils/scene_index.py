@@ -0,0 +1,219 @@
+# utils/scene_index.py
+"""Write-through index of each user's scenes in Redis, backing the /scenes listing.
+
+scene_index:<user_id> is a sorted set of scene ids scored by updated_at (epoch
+microseconds) and scene_meta:<scene_id> a hash of what the listing shows. Saves, patches,
+restores, thumbnail jobs and deletes rewrite only the scenes they touched, so the list is
+never thrown away and rebuilt from Postgres after an edit. Relative times and thumbnail
+URLs are rendered per request from the stored timestamp and key, so they never go stale.
+
+A built index holds a sentinel member. A set created by a write-through for a user who
+was never indexed (or whose index expired) has none, and the next read rebuilds it.
+"""
+import os
+import json
+import logging
+from datetime import datetime, timedelta, timezone
+from flask import current_app
+from redis.exceptions import WatchError
+from utils.db import get_db_connection
+from models import Scene
+
+SCENE_INDEX_TTL = int(os.environ.get('SCENE_INDEX_TTL', 7 * 24 * 3600))  # Seconds an index lives after its last write
+
+_BUILT = '*'  # Sentinel member, scored below every scene
+_EPOCH = datetime(1970, 1, 1)
+
+
+def _index_key(user_id):
+    return f"scene_index:{user_id}"
+
+
+def _generation_key(user_id):
+    return f"scene_index:{user_id}:generation"  # Bumped by every write-through, watched by builds
+
+
+def _meta_key(scene_id):
+    return f"scene_meta:{scene_id}"
+
+
+def score(updated_at):
+    """updated_at as integer epoch microseconds. Naive timestamps are ordered as stored, like Postgres does."""
+    if updated_at.tzinfo is not None:
+        updated_at = updated_at.astimezone(timezone.utc).replace(tzinfo=None)
+    return (updated_at - _EPOCH) // timedelta(microseconds=1)
+
+
+def _write(pipe, user_id, rows):
+    index_key = _index_key(user_id)
+    for scene_id, scene_name, updated_at, image_url, variants in rows:
+        pipe.zadd(index_key, {scene_id: score(updated_at)})
+        pipe.hset(_meta_key(scene_id), mapping={
+            'scene_name': scene_name,
+            'updated_at': updated_at.isoformat(),
+            'image_url': image_url or '',
+            'variants': json.dumps(variants) if variants else '',
+        })
+        pipe.expire(_meta_key(scene_id), SCENE_INDEX_TTL)
+    pipe.expire(index_key, SCENE_INDEX_TTL)
+
+
+def _row(scene_id, meta):
+    variants = meta[b'variants']
+    return (scene_id, meta[b'scene_name'].decode('utf-8'),
+            datetime.fromisoformat(meta[b'updated_at'].decode('ascii')),
+            meta[b'image_url'].decode('utf-8') or None,
+            json.loads(variants) if variants else None)
+
+
+def refresh(user_id, scene_ids):
+    """Writes the current rows of `scene_ids` through to the index; ids that no longer
+    exist are removed. Call after the change is committed. Never raises."""
+    redis_client = current_app.redis
+    if not redis_client or not scene_ids:
+        return
+    try:
+        conn = get_db_connection()  # The primary: a replica may not have the commit yet
+        if conn is None:
+            raise RuntimeError("Database connection failed")
+        try:
+            with conn.cursor() as cursor:
+                rows = Scene.list_rows(cursor, user_id, scene_ids)
+        finally:
+            conn.close()
+
+        found = {row[0] for row in rows}
+        pipe = redis_client.pipeline()
+        _write(pipe, user_id, rows)
+        gone = [scene_id for scene_id in scene_ids if scene_id not in found]
+        if gone:
+            pipe.zrem(_index_key(user_id), *gone)
+            pipe.delete(*[_meta_key(scene_id) for scene_id in gone])
+        pipe.incr(_generation_key(user_id))
+        pipe.expire(_generation_key(user_id), SCENE_INDEX_TTL)
+        pipe.execute()
+    except Exception as e:
+        logging.error(f"Error updating scene index for user {user_id}: {e}")
+        drop(user_id)
+
+
+def remove(user_id, scene_ids):
+    """Takes deleted scenes out of the index. Never raises."""
+    redis_client = current_app.redis
+    if not redis_client or not scene_ids:
+        return
+    try:
+        pipe = redis_client.pipeline()
+        pipe.zrem(_index_key(user_id), *scene_ids)
+        pipe.delete(*[_meta_key(scene_id) for scene_id in scene_ids])
+        pipe.incr(_generation_key(user_id))
+        pipe.expire(_generation_key(user_id), SCENE_INDEX_TTL)
+        pipe.execute()
+    except Exception as e:
+        logging.error(f"Error removing scenes from index for user {user_id}: {e}")
+        drop(user_id)
+
+
+def drop(user_id):
+    """Forgets a user's index so the next read rebuilds it (the fallback when a write-through fails)."""
+    try:
+        current_app.redis.delete(_index_key(user_id))
+    except Exception as e:
+        logging.error(f"Error dropping scene index for user {user_id}: {e}")
+
+
+def list_scenes(user_id, after=None, limit=None):
+    """The user's scenes as (scene_id, scene_name, updated_at, image_url, variants) rows,
+    newest first: all of them, or at most `limit` following the (updated_at ISO string,
+    scene_id) key `after`, exactly as the keyset query on Postgres would return them.
+    Builds the index if it is missing. Returns None if Redis is not configured or fails."""
+    redis_client = current_app.redis
+    if not redis_client:
+        return None
+    try:
+        rows = _read(redis_client, user_id, after, limit)
+        if rows is None:
+            rows = _build(redis_client, user_id, after, limit)
+        return rows
+    except Exception as e:
+        logging.error(f"Error reading scene index for user {user_id}: {e}")
+        return None
+
+
+def _read(redis_client, user_id, after, limit):
+    """Rows from a built index, or None if it has to be (re)built."""
+    index_key = _index_key(user_id)
+    num = None if limit is None else limit + 1  # One extra shows whether the last timestamp was cut off
+    pipe = redis_client.pipeline(transaction=False)
+    pipe.zscore(index_key, _BUILT)
+    if after:
+        after_score, after_id = score(datetime.fromisoformat(after[0])), after[1]
+        pipe.zrangebyscore(index_key, after_score, after_score)  # Same timestamp, ordered by id below
+        max_score = f"({after_score}"
+    else:
+        max_score = '+inf'
+    if num is None:
+        pipe.zrevrangebyscore(index_key, max_score, 0, withscores=True)
+    else:
+        pipe.zrevrangebyscore(index_key, max_score, 0, start=0, num=num, withscores=True)
+    results = pipe.execute()
+    if results[0] is None:
+        return None
+
+    # Redis orders equal scores by member bytes, not by id; sorting restores Postgres' order
+    fetched = [(int(member), int(member_score)) for member, member_score in results[-1]]
+    entries = []
+    if after:
+        entries = [(int(member), after_score) for member in results[1] if int(member) < after_id]
+    entries += fetched
+    entries.sort(key=lambda entry: (entry[1], entry[0]), reverse=True)
+    if num is not None:
+        if len(fetched) == num and entries[limit - 1][1] == fetched[-1][1]:
+            # Scenes sharing the last returned timestamp may not all have been fetched; rare
+            last_score = fetched[-1][1]
+            group = redis_client.zrangebyscore(index_key, last_score, last_score)
+            entries = [entry for entry in entries if entry[1] != last_score]
+            entries += [(int(member), last_score) for member in group]
+            entries.sort(key=lambda entry: (entry[1], entry[0]), reverse=True)
+        entries = entries[:limit]
+
+    pipe = redis_client.pipeline(transaction=False)
+    for scene_id, _ in entries:
+        pipe.hgetall(_meta_key(scene_id))
+    metas = pipe.execute()
+    if not all(metas):
+        return None  # Expired before the index itself; rebuild
+    return [_row(scene_id, meta) for (scene_id, _), meta in zip(entries, metas)]
+
+
+def _build(redis_client, user_id, after, limit):
+    """Loads every scene of the user from Postgres into the index and returns the requested rows.
+
+    A write-through that lands while the rows are being read bumps the generation key, the
+    MULTI is discarded and the next read builds again instead of storing a stale list.
+    """
+    with redis_client.pipeline() as pipe:
+        pipe.watch(_generation_key(user_id))
+        conn = get_db_connection()  # The primary: written-through scenes must be in what we load
+        if conn is None:
+            raise RuntimeError("Database connection failed")
+        try:
+            with conn.cursor() as cursor:
+                rows = Scene.list_rows(cursor, user_id)
+        finally:
+            conn.close()
+
+        pipe.multi()
+        pipe.delete(_index_key(user_id))
+        _write(pipe, user_id, rows)
+        pipe.zadd(_index_key(user_id), {_BUILT: -1})
+        try:
+            pipe.execute()
+            logging.info(f"Built scene index for user {user_id} ({len(rows)} scenes)")
+        except WatchError:
+            logging.info(f"Scene index for user {user_id} changed while building, not stored")
+
+    if after:
+        key = (score(datetime.fromisoformat(after[0])), after[1])
+        rows = [row for row in rows if (score(row[2]), row[0]) < key]
+    return rows if limit is None else rows[:limit]
@@ -0,0 +1,537 @@
+# utils/storage.py
+"""Object storage behind one interface, so routes never talk to boto3 directly.
+
+Three named storages exist: 'scenes' (scene documents and textures, AWS S3), 'media'
+(thumbnails, library models and tutorials, Cloudflare R2) and 'community' (community
+examples, Supabase Storage). STORAGE_BACKEND=local (or STORAGE_BACKEND_<NAME>=local for one
+of them) keeps them under STORAGE_LOCAL_ROOT instead, for single-node deployments and
+offline benchmarks:
+
+    python -m utils.storage bench [--size BYTES] [--count N]   # put/get/delete latency per backend
+"""
+import os
+import sys
+import hmac
+import json
+import mmap
+import time
+import struct
+import hashlib
+import tempfile
+import threading
+from abc import ABC, abstractmethod
+from pathlib import Path
+from urllib.parse import quote, urlencode
+from botocore.exceptions import BotoCoreError, ClientError
+from flask import current_app, has_app_context, has_request_context, url_for
+from utils.storage_clients import get_client, get_credentials
+from utils.presign import S3Presigner, signing_window
+
+# --- Storage Configuration ---
+STORAGE_BACKEND = os.environ.get('STORAGE_BACKEND', 's3')   # 's3' or 'local'
+STORAGE_LOCAL_ROOT = os.environ.get('STORAGE_LOCAL_ROOT', str(Path(__file__).resolve().parent.parent / 'storage_data'))
+STORAGE_SIGNING_KEY = os.environ.get('STORAGE_SIGNING_KEY')  # Local presigned URLs; defaults to the app's SECRET_KEY
+STORAGE_CHUNK_SIZE = 64 * 1024
+
+# name -> (storage_clients name, bucket env var, supports S3 POST policies)
+STORAGES = {
+    'scenes': ('s3', 'S3_BUCKET_NAME', True),
+    'media': ('r2', 'CLOUDFLARE_BUCKET_NAME', False),        # R2 has no POST policies
+    'community': ('supabase', 'SUPABASE_BUCKET_NAME', False),
+}
+
+
+class StorageError(Exception):
+    """A storage operation failed."""
+
+
+class ObjectNotFound(StorageError):
+    """The requested key does not exist."""
+
+
+class StoredObject:
+    """An object's metadata and, when returned by get(), its body.
+
+    The body is read with read() or iter_chunks(); close() releases the underlying
+    connection or file mapping and must be called once the body is no longer needed.
+    """
+
+    def __init__(self, key, content_length, content_type=None, content_encoding=None,
+                 metadata=None, etag=None, cache_control=None, body=None):
+        self.key = key
+        self.content_length = content_length
+        self.content_type = content_type
+        self.content_encoding = content_encoding
+        self.metadata = metadata or {}
+        self.etag = etag
+        self.cache_control = cache_control
+        self.body = body
+
+    def read(self):
+        return self.body.read()
+
+    def iter_chunks(self, chunk_size=STORAGE_CHUNK_SIZE):
+        return self.body.iter_chunks(chunk_size=chunk_size)
+
+    def close(self):
+        if self.body is not None:
+            self.body.close()
+
+
+class StorageBackend(ABC):
+    """Interface every storage implements. Keys are '/'-separated relative paths."""
+
+    name = None
+
+    @abstractmethod
+    def put(self, key, data, content_type='application/octet-stream', content_encoding=None,
+            metadata=None, cache_control=None):
+        """Stores `data` (bytes or a binary file object) under `key`. Returns the ETag."""
+
+    @abstractmethod
+    def get(self, key):
+        """Returns a StoredObject with a body. Raises ObjectNotFound."""
+
+    @abstractmethod
+    def head(self, key):
+        """Returns a StoredObject without a body, or None if the key does not exist."""
+
+    @abstractmethod
+    def delete(self, key):
+        """Deletes `key`; deleting a missing key is not an error."""
+
+    def delete_many(self, keys):
+        """Deletes `keys`. Returns [(key, error)] for the ones that failed."""
+        failures = []
+        for key in keys:
+            try:
+                self.delete(key)
+            except StorageError as e:
+                failures.append((key, e))
+        return failures
+
+    @abstractmethod
+    def copy(self, source_key, dest_key):
+        """Copies `source_key` to `dest_key` within the storage. Raises ObjectNotFound."""
+
+    @abstractmethod
+    def presign(self, key, method='GET', expires_in=3600, content_type=None):
+        """Returns a URL that allows `method` on `key` without credentials until it expires."""
+
+    def presign_many(self, keys, expires_in=3600):
+        """Returns {key: GET url} for listings. URLs are stable within a signing window
+        (utils/presign.py), so browsers and CDNs can cache what they point at."""
+        return {key: self.presign(key, expires_in=expires_in) for key in dict.fromkeys(keys)}
+
+    def presign_upload(self, key, content_type, max_bytes, expires_in=900, content_encoding=None):
+        """Returns an upload target {"method", "url", and "fields" (POST) or "headers" (PUT)}."""
+        headers = {'Content-Type': content_type}
+        if content_encoding:
+            headers['Content-Encoding'] = content_encoding
+        return {'method': 'PUT', 'url': self.presign(key, 'PUT', expires_in, content_type), 'headers': headers}
+
+    def stream(self, key, chunk_size=STORAGE_CHUNK_SIZE):
+        """Yields the object's bytes chunk by chunk, closing it afterwards."""
+        obj = self.get(key)
+        try:
+            yield from obj.iter_chunks(chunk_size)
+        finally:
+            obj.close()
+
+
+class S3Backend(StorageBackend):
+    """Any S3-compatible bucket, through the shared client from utils/storage_clients.py."""
+
+    def __init__(self, name, client_name, bucket, post_policies=False):
+        self.name = name
+        self.client_name = client_name
+        self.bucket = bucket
+        self.post_policies = post_policies
+        self._presigner = None
+
+    @property
+    def client(self):
+        if not self.bucket:
+            raise StorageError(f"No bucket configured for the '{self.name}' storage")
+        return get_client(self.client_name)
+
+    @staticmethod
+    def _not_found(error):
+        # BotoCoreError (timeouts, connection failures) carries no response
+        return getattr(error, 'response', {}).get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound')
+
+    def put(self, key, data, content_type='application/octet-stream', content_encoding=None,
+            metadata=None, cache_control=None):
+        params = {'Bucket': self.bucket, 'Key': key, 'Body': data, 'ContentType': content_type}
+        if content_encoding:
+            params['ContentEncoding'] = content_encoding
+        if metadata:
+            params['Metadata'] = metadata
+        if cache_control:
+            params['CacheControl'] = cache_control
+        try:
+            return self.client.put_object(**params).get('ETag', '').strip('"')
+        except (ClientError, BotoCoreError) as e:
+            raise StorageError(f"put {self.name}/{key} failed: {e}") from e
+
+    def _object(self, key, response, body=None):
+        return StoredObject(
+            key, response.get('ContentLength'),
+            content_type=response.get('ContentType'),
+            content_encoding=response.get('ContentEncoding'),
+            metadata=response.get('Metadata'),
+            etag=response.get('ETag', '').strip('"') or None,
+            cache_control=response.get('CacheControl'),
+            body=body,
+        )
+
+    def get(self, key):
+        try:
+            response = self.client.get_object(Bucket=self.bucket, Key=key)
+        except (ClientError, BotoCoreError) as e:
+            if self._not_found(e):
+                raise ObjectNotFound(f"{self.name}/{key}") from e
+            raise StorageError(f"get {self.name}/{key} failed: {e}") from e
+        return self._object(key, response, response['Body'])
+
+    def head(self, key):
+        try:
+            return self._object(key, self.client.head_object(Bucket=self.bucket, Key=key))
+        except (ClientError, BotoCoreError) as e:
+            if self._not_found(e):
+                return None
+            raise StorageError(f"head {self.name}/{key} failed: {e}") from e
+
+    def delete(self, key):
+        try:
+            self.client.delete_object(Bucket=self.bucket, Key=key)
+        except (ClientError, BotoCoreError) as e:
+            raise StorageError(f"delete {self.name}/{key} failed: {e}") from e
+
+    def delete_many(self, keys):
+        failures = []
+        keys = list(keys)
+        for i in range(0, len(keys), 1000):  # DeleteObjects accepts at most 1000 keys
+            batch = keys[i:i + 1000]
+            try:
+                response = self.client.delete_objects(
+                    Bucket=self.bucket,
+                    Delete={'Objects': [{'Key': key} for key in batch], 'Quiet': True}
+                )
+            except (ClientError, BotoCoreError, StorageError) as e:
+                failures.extend((key, e) for key in batch)
+                continue
+            failures.extend((error['Key'], f"{error.get('Code')}: {error.get('Message')}")
+                            for error in response.get('Errors', []))
+        return failures
+
+    def copy(self, source_key, dest_key):
+        try:
+            self.client.copy_object(Bucket=self.bucket, Key=dest_key,
+                                    CopySource={'Bucket': self.bucket, 'Key': source_key})
+        except (ClientError, BotoCoreError) as e:
+            if self._not_found(e):
+                raise ObjectNotFound(f"{self.name}/{source_key}") from e
+            raise StorageError(f"copy {self.name}/{source_key} failed: {e}") from e
+
+    def presign(self, key, method='GET', expires_in=3600, content_type=None):
+        params = {'Bucket': self.bucket, 'Key': key}
+        if method == 'PUT' and content_type:
+            params['ContentType'] = content_type
+        operation = {'GET': 'get_object', 'PUT': 'put_object'}[method]
+        try:
+            return self.client.generate_presigned_url(operation, Params=params, ExpiresIn=expires_in)
+        except (ClientError, BotoCoreError) as e:
+            raise StorageError(f"presign {self.name}/{key} failed: {e}") from e
+
+    def presign_many(self, keys, expires_in=3600):
+        if self._presigner is None:
+            meta = self.client.meta
+            custom_endpoint = meta.endpoint_url if 'amazonaws.com' not in meta.endpoint_url else None
+            self._presigner = S3Presigner(self.bucket, meta.region_name, custom_endpoint)
+        signed_at, lifetime = signing_window(expires_in)
+        try:
+            return self._presigner.sign_many(keys, get_credentials(self.client_name), signed_at, lifetime)
+        except (ClientError, BotoCoreError) as e:
+            raise StorageError(f"presign {self.name} ({len(keys)} keys) failed: {e}") from e
+
+    def presign_upload(self, key, content_type, max_bytes, expires_in=900, content_encoding=None):
+        if not self.post_policies:
+            return super().presign_upload(key, content_type, max_bytes, expires_in, content_encoding)
+        # POST policies let S3 itself enforce the size limit and content type
+        fields = {'Content-Type': content_type}
+        if content_encoding:
+            fields['Content-Encoding'] = content_encoding
+        conditions = [{name: value} for name, value in fields.items()]
+        conditions.append(['content-length-range', 1, max_bytes])
+        try:
+            target = self.client.generate_presigned_post(self.bucket, key, Fields=fields,
+                                                         Conditions=conditions, ExpiresIn=expires_in)
+        except (ClientError, BotoCoreError) as e:
+            raise StorageError(f"presign {self.name}/{key} failed: {e}") from e
+        return {'method': 'POST', 'url': target['url'], 'fields': target['fields']}
+
+
+class _MappedBody:
+    """Body of a local object: a read-only mmap of the file, sliced without copying."""
+
+    def __init__(self, file, mapped, offset):
+        self._file = file
+        self._map = mapped
+        self._view = memoryview(mapped)[offset:] if mapped is not None else memoryview(b'')
+        self._position = 0
+
+    def read(self, amount=None):
+        end = len(self._view) if amount is None else min(self._position + amount, len(self._view))
+        data = self._view[self._position:end].tobytes()
+        self._position = end
+        return data
+
+    def iter_chunks(self, chunk_size=STORAGE_CHUNK_SIZE):
+        while self._position < len(self._view):
+            yield self.read(chunk_size)
+
+    def close(self):
+        self._view.release()
+        if self._map is not None:
+            self._map.close()
+        self._file.close()
+
+
+class LocalBackend(StorageBackend):
+    """Objects as files under `root`.
+
+    Each file holds a small JSON header (content type, encoding, metadata, ETag) followed by
+    the body, so one os.replace() publishes data and metadata together: readers see either
+    the old object or the new one, never a mix. Reads mmap the file instead of copying it.
+    Presigned URLs point at routes/storage_routes.py and are HMAC-signed.
+    """
+
+    _MAGIC = b'ARTX'
+    _PREFIX = struct.Struct('>4sI')  # magic, header length
+
+    def __init__(self, name, root, signing_key=None):
+        self.name = name
+        self.root = Path(root) / name
+        self.signing_key = signing_key
+
+    def _path(self, key):
+        parts = key.split('/')
+        if not key or key.startswith('/') or any(part in ('', '.', '..') for part in parts):
+            raise StorageError(f"Invalid key: {key!r}")
+        return self.root.joinpath(*parts)
+
+    def _write(self, path, header, data):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        header_bytes = json.dumps(header).encode('utf-8')
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(self._PREFIX.pack(self._MAGIC, len(header_bytes)))
+                f.write(header_bytes)
+                f.write(data)
+            os.replace(tmp_path, path)  # Atomic on POSIX and Windows
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
+
+    def _read_header(self, f):
+        magic, length = self._PREFIX.unpack(f.read(self._PREFIX.size))
+        if magic != self._MAGIC:
+            raise StorageError("Not a storage object file")
+        return json.loads(f.read(length)), self._PREFIX.size + length
+
+    def put(self, key, data, content_type='application/octet-stream', content_encoding=None,
+            metadata=None, cache_control=None):
+        if not isinstance(data, (bytes, bytearray, memoryview)):
+            data = data.read()
+        etag = hashlib.md5(data).hexdigest()
+        header = {'content_type': content_type, 'content_encoding': content_encoding,
+                  'metadata': metadata or {}, 'cache_control': cache_control, 'etag': etag}
+        try:
+            self._write(self._path(key), header, data)
+        except OSError as e:
+            raise StorageError(f"put {self.name}/{key} failed: {e}") from e
+        return etag
+
+    def _object(self, key, header, length, body=None):
+        return StoredObject(key, length, content_type=header['content_type'],
+                            content_encoding=header['content_encoding'], metadata=header['metadata'],
+                            etag=header['etag'], cache_control=header['cache_control'], body=body)
+
+    def get(self, key):
+        try:
+            f = open(self._path(key), 'rb')
+        except FileNotFoundError as e:
+            raise ObjectNotFound(f"{self.name}/{key}") from e
+        except OSError as e:
+            raise StorageError(f"get {self.name}/{key} failed: {e}") from e
+        try:
+            header, offset = self._read_header(f)
+            size = os.fstat(f.fileno()).st_size
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size > offset else None
+        except Exception:
+            f.close()
+            raise
+        return self._object(key, header, size - offset, _MappedBody(f, mapped, offset))
+
+    def head(self, key):
+        try:
+            with open(self._path(key), 'rb') as f:
+                header, offset = self._read_header(f)
+                return self._object(key, header, os.fstat(f.fileno()).st_size - offset)
+        except FileNotFoundError:
+            return None
+        except OSError as e:
+            raise StorageError(f"head {self.name}/{key} failed: {e}") from e
+
+    def delete(self, key):
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            raise StorageError(f"delete {self.name}/{key} failed: {e}") from e
+
+    def copy(self, source_key, dest_key):
+        obj = self.get(source_key)
+        try:
+            self.put(dest_key, obj.read(), obj.content_type, obj.content_encoding, obj.metadata, obj.cache_control)
+        finally:
+            obj.close()
+
+    # --- Presigned URLs (served by routes/storage_routes.py) ---
+
+    def _key_bytes(self):
+        key = self.signing_key or (current_app.secret_key if has_app_context() else None)
+        if not key:
+            raise StorageError("STORAGE_SIGNING_KEY or the app SECRET_KEY is needed to presign local URLs")
+        return key.encode('utf-8') if isinstance(key, str) else key
+
+    def _signature(self, method, key, expires, content_type, max_bytes, content_encoding=None):
+        message = '\n'.join([method, self.name, key, str(expires), content_type or '', str(max_bytes or ''),
+                             content_encoding or ''])
+        return hmac.new(self._key_bytes(), message.encode('utf-8'), hashlib.sha256).hexdigest()
+
+    def _signed_url(self, key, method, expires_in, content_type=None, max_bytes=None, expires=None,
+                    content_encoding=None):
+        params = {'method': method, 'expires': expires or int(time.time()) + expires_in}
+        if content_type:
+            params['ct'] = content_type
+        if max_bytes:
+            params['max'] = max_bytes
+        if content_encoding:
+            params['ce'] = content_encoding
+        params['sig'] = self._signature(method, key, params['expires'], content_type, max_bytes, content_encoding)
+        if has_request_context():
+            return url_for('storage.local_object', name=self.name, key=key, _external=True, **params)
+        return f"/storage/{self.name}/{quote(key)}?{urlencode(params)}"
+
+    def presign(self, key, method='GET', expires_in=3600, content_type=None):
+        return self._signed_url(key, method, expires_in, content_type if method == 'PUT' else None)
+
+    def presign_many(self, keys, expires_in=3600):
+        signed_at, lifetime = signing_window(expires_in)
+        return {key: self._signed_url(key, 'GET', expires_in, expires=signed_at + lifetime) for key in dict.fromkeys(keys)}
+
+    def presign_upload(self, key, content_type, max_bytes, expires_in=900, content_encoding=None):
+        headers = {'Content-Type': content_type}
+        if content_encoding:
+            headers['Content-Encoding'] = content_encoding
+        return {'method': 'PUT', 'headers': headers,
+                'url': self._signed_url(key, 'PUT', expires_in, content_type, max_bytes,
+                                        content_encoding=content_encoding)}
+
+    def verify(self, method, key, args):
+        """Checks a presigned request. Returns its limits {"content_type", "max_bytes",
+        "content_encoding"} or None."""
+        try:
+            expires = int(args.get('expires', 0))
+            max_bytes = int(args['max']) if args.get('max') else None
+        except ValueError:
+            return None
+        if args.get('method') != method or expires < time.time():
+            return None
+        expected = self._signature(method, key, expires, args.get('ct'), max_bytes, args.get('ce'))
+        if not hmac.compare_digest(expected, args.get('sig', '')):
+            return None
+        return {'content_type': args.get('ct'), 'max_bytes': max_bytes, 'content_encoding': args.get('ce')}
+
+
+_storages = {}
+_storages_lock = threading.Lock()
+
+
+def _build(name):
+    client_name, bucket_env, post_policies = STORAGES[name]
+    backend = os.environ.get(f'STORAGE_BACKEND_{name.upper()}', STORAGE_BACKEND)
+    if backend == 'local':
+        return LocalBackend(name, STORAGE_LOCAL_ROOT, STORAGE_SIGNING_KEY)
+    if backend == 's3':
+        return S3Backend(name, client_name, os.environ.get(bucket_env), post_policies)
+    raise ValueError(f"Unknown storage backend {backend!r} for '{name}'")
+
+
+def get_storage(name):
+    """Returns the process-wide backend for 'scenes', 'media' or 'community'."""
+    storage = _storages.get(name)
+    if storage is None:
+        with _storages_lock:
+            storage = _storages.get(name)
+            if storage is None:
+                storage = _storages[name] = _build(name)
+    return storage
+
+
+def _percentile(samples, fraction):
+    samples = sorted(samples)
+    return samples[min(int(len(samples) * fraction), len(samples) - 1)] * 1000
+
+
+def bench(storage, size=256 * 1024, count=20):
+    """Times put/get/head/delete round trips. Returns {op: (p50 ms, p95 ms)}."""
+    payload = os.urandom(size)
+    timings = {'put': [], 'get': [], 'head': [], 'delete': []}
+    for i in range(count):
+        key = f"bench/{os.getpid()}-{i}.bin"
+        for op, call in (('put', lambda: storage.put(key, payload)),
+                         ('get', lambda: _drain(storage.get(key))),
+                         ('head', lambda: storage.head(key)),
+                         ('delete', lambda: storage.delete(key))):
+            start = time.perf_counter()
+            call()
+            timings[op].append(time.perf_counter() - start)
+    return {op: (_percentile(samples, 0.5), _percentile(samples, 0.95)) for op, samples in timings.items()}
+
+
+def _drain(obj):
+    try:
+        for _ in obj.iter_chunks():
+            pass
+    finally:
+        obj.close()
+
+
+def main(argv):
+    if len(argv) < 2 or argv[1] != 'bench':
+        print(__doc__)
+        return 2
+    args = dict(zip(argv[2::2], argv[3::2]))
+    size, count = int(args.get('--size', 256 * 1024)), int(args.get('--count', 20))
+    for name in STORAGES:
+        storage = get_storage(name)
+        try:
+            results = bench(storage, size, count)
+        except Exception as e:
+            print(f"{name} ({type(storage).__name__}): skipped, {e}")
+            continue
+        summary = ', '.join(f"{op} p50={p50:.1f}ms p95={p95:.1f}ms" for op, (p50, p95) in results.items())
+        print(f"{name} ({type(storage).__name__}, {size} bytes x {count}): {summary}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
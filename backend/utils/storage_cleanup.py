@@ -0,0 +1,193 @@
+# utils/storage_cleanup.py
+"""Batched, concurrent object deletes with a retry queue for the ones that fail.
+
+Job workers sweep the retry queue every STORAGE_DELETE_RETRY_INTERVAL seconds; to run a sweep by hand (from backend/):
+    python -m utils.storage_cleanup   # retry due entries in pending_storage_deletes
+"""
+import os
+import sys
+import logging
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from utils.db import get_db_connection
+from utils.storage import get_storage
+from utils import jobs
+
+DELETE_BATCH_SIZE = 1000  # Keys per delete_many() call (the S3 DeleteObjects limit)
+STORAGE_DELETE_WORKERS = int(os.environ.get('STORAGE_DELETE_WORKERS', 8))              # Concurrent DeleteObjects calls
+STORAGE_DELETE_MAX_ATTEMPTS = int(os.environ.get('STORAGE_DELETE_MAX_ATTEMPTS', 10))    # Queued retries before giving up
+STORAGE_DELETE_BACKOFF = float(os.environ.get('STORAGE_DELETE_BACKOFF', 60))           # Seconds before the first retry, doubling
+STORAGE_DELETE_MAX_BACKOFF = float(os.environ.get('STORAGE_DELETE_MAX_BACKOFF', 6 * 3600))
+STORAGE_DELETE_RETRY_INTERVAL = int(os.environ.get('STORAGE_DELETE_RETRY_INTERVAL', 300))  # Seconds between queue sweeps by the job workers
+
+
+# pending_storage_deletes rows written before utils/storage.py named the storages
+_LEGACY_STORES = {'s3': 'scenes', 'r2': 'media', 'supabase': 'community'}
+
+
+def _delete_batch(store, keys):
+    """One delete_many() call. Returns [(store, key, error)] for keys that were not deleted."""
+    try:
+        return [(store, key, error) for key, error in get_storage(store).delete_many(keys)]
+    except Exception as e:
+        return [(store, key, e) for key in keys]
+
+
+def delete_objects(targets):
+    """Deletes (storage name, key) targets, grouped per storage into batches that run
+    concurrently. Returns the failures as [(storage name, key, error)].
+
+    Legacy (store, bucket, key) targets, as queued before the storages were named, are
+    accepted too; their store ('s3', 'r2', 'supabase') is mapped to the storage name.
+    """
+    grouped = defaultdict(list)
+    for target in targets:
+        store, key = target[0], target[-1]
+        if key:
+            grouped[_LEGACY_STORES.get(store, store)].append(key)
+
+    batches = [(store, keys[i:i + DELETE_BATCH_SIZE])
+               for store, keys in grouped.items()
+               for i in range(0, len(keys), DELETE_BATCH_SIZE)]
+    if not batches:
+        return []
+    if len(batches) == 1:
+        return _delete_batch(*batches[0])
+
+    failures = []
+    with ThreadPoolExecutor(max_workers=min(STORAGE_DELETE_WORKERS, len(batches))) as pool:
+        for batch_failures in pool.map(lambda batch: _delete_batch(*batch), batches):
+            failures.extend(batch_failures)
+    return failures
+
+
+def queue_failed_deletes(failures):
+    """Records failed deletes in pending_storage_deletes so retry_pending_deletes() picks them up."""
+    if not failures:
+        return
+    from models import PendingStorageDelete  # models imports utils.textures, import lazily
+
+    for store, key, error in failures:
+        logging.error(f"Failed to delete {store}/{key}, queued for retry: {error}")
+    conn = get_db_connection()
+    if conn is None:
+        logging.error(f"Database connection failed, {len(failures)} storage object(s) left orphaned")
+        return
+    try:
+        with conn.cursor() as cursor:
+            PendingStorageDelete.queue(cursor, [
+                (store, getattr(get_storage(store), 'bucket', None) or store, key, error)
+                for store, key, error in failures
+            ])
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        logging.error(f"Failed to queue {len(failures)} storage delete(s): {e}")
+    finally:
+        conn.close()
+
+
+@jobs.job('storage.delete_objects')
+def delete_or_queue(targets):
+    """Deletes (storage name, key) targets now and queues whatever fails. Returns the failure count.
+
+    Only use this for keys whose rows are already gone (committed). Keys a scene or thumbnail
+    row points at again by the time the job runs (scene keys are derived from names, so a
+    later save can reuse them) are kept, the same check retry_pending_deletes() makes.
+    """
+    from models import PendingStorageDelete
+
+    targets = [tuple(target) for target in targets]
+    conn = get_db_connection()
+    if conn is None:
+        raise RuntimeError("Database connection failed")  # Never delete without checking
+    try:
+        with conn.cursor() as cursor:
+            live = PendingStorageDelete.live_keys(cursor, {target[-1] for target in targets if target[-1]})
+        conn.rollback()
+    finally:
+        conn.close()
+    if live:
+        logging.info(f"Keeping {len(live)} object(s) whose keys were reused: {sorted(live)[:5]}")
+
+    failures = delete_objects(target for target in targets if target[-1] not in live)
+    queue_failed_deletes(failures)
+    return len(failures)
+
+
+@jobs.job('storage.delete_blobs')
+def delete_blobs(kind, blobs, store='scenes'):
+    """Deletes content-addressed objects ([hash, key] of `kind`, 'texture' or 'chunk', kept
+    in the `store` storage) whose rows were deleted by a committed transaction.
+
+    Each hash's ContentBlob lock is held while deleting, so a save that re-created the row
+    in the meantime either already committed (the row exists again and the object is kept)
+    or waits until the object is gone and then uploads it again. Raises if any delete
+    failed, so the job is retried.
+    """
+    from models import ContentBlob
+
+    keys = dict(blobs)
+    if not keys:
+        return 0
+    conn = get_db_connection()
+    if conn is None:
+        raise RuntimeError("Database connection failed")
+    try:
+        with conn.cursor() as cursor:
+            ContentBlob.lock(cursor, keys)
+            for reused in ContentBlob.existing(cursor, kind, keys):
+                del keys[reused]
+            failures = delete_objects((store, key) for key in keys.values())
+        conn.commit()  # Releases the locks
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    if failures:
+        raise RuntimeError(f"Failed to delete {len(failures)} of {len(keys)} {kind} object(s): {failures[0][2]}")
+    return len(keys)
+
+
+@jobs.job('storage.retry_pending_deletes', every=STORAGE_DELETE_RETRY_INTERVAL)
+def retry_pending_deletes(limit=DELETE_BATCH_SIZE):
+    """Retries due queued deletes once. Returns (deleted, still failing)."""
+    from models import PendingStorageDelete
+
+    conn = get_db_connection()
+    if conn is None:
+        raise RuntimeError("Database connection failed")
+    try:
+        with conn.cursor() as cursor:
+            rows = PendingStorageDelete.claim_due(cursor, limit, STORAGE_DELETE_MAX_ATTEMPTS)
+            ids_by_target = {}
+            skipped = []
+            for row_id, store, _, key, live in rows:
+                if live:
+                    skipped.append(row_id)  # The key was reused by a newer scene; keep the object
+                else:
+                    ids_by_target[(_LEGACY_STORES.get(store, store), key)] = row_id
+
+            errors = {ids_by_target[(store, key)]: error
+                      for store, key, error in delete_objects(ids_by_target)}
+            done = [row_id for row_id in ids_by_target.values() if row_id not in errors] + skipped
+            PendingStorageDelete.resolve(cursor, done)
+            PendingStorageDelete.reschedule(cursor, errors, STORAGE_DELETE_BACKOFF, STORAGE_DELETE_MAX_BACKOFF)
+        conn.commit()
+        return len(done) - len(skipped), len(errors)
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
+def main(argv):
+    deleted, failed = retry_pending_deletes()
+    print(f"Deleted {deleted} queued object(s), {failed} still failing")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
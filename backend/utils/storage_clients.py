@@ -0,0 +1,98 @@
+# utils/storage_clients.py
+import os
+import threading
+import boto3
+from botocore.config import Config
+from dotenv import load_dotenv
+from pathlib import Path
+
+load_dotenv(dotenv_path=Path(__file__).resolve().parent.parent / '.env')
+
+# --- Client Tuning (shared by every storage client) ---
+STORAGE_MAX_POOL_CONNECTIONS = int(os.environ.get('STORAGE_MAX_POOL_CONNECTIONS', 50))  # HTTP connections kept per client
+STORAGE_CONNECT_TIMEOUT = float(os.environ.get('STORAGE_CONNECT_TIMEOUT', 5))           # Seconds
+STORAGE_READ_TIMEOUT = float(os.environ.get('STORAGE_READ_TIMEOUT', 30))                # Seconds
+STORAGE_MAX_ATTEMPTS = int(os.environ.get('STORAGE_MAX_ATTEMPTS', 3))                   # Including the first try
+
+
+def _client_config():
+    return Config(
+        max_pool_connections=STORAGE_MAX_POOL_CONNECTIONS,
+        tcp_keepalive=True,
+        connect_timeout=STORAGE_CONNECT_TIMEOUT,
+        read_timeout=STORAGE_READ_TIMEOUT,
+        retries={'max_attempts': STORAGE_MAX_ATTEMPTS, 'mode': 'standard'},
+    )
+
+
+def _build_s3():
+    # AWS S3 - scene documents
+    access_key = os.environ.get('AWS_ACCESS_KEY_ID')
+    secret_key = os.environ.get('AWS_SECRET_ACCESS_KEY')
+    if access_key and secret_key:
+        session = boto3.session.Session(
+            region_name=os.environ.get('AWS_REGION'),
+            aws_access_key_id=access_key,
+            aws_secret_access_key=secret_key
+        )
+    else:
+        session = boto3.session.Session(region_name=os.environ.get('AWS_REGION'))  # Default credential chain
+    return session, session.client('s3', config=_client_config())
+
+
+def _build_r2():
+    # Cloudflare R2 - thumbnails, library models, tutorials
+    session = boto3.session.Session(
+        region_name='auto',
+        aws_access_key_id=os.environ.get('CLOUDFLARE_ACCESS_KEY'),
+        aws_secret_access_key=os.environ.get('CLOUDFLARE_SECRET_KEY')
+    )
+    return session, session.client('s3', endpoint_url=os.environ.get('CLOUDFLARE_ENDPOINT'), config=_client_config())
+
+
+def _build_supabase():
+    # Supabase Storage (S3 protocol) - community examples
+    session = boto3.session.Session(
+        region_name=os.environ.get('SUPABASE_S3_REGION'),
+        aws_access_key_id=os.environ.get('SUPABASE_S3_ACCESS_KEY'),
+        aws_secret_access_key=os.environ.get('SUPABASE_S3_SECRET_KEY')
+    )
+    return session, session.client('s3', endpoint_url=os.environ.get('SUPABASE_S3_ENDPOINT'), config=_client_config())
+
+
+_BUILDERS = {
+    's3': _build_s3,
+    'r2': _build_r2,
+    'supabase': _build_supabase,
+}
+_clients = {}
+_sessions = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(name):
+    """Returns the long-lived boto3 client for 's3', 'r2' or 'supabase'.
+
+    Clients are built once per process and shared by every blueprint and thread
+    (boto3 clients are thread-safe), so endpoint resolution, credential loading and
+    the HTTP connection pool are paid for once instead of per request.
+    """
+    client = _clients.get(name)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(name)
+            if client is None:
+                _sessions[name], client = _BUILDERS[name]()
+                _clients[name] = client
+    return client
+
+
+def get_credentials(name):
+    """Returns the current (access_key, secret_key, token) behind a client, for code that
+    signs requests itself. Refreshable credentials are renewed as needed."""
+    get_client(name)
+    credentials = _sessions[name].get_credentials()
+    if credentials is None:
+        raise RuntimeError(f"No credentials configured for the '{name}' storage client")
+    frozen = credentials.get_frozen_credentials()
+    return frozen.access_key, frozen.secret_key, frozen.token
@@ -0,0 +1,102 @@
+# utils/textures.py
+import os
+import base64
+import hashlib
+import binascii
+from concurrent.futures import ThreadPoolExecutor
+from utils.storage import get_storage
+from utils import jobs, storage_cleanup  # storage_cleanup registers the storage.delete_blobs job
+
+TEXTURE_FIELDS = ('texture', 'normalMap')  # material fields saveAndLoad.js fills with base64 PNGs
+TEXTURE_MIN_CHARS = int(os.environ.get('TEXTURE_MIN_CHARS', 256))  # Smaller strings stay inline
+TEXTURE_FETCH_WORKERS = int(os.environ.get('TEXTURE_FETCH_WORKERS', 8))
+TEXTURE_REF = '$texture'  # {"$texture": "<sha256>"} replaces the inline string
+
+
+def texture_key(texture_hash):
+    return f"textures/{texture_hash[:2]}/{texture_hash}.png"
+
+
+def _materials(objects):
+    for obj in objects or []:
+        material = obj.get('material') if isinstance(obj, dict) else None
+        if isinstance(material, dict):
+            yield material
+
+
+def extract_textures(objects):
+    """Replaces inline base64 textures with {"$texture": sha256} references, in place.
+
+    Returns {hash: image bytes} for every texture found; identical images collapse
+    into one entry no matter how many materials use them.
+    """
+    blobs = {}
+    for material in _materials(objects):
+        for field in TEXTURE_FIELDS:
+            value = material.get(field)
+            if not isinstance(value, str) or len(value) < TEXTURE_MIN_CHARS:
+                continue
+            try:
+                data = base64.b64decode(value, validate=True)
+            except binascii.Error:
+                continue  # Not base64; leave whatever the client sent untouched
+            texture_hash = hashlib.sha256(data).hexdigest()
+            blobs[texture_hash] = data
+            material[field] = {TEXTURE_REF: texture_hash}
+    return blobs
+
+
+def texture_refs(objects):
+    """Returns the set of texture hashes referenced by a scene's objects."""
+    refs = set()
+    for material in _materials(objects):
+        for field in TEXTURE_FIELDS:
+            value = material.get(field)
+            if isinstance(value, dict) and TEXTURE_REF in value:
+                refs.add(value[TEXTURE_REF])
+    return refs
+
+
+def inline_textures(objects):
+    """Swaps references back for base64 strings, fetching the blobs concurrently. In place."""
+    refs = texture_refs(objects)
+    if not refs:
+        return objects
+    with ThreadPoolExecutor(max_workers=min(TEXTURE_FETCH_WORKERS, len(refs))) as pool:
+        blobs = dict(zip(refs, pool.map(fetch_texture, refs)))
+    for material in _materials(objects):
+        for field in TEXTURE_FIELDS:
+            value = material.get(field)
+            if isinstance(value, dict) and TEXTURE_REF in value:
+                material[field] = base64.b64encode(blobs[value[TEXTURE_REF]]).decode('ascii')
+    return objects
+
+
+def fetch_texture(texture_hash):
+    obj = get_storage('scenes').get(texture_key(texture_hash))
+    try:
+        return obj.read()
+    finally:
+        obj.close()
+
+
+def upload_textures(blobs):
+    """Uploads {hash: bytes}. Content-addressed objects never change, so they cache forever."""
+    for texture_hash, data in blobs.items():
+        get_storage('scenes').put(
+            texture_key(texture_hash),
+            data,
+            content_type='image/png',
+            cache_control='public, max-age=31536000, immutable'
+        )
+
+
+def delete_texture_objects(blobs):
+    """Queues removal of texture blobs whose last reference went away.
+
+    `blobs` is the (hash, key) list Texture's release methods return; call this only after
+    the transaction that deleted the rows has committed. The storage.delete_blobs job skips
+    hashes a later save has stored again.
+    """
+    if blobs:
+        jobs.enqueue('storage.delete_blobs', 'texture', [list(blob) for blob in blobs], 'scenes')
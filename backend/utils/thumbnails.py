@@ -0,0 +1,110 @@
+# utils/thumbnails.py
+"""Background thumbnail pipeline: stores the uploaded PNG, renders WebP variants and records them.
+
+Saves queue process_thumbnail() as a background job (utils/jobs.py) after committing, so
+the response never waits on R2 or Pillow. Variant keys, and the key of an original the
+job uploads, carry the scene version they were rendered for, which lets an older job that
+finishes late lose to a newer one instead of overwriting it.
+"""
+import os
+import io
+import logging
+from utils.db import get_db_connection
+from utils.storage import get_storage
+from utils.storage_cleanup import delete_objects
+
+THUMBNAIL_SIZES = tuple(int(size) for size in os.environ.get('THUMBNAIL_SIZES', '128,256,512').split(','))  # Longest edge, px
+THUMBNAIL_LIST_SIZE = int(os.environ.get('THUMBNAIL_LIST_SIZE', 256))       # Variant served in scene lists
+THUMBNAIL_WEBP_QUALITY = int(os.environ.get('THUMBNAIL_WEBP_QUALITY', 80))
+
+
+def variant_key(image_url, version, size):
+    """Thumbnails/1/7.png -> Thumbnails/1/7.v3.256.webp"""
+    stem = image_url.rsplit('.', 1)[0]
+    return f"{stem}.v{version}.{size}.webp"
+
+
+def original_key(image_url, version):
+    """Thumbnails/1/7.png -> Thumbnails/1/7.v3.png"""
+    stem, _, extension = image_url.rpartition('.')
+    return f"{stem}.v{version}.{extension}"
+
+
+def variant_keys(variants):
+    """The object keys in a recorded variants document."""
+    return [key for name, key in (variants or {}).items() if name != 'version']
+
+
+def list_thumbnail_key(image_url, variants):
+    """Key to show in grid views: the list-size variant when rendered, otherwise the original."""
+    if variants:
+        return variants.get(str(THUMBNAIL_LIST_SIZE)) or variants.get('original') or image_url
+    return image_url
+
+
+def render_variants(image_bytes, sizes=THUMBNAIL_SIZES):
+    """Returns {size: webp bytes}, each fitted inside size x size without upscaling."""
+    from PIL import Image  # Pillow is only needed by the pipeline, not by every importer
+
+    with Image.open(io.BytesIO(image_bytes)) as source:
+        source.load()
+        image = source.convert('RGBA' if 'A' in source.getbands() else 'RGB')
+
+    rendered = {}
+    for size in sorted(sizes):
+        variant = image.copy()
+        variant.thumbnail((size, size), Image.LANCZOS)
+        buffer = io.BytesIO()
+        variant.save(buffer, format='WEBP', quality=THUMBNAIL_WEBP_QUALITY, method=4)
+        rendered[size] = buffer.getvalue()
+    return rendered
+
+
+def process_thumbnail(scene_id, image_url, version, image_bytes=None, upload_original=True):
+    """Uploads the original (unless it is already in R2), renders and uploads the variants,
+    then records them. Returns True if the variants were recorded.
+
+    `image_url` is the thumbnail's fixed key; an original uploaded here goes to its
+    versioned original_key() and is recorded with the variants, so a late job for an
+    older version never overwrites a newer original.
+    """
+    from models import SceneThumbnail  # models imports utils.textures, import lazily
+
+    media = get_storage('media')
+    if image_bytes is None:
+        original = media.get(image_url)
+        try:
+            image_bytes = original.read()
+        finally:
+            original.close()
+        upload_original = False
+    variants = {'version': version}
+    if upload_original:
+        key = variants['original'] = original_key(image_url, version)
+        media.put(key, image_bytes, content_type='image/png',
+                  cache_control='private, max-age=31536000, immutable')
+    for size, data in render_variants(image_bytes).items():
+        key = variants[str(size)] = variant_key(image_url, version, size)
+        media.put(key, data, content_type='image/webp',
+                  cache_control='private, max-age=31536000, immutable')  # Keys change with the version
+
+    conn = get_db_connection()
+    if conn is None:
+        raise RuntimeError("Database connection failed")
+    try:
+        with conn.cursor() as cursor:
+            recorded, previous = SceneThumbnail.record_variants(cursor, scene_id, image_url, variants)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+    # Superseded variants, or ours if a newer render (or a different thumbnail) won
+    current = set(variant_keys(variants))
+    stale = set(variant_keys(previous)) - current if recorded else current
+    for _, key, error in delete_objects(('media', key) for key in stale):
+        logging.error(f"Failed to delete stale thumbnail variant {key}: {error}")
+    logging.info(f"Thumbnail variants for scene {scene_id} v{version} {'recorded' if recorded else 'discarded'}")
+    return recorded
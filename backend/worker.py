@@ -0,0 +1,12 @@
+"""Background job worker for JOB_QUEUE_BACKEND=redis (see utils/jobs.py).
+
+Run it next to gunicorn, from backend/:
+    JOB_QUEUE_BACKEND=redis python worker.py
+"""
+import logging
+from app import app  # Importing the app registers every job handler
+from utils import jobs
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    jobs.run_worker(app)